@@ -1,7 +1,7 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from flask_login import LoginManager, UserMixin
+from flask_login import LoginManager
 import os
 
 # Initialize core extensions
@@ -10,53 +10,91 @@ bcrypt = Bcrypt()
 login_manager = LoginManager()
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__, template_folder='templates', static_folder='static')
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'devsecretkey')
 
-    # ✅ Define absolute path for SQLite database
+    # ✅ Define absolute path for the default SQLite database
     basedir = os.path.abspath(os.path.dirname(__file__))
     instance_dir = os.path.abspath(os.path.join(basedir, '..', 'instance'))
     os.makedirs(instance_dir, exist_ok=True)
 
-    app.config['SQLALCHEMY_DATABASE_URI'] = (
-        'sqlite:///' + os.path.join(instance_dir, 'atme.db').replace('\\', '/')
-    )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Rows per chunk for streaming CSV imports (bounds memory per upload)
+    app.config['IMPORT_CHUNK_SIZE'] = int(os.getenv('IMPORT_CHUNK_SIZE', 10000))
+    # Smaller chunks for staff imports: every row costs a bcrypt hash
+    app.config['STAFF_IMPORT_CHUNK_SIZE'] = int(os.getenv('STAFF_IMPORT_CHUNK_SIZE', 500))
+    # Worker threads for background uploads and reports
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+    # Seconds between a worker's heartbeats on its running jobs; jobs silent
+    # for four heartbeats are failed (their process is gone) and can be resumed
+    app.config['JOB_HEARTBEAT_SECONDS'] = int(os.getenv('JOB_HEARTBEAT_SECONDS', 30))
+    # Seconds the admin dashboard aggregates may be served from memory
+    app.config['ADMIN_STATS_TTL'] = int(os.getenv('ADMIN_STATS_TTL', 60))
+    # bcrypt cost factor; stored hashes are upgraded on the next login
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    # Password hashing pool: worker processes (0 = inline), extra waiting
+    # logins allowed before answering 429, and seconds to wait for a result
+    app.config['HASH_WORKERS'] = int(os.getenv('HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    app.config['HASH_QUEUE_LIMIT'] = int(os.getenv('HASH_QUEUE_LIMIT', 16))
+    app.config['HASH_TIMEOUT'] = int(os.getenv('HASH_TIMEOUT', 10))
+    # Opt-in instrumentation: histograms at /admin/metrics (admins, or a
+    # scraper sending "Authorization: Bearer $METRICS_TOKEN") and cProfile
+    # dumps for a sampled fraction of requests (0 = never)
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '0') == '1'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(instance_dir, 'profiles'))
+    # Seconds browsers may keep fingerprinted static files (?v=<hash> URLs)
+    app.config['STATIC_MAX_AGE'] = int(os.getenv('STATIC_MAX_AGE', 365 * 24 * 3600))
+    # Rendered fragments (e.g. a staff member's payments table) kept per process
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.getenv('FRAGMENT_CACHE_SIZE', 512))
+    # Seconds the analytics rollups may lag behind new payments and loans
+    app.config['ROLLUP_REFRESH_SECONDS'] = int(os.getenv('ROLLUP_REFRESH_SECONDS', 60))
+    # Seconds between loan-book snapshots on that refresh (each regroups every loan);
+    # a new month is snapshotted at once and `flask refresh-rollups` always snapshots
+    app.config['LOAN_BOOK_SNAPSHOT_SECONDS'] = int(os.getenv('LOAN_BOOK_SNAPSHOT_SECONDS', 3600))
+    # `flask archive-history` moves payments, and paid-off or deleted loans,
+    # older than this many months into the archive tables
+    app.config['ARCHIVE_AFTER_MONTHS'] = int(os.getenv('ARCHIVE_AFTER_MONTHS', 24))
+    # Upgrade an outdated or empty database at startup; set 0 in production
+    # and run `flask upgrade-db` as a deploy step instead
+    app.config['AUTO_MIGRATE'] = os.getenv('AUTO_MIGRATE', '1') == '1'
+    # Bootstrap admin account, created once at startup if missing
+    app.config['DEFAULT_ADMIN_EMAIL'] = os.getenv('DEFAULT_ADMIN_EMAIL', 'admin@example.com')
+    app.config['DEFAULT_ADMIN_PASSWORD'] = os.getenv('DEFAULT_ADMIN_PASSWORD', 'adminpass')
+
+    # Explicit overrides (tests, benchmarks)
+    if config:
+        app.config.update(config)
+
+    # DATABASE_URL / pooling / SQLite pragmas
+    from .database import configure_database, install_sqlite_pragmas
+    configure_database(app, instance_dir)
+
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(app, db.engine)
     bcrypt.init_app(app)
     login_manager.init_app(app)
 
-    # ✅ Import both models
-    from app.models import Admin, Staff
-
-    # ----------------------------------------
-    # Enhanced Flask-Login integration
-    # ----------------------------------------
-    @login_manager.user_loader
-    def load_user(compound_id):
-        """Load user based on 'Role-ID' format."""
-        if not compound_id:
-            return None
-
-        role, user_id = compound_id.split('-', 1)
-        if role == 'Admin':
-            return Admin.query.get(int(user_id))
-        elif role == 'Staff':
-            return Staff.query.get(int(user_id))
-        return None
-
-    # Monkey-patch get_id() for both Admin and Staff to store Role-ID
-    def admin_get_id(self):
-        return f"Admin-{self.id}"
-
-    def staff_get_id(self):
-        return f"Staff-{self.id}"
-
-    Admin.get_id = admin_get_id
-    Staff.get_id = staff_get_id
+    from .jobs import job_queue
+    from .stats import stats_cache
+    from .passwords import password_hasher
+    from .metrics import metrics
+    from .rollups import rollup_refresher
+    job_queue.init_app(app)
+    stats_cache.init_app(app)
+    password_hasher.init_app(app)
+    metrics.init_app(app)
+    rollup_refresher.init_app(app)
+
+    # ✅ Imported for their side effects only: models registers the Flask-Login
+    # user loader, ledger's after_flush hook keeps staff balances in step with ORM writes
+    from . import models  # noqa: F401
+    from . import ledger  # noqa: F401
 
     # ----------------------------------------
     # Login configuration
@@ -68,16 +106,25 @@ def create_app():
     from . import routes
     app.register_blueprint(routes.bp)
 
-    # Create DB tables
+    # CLI maintenance commands
+    from .commands import register_commands, ensure_default_admin
+    register_commands(app)
+
+    # Schema changes are applied by `flask upgrade-db` / `flask bootstrap`;
+    # startup only checks the recorded revision (AUTO_MIGRATE applies them)
+    from .schema import schema_is_current, upgrade_schema
     with app.app_context():
-        db.create_all()
-
-    # Prevent caching after logout
-    @app.after_request
-    def add_header(response):
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
-        return response
+        if schema_is_current():
+            job_queue.recover()
+        elif app.config['AUTO_MIGRATE']:
+            upgrade_schema()
+            ensure_default_admin()
+            job_queue.recover()
+        else:
+            app.logger.error('Database schema is out of date; run "flask upgrade-db".')
+
+    # Static fingerprints, ETags and private caching for pages
+    from .caching import init_caching
+    init_caching(app)
 
     return app
@@ -0,0 +1,74 @@
+from sqlalchemy import BigInteger, func, type_coerce
+import numpy as np
+
+# -------------------------------------------
+# Vectorized EMI schedules for the loan book
+# -------------------------------------------
+# All amounts here are integer paise in int64 arrays, one row per loan and one
+# column per installment, so a whole book is built without a Python loop.
+
+
+class Schedules:
+    """Installment schedules for a batch of loans.
+
+    `cumulative[:, k]` is what should have been repaid after k installments
+    (column 0 is zero), so every other figure is a difference of it.
+    """
+
+    def __init__(self, principal, interest, tenure, cum_principal, cum_interest):
+        self.principal = principal
+        self.interest = interest
+        self.tenure = tenure
+        self.cum_principal = cum_principal
+        self.cum_interest = cum_interest
+
+    @property
+    def cumulative(self):
+        return self.cum_principal + self.cum_interest
+
+
+def build_schedules(principal, interest_rate, tenure_months):
+    """Flat-rate EMI schedules for many loans in one vectorized pass.
+
+    Matches Loan.calculate_total_with_interest: interest is
+    principal * rate% over the whole tenure, repaid in equal monthly
+    installments. Installments are whole paise and differ by at most one
+    paisa; the last one closes the loan exactly.
+    """
+    principal = np.asarray(principal, dtype=np.int64)
+    rate = np.asarray(interest_rate, dtype=np.float64)
+    tenure = np.maximum(np.asarray(tenure_months, dtype=np.int64), 1)
+    interest = np.floor(principal * rate / 100 + 0.5).astype(np.int64)  # half up, like as_money
+
+    months = int(tenure.max()) if tenure.size else 0
+    k = np.minimum(np.arange(months + 1)[None, :], tenure[:, None])
+    cum_principal = principal[:, None] * k // tenure[:, None]
+    cum_interest = interest[:, None] * k // tenure[:, None]
+    return Schedules(principal, interest, tenure, cum_principal, cum_interest)
+
+
+def project_dues(schedules, paid, months=1):
+    """Expected collections for the next `months` month-ends, per loan.
+
+    A loan is taken to be on the installment its `paid` amount has reached;
+    each month then asks for the rest of the next installment, never more
+    than the remaining balance. Returns an (n_loans, months) paise array.
+    """
+    paid = np.asarray(paid, dtype=np.int64)
+    cumulative = schedules.cumulative
+    tenure = schedules.tenure
+    covered = (cumulative[:, 1:] <= paid[:, None]).sum(axis=1)
+
+    steps = np.minimum(covered[:, None] + np.arange(1, months + 1)[None, :], tenure[:, None])
+    targets = np.take_along_axis(cumulative, steps, axis=1)
+    previous = np.concatenate([paid[:, None], targets[:, :-1]], axis=1)
+    return np.clip(targets - np.maximum(previous, paid[:, None]), 0, None)
+
+
+# -------------------------------------------
+# Loan book columns
+# -------------------------------------------
+def paise_column(column):
+    """Select a Money column as raw paise (skips Decimal conversion)."""
+    return type_coerce(func.coalesce(column, 0), BigInteger)
+
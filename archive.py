@@ -0,0 +1,85 @@
+from . import db
+from .models import Payment, Loan, Repayment, ARCHIVES
+from .ledger import LOOKUP_CHUNK_SIZE, chunks
+from .rollups import refresh_collections
+from .stats import stats_cache
+from sqlalchemy import delete, func, insert, or_, select
+from datetime import date
+
+ARCHIVE_BATCH = 5000  # rows moved per transaction, so uploads are never blocked for long
+
+# -------------------------------------------
+# Hot/cold archival
+# -------------------------------------------
+# Payments older than the horizon, and loans that are closed (paid off) or
+# soft-deleted and were requested before it, are moved with their
+# repayments into the *_archive tables. Nothing that feeds the ledger or the
+# rollups changes: balances keep archived payments (see ledger.refresh),
+# archived loans owe nothing, and rollups are brought up to date before
+# rows leave. Statements and exports read the archive on request.
+
+
+def archive_cutoff(months):
+    """First day of the month `months` months before this one."""
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archivable_loans(before):
+    closed = (Loan.status == 'paid') & (Loan.balance_amount <= 0)
+    return select(Loan.id).where(Loan.requested_on < before, or_(Loan.deleted == True, closed))
+
+
+def move(model, where):
+    """INSERT ... SELECT the matching rows into the archive, then DELETE them."""
+    table, archive = model.__table__, ARCHIVES[model].__table__
+    columns = [c.name for c in table.c]
+    db.session.execute(insert(archive).from_select(columns, select(table).where(where)))
+    return db.session.execute(delete(table).where(where)).rowcount
+
+
+def archive_loans(before, batch=ARCHIVE_BATCH):
+    """Move closed/deleted loans requested before `before` and their repayments; returns (loans, repayments)."""
+    loan_ids = db.session.execute(archivable_loans(before).order_by(Loan.id)).scalars().all()
+    loans = repayments = 0
+    for chunk in chunks(loan_ids, min(batch, LOOKUP_CHUNK_SIZE)):
+        refresh_collections()
+        repayments += move(Repayment, Repayment.loan_id.in_(chunk))
+        loans += move(Loan, Loan.id.in_(chunk))
+        db.session.commit()
+    return loans, repayments
+
+
+def archive_payments(before, batch=ARCHIVE_BATCH):
+    """Move payments created before `before`, oldest first, `batch` rows per commit."""
+    moved = 0
+    while True:
+        oldest = select(Payment.id).where(Payment.created_on < before).order_by(Payment.id).limit(batch).subquery()
+        last = db.session.scalar(select(func.max(oldest.c.id)))
+        if last is None:
+            return moved
+        refresh_collections()
+        moved += move(Payment, (Payment.id <= last) & (Payment.created_on < before))
+        db.session.commit()
+
+
+def archive_history(months, batch=ARCHIVE_BATCH):
+    """Archive everything older than `months` months; returns counts per table."""
+    before = archive_cutoff(months)
+    loans, repayments = archive_loans(before, batch)
+    payments = archive_payments(before, batch)
+    stats_cache.invalidate()
+    return {'before': before, 'payments': payments, 'loans': loans, 'repayments': repayments}
+
+
+def archivable_counts(months):
+    """What archive_history(months) would move, without moving it."""
+    before = archive_cutoff(months)
+    loan_ids = archivable_loans(before)
+    return {
+        'before': before,
+        'payments': db.session.scalar(select(func.count(Payment.id)).where(Payment.created_on < before)),
+        'loans': db.session.scalar(select(func.count()).select_from(loan_ids.subquery())),
+        'repayments': db.session.scalar(select(func.count(Repayment.id)).where(Repayment.loan_id.in_(loan_ids))),
+    }
@@ -0,0 +1,113 @@
+"""Dashboard reads while an upload writes: latency and lock errors.
+
+Usage (from the project root):
+    python -m benchmarks.concurrency            # WAL on (default config)
+    python -m benchmarks.concurrency --no-wal   # rollback journal, for comparison
+
+Options: --readers N (default 8), --seconds S (default 10).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import create_app, db, bcrypt
+from app.models import Staff
+from app.ingest import ingest_payments
+
+STAFF_COUNT = 500
+WRITE_CHUNK = 5000
+
+
+def seed():
+    pw = bcrypt.generate_password_hash('pw').decode('utf-8')
+    db.session.add_all(Staff(staff_id=f'S{i}', name=f'Staff {i}', password=pw, approved=True)
+                       for i in range(STAFF_COUNT))
+    db.session.commit()
+
+
+def writer(app, stop, stats):
+    rng = np.random.default_rng(0)
+    with app.app_context():
+        while not stop.is_set():
+            chunk = pd.DataFrame({
+                'staff_id': 'S' + rng.integers(0, STAFF_COUNT, WRITE_CHUNK).astype(str),
+                'amount': rng.integers(100, 5000, WRITE_CHUNK),
+                'month': 'Jan',
+            })
+            try:
+                ingest_payments(chunk)
+                db.session.commit()
+                stats['rows'] += WRITE_CHUNK
+            except Exception:
+                db.session.rollback()
+                stats['errors'] += 1
+
+
+def reader(client, stop, latencies, errors):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            ok = client.get('/staff/dashboard').status_code == 200
+        except Exception:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-wal', action='store_true')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path, 'TESTING': True,
+                          'SQLITE_WAL': not args.no_wal})
+        with app.app_context():
+            seed()
+
+        clients = []
+        for i in range(args.readers):
+            client = app.test_client()
+            client.post('/staff/login', data={'staff_id': f'S{i}', 'password': 'pw'})
+            clients.append(client)
+
+        stop = threading.Event()
+        latencies, read_errors = [], []
+        write_stats = {'rows': 0, 'errors': 0}
+        threads = [threading.Thread(target=writer, args=(app, stop, write_stats))]
+        threads += [threading.Thread(target=reader, args=(c, stop, latencies, read_errors)) for c in clients]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        mode = 'rollback journal' if args.no_wal else 'WAL'
+        print(f'mode={mode} readers={args.readers} seconds={args.seconds}')
+        if latencies:
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f'reads={len(latencies)} p50={statistics.median(latencies) * 1000:.1f}ms '
+                  f'p95={p95 * 1000:.1f}ms read_errors={len(read_errors)}')
+        print(f"rows_written={write_stats['rows']} write_errors={write_stats['errors']}")
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+if __name__ == '__main__':
+    main()
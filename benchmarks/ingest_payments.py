@@ -0,0 +1,102 @@
+"""Benchmark the bulk payments ingest path.
+
+Usage (from the project root):
+    python -m benchmarks.ingest_payments 10000 100000 1000000
+    python -m benchmarks.ingest_payments --stream 1000000
+
+With --stream the file is written to disk and imported through the chunked
+ImportJob pipeline; peak RSS is reported so memory growth is visible.
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+from app import db
+from app.models import Staff, ImportJob
+from app.ingest import read_upload, ingest_payments, count_rows, run_import
+
+STAFF_COUNT = 2000
+UNKNOWN_RATIO = 0.01  # share of rows pointing at a staff_id that does not exist
+CHUNK_SIZE = 10000
+
+
+def make_app(db_path, instance_path):
+    app = Flask(__name__, instance_path=instance_path)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(1, STAFF_COUNT + 1, rows)
+    unknown = rng.random(rows) < UNKNOWN_RATIO
+    staff_ids = np.where(unknown, 'X' + ids.astype(str), 'S' + ids.astype(str))
+    return pd.DataFrame({
+        'staff_id': staff_ids,
+        'amount': rng.integers(100, 5000, rows),
+        'month': rng.choice(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'], rows),
+    })
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def ingest_in_memory(rows):
+    csv_text = make_frame(rows).to_csv(index=False)
+    report = ingest_payments(read_upload(StringIO(csv_text)))
+    db.session.commit()
+    return report.counts, len(report.rejected)
+
+
+def ingest_streaming(rows, workdir):
+    path = os.path.join(workdir, 'payments.csv')
+    # Write in slices so the generator itself does not dominate peak RSS
+    for start in range(0, rows, CHUNK_SIZE):
+        make_frame(min(CHUNK_SIZE, rows - start), seed=start).to_csv(
+            path, mode='a', header=start == 0, index=False)
+    job = ImportJob(kind='payments', path=path, chunk_size=CHUNK_SIZE,
+                    total_rows=count_rows(path), counts={}, rejected=0, rows_done=0)
+    db.session.add(job)
+    db.session.commit()
+    run_import(job)
+    return job.counts, job.rejected
+
+
+def run(rows, stream):
+    with tempfile.TemporaryDirectory() as workdir:
+        app = make_app(os.path.join(workdir, 'bench.db'), workdir)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(
+                Staff(staff_id=f'S{i}', name=f'Staff {i}', password='x', approved=True)
+                for i in range(1, STAFF_COUNT + 1)
+            )
+            db.session.commit()
+
+            started = time.perf_counter()
+            if stream:
+                counts, rejected = ingest_streaming(rows, workdir)
+            else:
+                counts, rejected = ingest_in_memory(rows)
+            elapsed = time.perf_counter() - started
+    print(f'{rows:>9} rows  {elapsed:8.2f}s  {rows / elapsed:>10.0f} rows/s  '
+          f'peak_rss={peak_rss_mb():.0f}MB  {counts} rejected={rejected}')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    stream = '--stream' in args
+    sizes = [int(n) for n in args if n != '--stream'] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        run(n, stream)
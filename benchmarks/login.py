@@ -0,0 +1,111 @@
+"""Login storm: throughput, latency and 429s against a threaded dev server.
+
+Usage (from the project root):
+    python -m benchmarks.login                        # pool of HASH_WORKERS processes
+    python -m benchmarks.login --workers 0            # inline bcrypt, for comparison
+    python -m benchmarks.login --clients 64 --queue 8 # smaller queue: expect 429s
+
+Options: --clients N (default 32), --seconds S (default 10),
+--rounds R (bcrypt cost, default 12), --workers W, --queue Q.
+"""
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from werkzeug.serving import make_server
+
+from app import create_app, db
+from app.models import Staff
+from app.passwords import password_hasher
+
+STAFF_COUNT = 100
+BACKOFF = 0.5  # seconds a client waits after a 429, like a browser retry
+
+
+def seed():
+    pw = password_hasher.hash('pw')
+    db.session.add_all(Staff(staff_id=f'S{i}', name=f'Staff {i}', password=pw, approved=True)
+                       for i in range(STAFF_COUNT))
+    db.session.commit()
+
+
+def client(port, index, stop, results):
+    body = urlencode({'staff_id': f'S{index % STAFF_COUNT}', 'password': 'pw'})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            conn.request('POST', '/staff/login', body, headers)
+            status = conn.getresponse().status
+        except OSError:
+            status = 'error'
+        finally:
+            conn.close()
+        results.append((status, time.perf_counter() - started))
+        if status == 429:
+            time.sleep(BACKOFF)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--queue', type=int, default=None)
+    args = parser.parse_args()
+
+    config = {'TESTING': True, 'BCRYPT_LOG_ROUNDS': args.rounds}
+    if args.workers is not None:
+        config['HASH_WORKERS'] = args.workers
+    if args.queue is not None:
+        config['HASH_QUEUE_LIMIT'] = args.queue
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+        app = create_app(config)
+        with app.app_context():
+            seed()
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        stop = threading.Event()
+        results = []
+        threads = [threading.Thread(target=client, args=(server.port, i, stop, results))
+                   for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        server.shutdown()
+
+        ok = sorted(latency for status, latency in results if status == 302)
+        busy = sum(1 for status, _ in results if status == 429)
+        other = len(results) - len(ok) - busy
+        print(f"workers={app.config['HASH_WORKERS']} queue={app.config['HASH_QUEUE_LIMIT']} "
+              f"rounds={args.rounds} clients={args.clients} seconds={args.seconds}")
+        print(f'logins={len(ok)} ({len(ok) / args.seconds:.1f}/s) rejected_429={busy} other={other}')
+        if ok:
+            p95 = ok[max(int(len(ok) * 0.95) - 1, 0)]
+            print(f'p50={statistics.median(ok) * 1000:.0f}ms p95={p95 * 1000:.0f}ms')
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Count SQL queries issued per request for the main routes.
+
+Usage (from the project root):
+    python -m benchmarks.queries_per_request
+"""
+import os
+import tempfile
+
+from sqlalchemy import event
+
+from app import create_app, db, bcrypt
+from app.models import Staff, Payment, Loan
+
+ADMIN_ROUTES = ['/admin/dashboard', '/admin/payments', '/admin/manage-staff', '/admin/pending-loans',
+                '/admin/upload-payments']
+STAFF_ROUTES = ['/staff/dashboard', '/staff/request-loan']
+PUBLIC_ROUTES = ['/', '/staff/login', '/admin/login', '/static/css/style.css']
+
+
+def seed():
+    pw = bcrypt.generate_password_hash('pw').decode('utf-8')
+    db.session.add(Staff(staff_id='S1', name='Staff One', password=pw, approved=True))
+    db.session.add_all(Payment(staff_id='S1', amount=100, month='Jan') for _ in range(20))
+    loan = Loan(staff_id='S1', amount=1000, interest_rate=5, status='approved', paid_amount=0)
+    loan.calculate_total_with_interest()
+    db.session.add(loan)
+    db.session.commit()
+
+
+def measure(client, counter, path):
+    counter.clear()
+    client.get(path)
+    return len(counter)
+
+
+def main():
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path, 'TESTING': True})
+        statements = []
+        with app.app_context():
+            seed()
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda conn, cursor, stmt, *args: statements.append(stmt))
+
+        public = app.test_client()
+        admin = app.test_client()
+        admin.post('/admin/login', data={'email': app.config['DEFAULT_ADMIN_EMAIL'],
+                                          'password': app.config['DEFAULT_ADMIN_PASSWORD']})
+        staff = app.test_client()
+        staff.post('/staff/login', data={'staff_id': 'S1', 'password': 'pw'})
+
+        print(f"{'route':<28}{'client':<8}{'queries':>8}")
+        for client, name, routes in ((public, 'anon', PUBLIC_ROUTES), (admin, 'admin', ADMIN_ROUTES),
+                                     (staff, 'staff', STAFF_ROUTES)):
+            for path in routes:
+                measure(client, statements, path)  # warm caches
+                print(f'{path:<28}{name:<8}{measure(client, statements, path):>8}')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
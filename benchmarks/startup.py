@@ -0,0 +1,110 @@
+"""Cold-start cost: import time, create_app() and the first request.
+
+Usage (from the project root):
+    python -m benchmarks.startup                    # 5 fresh interpreters, top 15 imports
+    python -m benchmarks.startup --budget-ms 1500   # exit 1 when the median is over budget
+    python -m benchmarks.startup --output startup.json
+
+Every run is a new `python -X importtime` process against an already
+migrated database, so it measures what a worker restart pays. The run
+also fails if a heavy optional subsystem (pandas, numpy, ReportLab, ...)
+is imported before the first page is served: those must stay lazy.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ('pandas', 'numpy', 'reportlab', 'pyarrow', 'openpyxl')
+
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+created = time.perf_counter()
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'status': status,
+    'heavy_loaded': [m for m in %r if m in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+def run_probe(url):
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE, url],
+                          capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(proc.stderr)
+    return result
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list (by self time)')
+    parser.add_argument('--budget-ms', type=float, help='fail if median import + create_app exceeds this')
+    parser.add_argument('--output', help='write the summary as JSON')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        url = 'sqlite:///' + db_path
+        run_probe(url)  # first boot migrates the empty database; not counted
+        runs = [run_probe(url) for _ in range(args.runs)]
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    summary = {key: round(statistics.median(r[key] for r in runs), 1)
+               for key in ('import_ms', 'create_app_ms', 'first_request_ms')}
+    summary['startup_ms'] = round(summary['import_ms'] + summary['create_app_ms'], 1)
+    heavy = sorted({m for r in runs for m in r['heavy_loaded']})
+    slowest = sorted(runs[-1]['imports'].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+
+    print(f"runs={args.runs} import={summary['import_ms']}ms create_app={summary['create_app_ms']}ms "
+          f"first_request={summary['first_request_ms']}ms (medians)")
+    print('\nslowest imports (self / cumulative ms):')
+    for name, (self_us, cumulative_us) in slowest:
+        print(f'  {self_us / 1000:8.1f} {cumulative_us / 1000:8.1f}  {name}')
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'summary': summary, 'heavy_loaded': heavy,
+                       'slowest_imports': [{'module': n, 'self_ms': s / 1000, 'cumulative_ms': c / 1000}
+                                           for n, (s, c) in slowest]}, fh, indent=2)
+
+    failed = False
+    if heavy:
+        print(f"\nFAIL: imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms and summary['startup_ms'] > args.budget_ms:
+        print(f"\nFAIL: startup {summary['startup_ms']}ms is over the {args.budget_ms}ms budget")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""End-to-end benchmark suite over synthetic data, with JSON results.
+
+Usage (from the project root):
+    python -m benchmarks.suite                                  # small and medium
+    python -m benchmarks.suite --sizes small,medium,large --output results.json
+    python -m benchmarks.suite --compare baseline.json          # exit 1 on regression
+
+Each size gets a fresh SQLite database filled by benchmarks.synthetic, then
+every scenario runs through Flask's test client:
+
+    staff_dashboard, admin_dashboard, admin_payments   --requests GETs each
+    upload_payments, upload_loans                      POST a CSV, wait for the import
+    report_payments, report_loans                      queue the PDF, wait, download
+
+Sizes are presets (see SIZES) or STAFFxPAYMENTS, e.g. 20000x36. Results
+record p50/p95/mean latency and throughput per scenario plus the git commit,
+so files from two versions can be compared with --compare.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+from sqlalchemy import select
+
+from app import create_app, db
+from app.models import ImportJob, Staff
+from benchmarks.synthetic import PASSWORD, generate
+
+SIZES = {
+    'small': (1000, 12),     # staff, payments per staff
+    'medium': (10000, 24),
+    'large': (50000, 36),
+}
+POLL_INTERVAL = 0.02
+REGRESSION_RATIO = 1.2  # --compare flags p50s that grew by more than this
+
+
+def parse_size(name):
+    if name in SIZES:
+        return SIZES[name]
+    staff, payments = name.lower().split('x')
+    return int(staff), int(payments)
+
+
+def summarize(scenario, latencies, rows=None):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    result = {
+        'scenario': scenario,
+        'n': len(latencies),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[math.ceil(len(latencies) * 0.95) - 1] * 1000, 2),
+        'mean_ms': round(total / len(latencies) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+        'per_second': round(len(latencies) / total, 2) if total else None,
+    }
+    if rows:
+        result['rows_per_second'] = round(rows * len(latencies) / total, 1)
+    return result
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def get_ok(client, path):
+    response = client.get(path)
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {path} returned {response.status_code}')
+    return response
+
+
+# -------------------------------------------
+# Scenarios
+# -------------------------------------------
+def upload(app, client, kind, csv_bytes):
+    """POST a CSV and block until its import job finishes."""
+    response = client.post(f'/admin/upload-{kind}', data={'file': (BytesIO(csv_bytes), f'{kind}.csv')},
+                           content_type='multipart/form-data')
+    import_id = int(response.headers['Location'].rstrip('/').rsplit('/', 1)[1])
+    while True:
+        with app.app_context():
+            status = db.session.execute(select(ImportJob.status).where(ImportJob.id == import_id)).scalar()
+        if status in ('done', 'failed'):
+            if status == 'failed':
+                raise RuntimeError(f'{kind} import #{import_id} failed')
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def report(client, path):
+    """Queue a PDF report, wait for the job and download the file."""
+    job_id = int(client.get(path).headers['Location'].rstrip('/').rsplit('/', 1)[1])
+    while True:
+        status = client.get(f'/admin/jobs/{job_id}/status').get_json()
+        if status['status'] == 'failed':
+            raise RuntimeError(f'{path} failed: {status["error"]}')
+        if status['status'] == 'done':
+            get_ok(client, status['download_url'])
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def upload_files(staff_ids, rows, seed):
+    """A payments and a loans CSV; each seed gets its own month, so re-runs are not deduplicated."""
+    rng = np.random.default_rng(seed)
+    owners = rng.choice(staff_ids, rows)
+    month = f'Bench {seed}'
+    payments = ['staff_id,amount,month'] + [f'{s},{a},{month}' for s, a in zip(owners, rng.integers(1000, 50000, rows))]
+    statuses = rng.choice(['pending', 'approved', 'repayment'], rows, p=[0.3, 0.3, 0.4])
+    loans = ['staff_id,amount,status,month'] + [f'{s},{a},{st},{month}' for s, a, st in
+                                                zip(owners, rng.integers(100, 5000, rows), statuses)]
+    return '\n'.join(payments).encode(), '\n'.join(loans).encode()
+
+
+def run_size(name, args):
+    staff, payments_per_staff = parse_size(name)
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path, 'TESTING': True,
+                          'BCRYPT_LOG_ROUNDS': 4, 'HASH_WORKERS': 0})
+        with app.app_context():
+            started = time.perf_counter()
+            counts = generate(staff, payments_per_staff, int(staff * 0.8), seed=args.seed)
+            seed_seconds = time.perf_counter() - started
+            member = db.session.execute(select(Staff.staff_id).where(Staff.approved == True).limit(1)).scalar()
+        print(f"[{name}] staff={counts['staff']} payments={counts['payments']} loans={counts['loans']} "
+              f'seeded in {seed_seconds:.1f}s')
+
+        staff_client = app.test_client()
+        staff_client.post('/staff/login', data={'staff_id': member, 'password': PASSWORD})
+        admin = app.test_client()
+        admin.post('/admin/login', data={'email': app.config['DEFAULT_ADMIN_EMAIL'],
+                                          'password': app.config['DEFAULT_ADMIN_PASSWORD']})
+        # A fresh file per run (and the warm-up): identical content is rejected up front
+        files = [upload_files([f'S{i + 1:06d}' for i in range(staff)], args.upload_rows, args.seed + n)
+                 for n in range(args.repeat + 1)]
+        payment_files, loan_files = iter([p for p, _ in files]), iter([l for _, l in files])
+
+        scenarios = [
+            ('staff_dashboard', args.requests, lambda: get_ok(staff_client, '/staff/dashboard'), None),
+            ('admin_dashboard', args.requests, lambda: get_ok(admin, '/admin/dashboard'), None),
+            ('admin_payments', args.requests, lambda: get_ok(admin, '/admin/payments'), None),
+            ('upload_payments', args.repeat, lambda: upload(app, admin, 'payments', next(payment_files)), args.upload_rows),
+            ('upload_loans', args.repeat, lambda: upload(app, admin, 'loans', next(loan_files)), args.upload_rows),
+            ('report_payments', args.repeat, lambda: report(admin, '/admin/report-payments'), None),
+            ('report_loans', args.repeat, lambda: report(admin, '/admin/report-loans'), None),
+        ]
+        results = []
+        for scenario, repeat, fn, rows in scenarios:
+            if args.only and scenario not in args.only:
+                continue
+            fn()  # warm-up: template compilation, query plans, page cache
+            result = summarize(scenario, timed(fn, repeat), rows)
+            result.update(size=name, **{k: counts[k] for k in ('staff', 'payments', 'loans')})
+            results.append(result)
+            print(f"  {scenario:<16} p50={result['p50_ms']:>9.1f}ms p95={result['p95_ms']:>9.1f}ms "
+                  f"n={result['n']}")
+        return {'size': name, 'seed_seconds': round(seed_seconds, 2), 'results': results}
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+# -------------------------------------------
+# Output and comparison
+# -------------------------------------------
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version, 'cpus': os.cpu_count(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z'}
+
+
+def compare(baseline_path, runs):
+    """Print p50 ratios against a previous results file; returns the regressions."""
+    with open(baseline_path) as fh:
+        baseline = {(r['size'], r['scenario']): r for run in json.load(fh)['runs'] for r in run['results']}
+    regressions = []
+    print(f'\nvs {baseline_path} (p50, regression above x{REGRESSION_RATIO})')
+    for run in runs:
+        for result in run['results']:
+            before = baseline.get((result['size'], result['scenario']))
+            if not before:
+                continue
+            ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+            flag = 'REGRESSION' if ratio > REGRESSION_RATIO else ''
+            print(f"  {result['size']:<8} {result['scenario']:<16} {before['p50_ms']:>9.1f} -> "
+                  f"{result['p50_ms']:>9.1f}ms  x{ratio:.2f} {flag}")
+            if flag:
+                regressions.append((result['size'], result['scenario'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='small,medium')
+    parser.add_argument('--requests', type=int, default=50, help='GETs per page scenario')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per upload/report scenario')
+    parser.add_argument('--upload-rows', type=int, default=5000)
+    parser.add_argument('--only', type=lambda s: s.split(','), help='comma-separated scenario names')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='previous results file to compare against')
+    args = parser.parse_args()
+
+    runs = [run_size(name.strip(), args) for name in args.sizes.split(',')]
+    with open(args.output, 'w') as fh:
+        json.dump({'environment': environment(), 'settings': {k: v for k, v in vars(args).items()
+                                                             if k not in ('output', 'compare')},
+                   'runs': runs}, fh, indent=2)
+    print(f'\nResults written to {args.output}')
+    if args.compare and compare(args.compare, runs):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Synthetic staff, payments and loans for benchmarks and local demos.
+
+Usage (from the project root):
+    python -m benchmarks.synthetic --staff 1000 --payments 24 --loans 800
+    python -m benchmarks.synthetic --database sqlite:////tmp/demo.db --staff 100000
+
+Every staff member's password is "pw". Rows go in through Core bulk inserts
+(no ORM objects), then the balance ledger is rebuilt once, so 100k staff with
+two years of payments load in well under a minute. Output is deterministic
+for a given --seed.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from app import create_app, db, bcrypt, ledger
+from app.ingest import bulk_insert
+from app.models import Admin, Staff, Payment, Loan
+
+PASSWORD = 'pw'
+APPROVED_RATIO = 0.95
+# Loan status mix: share of loans in each state
+STATUS_MIX = {'pending': 0.15, 'approved': 0.45, 'paid': 0.25, 'rejected': 0.15}
+DELETED_RATIO = 0.02
+INTEREST_RATES = (0.0, 5.0, 8.0, 10.0, 12.0)
+TENURES = (6, 10, 12, 24)
+HISTORY_DAYS = 730  # payments and loans spread over the last two years
+
+
+def random_dates(rng, count, now):
+    seconds = rng.integers(0, HISTORY_DAYS * 86400, count)
+    return [now - timedelta(seconds=int(s)) for s in seconds]
+
+
+def generate(staff, payments_per_staff, loans, admins=1, seed=0):
+    """Insert the requested volume into the current app's database; returns row counts."""
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow()
+    pw = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')  # one hash, shared by every row
+    offset = db.session.execute(select(db.func.count(Staff.id))).scalar()
+
+    staff_ids = [f'S{offset + i + 1:06d}' for i in range(staff)]
+    approved = rng.random(staff) < APPROVED_RATIO
+    registered = random_dates(rng, staff, now)
+    bulk_insert(Staff, [
+        {'staff_id': sid, 'name': f'Staff Member {offset + i + 1}', 'password': pw,
+         'approved': bool(approved[i]), 'registered_on': registered[i]}
+        for i, sid in enumerate(staff_ids)
+    ])
+    admin_offset = db.session.execute(select(db.func.count(Admin.id))).scalar()
+    bulk_insert(Admin, [{'email': f'admin{admin_offset + i}@example.com', 'password': pw} for i in range(admins)])
+    keys = dict(db.session.execute(select(Staff.staff_id, Staff.id)).all())
+
+    # Payments: fixed count per staff, whole-rupee salaries
+    payment_count = staff * payments_per_staff
+    owners = np.repeat(np.arange(staff), payments_per_staff)
+    amounts = rng.integers(1000, 50000, payment_count)
+    created = random_dates(rng, payment_count, now)
+    bulk_insert(Payment, [
+        {'staff_id': staff_ids[o], 'staff_pk': keys[staff_ids[o]], 'amount': int(a),
+         'month': c.strftime('%b %Y'), 'created_on': c}
+        for o, a, c in zip(owners.tolist(), amounts.tolist(), created)
+    ])
+
+    # Loans: flat interest in paise, repayments in whole EMIs
+    statuses = rng.choice(list(STATUS_MIX), loans, p=list(STATUS_MIX.values()))
+    borrowers = rng.integers(0, staff, loans) if staff else np.zeros(0, dtype=int)
+    principal = rng.integers(10, 400, loans) * 50000  # 5,000 - 200,000 rupees, in paise
+    rates = rng.choice(INTEREST_RATES, loans)
+    tenures = rng.choice(TENURES, loans)
+    total = principal + np.rint(principal * rates / 100).astype(np.int64)
+    emi = total // tenures
+    paid = np.where(statuses == 'paid', total,
+                    np.where(statuses == 'approved', emi * rng.integers(0, tenures), 0))
+    deleted = rng.random(loans) < DELETED_RATIO
+    requested = random_dates(rng, loans, now)
+    bulk_insert(Loan, [
+        {'staff_id': staff_ids[b], 'staff_pk': keys[staff_ids[b]], 'amount': p / 100, 'interest_rate': float(r),
+         'tenure_months': int(t), 'total_amount': tot / 100, 'paid_amount': done / 100,
+         'balance_amount': (tot - done) / 100, 'status': str(s), 'requested_on': req, 'deleted': bool(d)}
+        for b, p, r, t, tot, done, s, req, d in zip(borrowers.tolist(), principal.tolist(), rates.tolist(),
+                                                    tenures.tolist(), total.tolist(), paid.tolist(),
+                                                    statuses, requested, deleted.tolist())
+    ])
+    db.session.commit()
+    ledger.rebuild()
+    return {'staff': staff, 'admins': admins, 'payments': payment_count, 'loans': loans}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', help='SQLAlchemy URL (default: DATABASE_URL or instance/atme.db)')
+    parser.add_argument('--staff', type=int, default=1000)
+    parser.add_argument('--payments', type=int, default=24, help='payments per staff member')
+    parser.add_argument('--loans', type=int, default=None, help='default: 80%% of --staff')
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = {'SQLALCHEMY_DATABASE_URI': args.database} if args.database else None
+    app = create_app(config)
+    loans = args.loans if args.loans is not None else int(args.staff * 0.8)
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate(args.staff, args.payments, loans, args.admins, args.seed)
+        elapsed = time.perf_counter() - started
+    print(' '.join(f'{k}={v}' for k, v in counts.items()) + f' seconds={elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    main()
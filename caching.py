@@ -0,0 +1,128 @@
+from flask import request
+from flask_login import current_user
+from markupsafe import Markup
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+ETAG_MIMETYPES = ('text/html', 'application/json')
+
+
+# -------------------------------------------
+# Fingerprinted static URLs
+# -------------------------------------------
+class StaticFingerprints:
+    """Content hash per static file, added to url_for('static') as ?v=...
+
+    A changed file gets a new URL, so the old one can be cached forever.
+    Hashes are recomputed only when the file's mtime changes.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._hashes = {}  # filename -> (mtime, digest)
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        path = os.path.join(self.folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as fh:
+            digest = hashlib.sha256(fh.read()).hexdigest()[:12]
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
+
+
+# -------------------------------------------
+# Rendered fragment cache
+# -------------------------------------------
+class FragmentCache:
+    """LRU of rendered template fragments, per process.
+
+    Keys must carry the owner and a data version (e.g. the staff member's
+    ledger counters), so a change produces a new key instead of needing an
+    invalidation, and one user's fragment can never be served to another.
+    """
+
+    def __init__(self):
+        self.maxsize = 512
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config['FRAGMENT_CACHE_SIZE']
+        app.extensions['fragment_cache'] = self
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+        html = Markup(render())
+        if self.maxsize:
+            with self._lock:
+                self._entries[key] = html
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+# -------------------------------------------
+# Response caching policy
+# -------------------------------------------
+def init_caching(app):
+    """Long-lived caching for fingerprinted static files, ETags for pages.
+
+    Dynamic responses are `private, no-cache`: browsers may keep a copy but
+    must revalidate it (cheap 304s via the ETag), and shared proxies never
+    store pages that belong to a signed-in user.
+    """
+    fingerprints = StaticFingerprints(app.static_folder)
+    fragment_cache.init_app(app)
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            digest = fingerprints.get(values['filename'])
+            if digest:
+                values['v'] = digest
+
+    @app.after_request
+    def apply_cache_policy(response):
+        if request.endpoint == 'static':
+            version = request.args.get('v')
+            if version and version == fingerprints.get(request.view_args['filename']):
+                response.cache_control.public = True
+                response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+                response.cache_control.immutable = True
+                response.cache_control.no_cache = None
+            return response
+
+        if 'Cache-Control' not in response.headers:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        if current_user.is_authenticated:
+            response.cache_control.public = None
+            response.cache_control.private = True
+        if (request.method in ('GET', 'HEAD') and response.status_code == 200
+                and not response.is_streamed and not response.direct_passthrough
+                and response.mimetype in ETAG_MIMETYPES and 'ETag' not in response.headers):
+            response.add_etag()
+            response.make_conditional(request)
+        return response
@@ -0,0 +1,108 @@
+import click
+from flask import current_app
+from . import db, bcrypt, ledger
+from .models import Admin
+from .schema import schema_is_current, upgrade_schema, migrate_staff_keys, full_scans
+from .stats import stats_cache
+from .search import rebuild_search_index
+from .rollups import refresh_rollups, rebuild_rollups
+from .archive import archive_history, archivable_counts
+from datetime import date
+
+
+def ensure_default_admin():
+    """Create the configured default admin if it does not exist yet."""
+    email = current_app.config['DEFAULT_ADMIN_EMAIL']
+    if Admin.query.filter_by(email=email).first():
+        return False
+    pw = bcrypt.generate_password_hash(current_app.config['DEFAULT_ADMIN_PASSWORD']).decode('utf-8')
+    db.session.add(Admin(email=email, password=pw))
+    db.session.commit()
+    return True
+
+
+# -------------------------------------------
+# Flask CLI maintenance commands
+# -------------------------------------------
+def register_commands(app):
+
+    @app.cli.command('bootstrap')
+    def bootstrap():
+        """Create tables and the default admin account."""
+        upgrade_schema()
+        created = ensure_default_admin()
+        click.echo('Default admin created.' if created else 'Default admin already exists.')
+
+    @app.cli.command('rebuild-balances')
+    def rebuild_balances():
+        """Backfill or repair the per-staff balance ledger."""
+        count = ledger.rebuild()
+        click.echo(f'Rebuilt balances for {count} staff.')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Add missing tables, columns and indexes and backfill staff keys."""
+        if schema_is_current():
+            click.echo('Schema already up to date.')
+            return
+        added = upgrade_schema()
+        click.echo(f"Added: {', '.join(added)}" if added else 'Schema created.')
+
+    @app.cli.command('rebuild-search')
+    def rebuild_search():
+        """Re-index every staff name and ID for search (SQLite FTS5)."""
+        if rebuild_search_index():
+            click.echo('Staff search index rebuilt.')
+        else:
+            click.echo('No FTS5 search index on this database; search uses LIKE.')
+
+    @app.cli.command('refresh-rollups')
+    @click.option('--full', is_flag=True, help='Recompute collection rollups from scratch.')
+    def refresh_rollups_command(full):
+        """Fold new payments and deductions into the monthly analytics rollups."""
+        folded = rebuild_rollups() if full else refresh_rollups()
+        db.session.commit()
+        click.echo(f'Folded {folded} new rows; loan book snapshot updated.')
+
+    @app.cli.command('archive-history')
+    @click.option('--months', type=int, help='Archive horizon in months (default ARCHIVE_AFTER_MONTHS).')
+    @click.option('--dry-run', is_flag=True, help='Only count what would be archived.')
+    def archive_history_command(months, dry_run):
+        """Move old payments and closed/deleted loans into the archive tables."""
+        months = current_app.config['ARCHIVE_AFTER_MONTHS'] if months is None else months
+        counts = archivable_counts(months) if dry_run else archive_history(months)
+        verb = 'Would archive' if dry_run else 'Archived'
+        click.echo(f"{verb} {counts['payments']} payments, {counts['loans']} loans and "
+                   f"{counts['repayments']} repayments from before {counts['before']}.")
+
+    @app.cli.command('migrate-staff-keys')
+    def migrate_keys():
+        """Backfill the integer staff_pk on payments and loans."""
+        click.echo(f'Backfilled staff_pk on {migrate_staff_keys()} rows.')
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if a hot query falls back to a full table scan (SQLite)."""
+        scans = full_scans()
+        for name, detail in scans:
+            click.echo(f'❌ {name}: {detail}')
+        if scans:
+            raise SystemExit(1)
+        click.echo('✅ All hot queries use an index.')
+
+    @app.cli.command('deduction-run')
+    @click.option('--month', default=lambda: date.today().strftime('%Y-%m'), show_default='this month',
+                  help='Payroll month, YYYY-MM.')
+    def deduction_run(month):
+        """Deduct this month's loan EMIs (safe to re-run)."""
+        from .deductions import parse_month, run_deductions
+        try:
+            month = parse_month(month)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--month')
+        run = run_deductions(month)
+        db.session.commit()
+        stats_cache.invalidate()
+        for label, value in run.summary:
+            click.echo(f'{label}: {value}')
+        click.echo(f'Total Deducted: {run.total_amount:,.2f}')
@@ -0,0 +1,61 @@
+from sqlalchemy import event
+import os
+
+# -------------------------------------------
+# Database engine configuration
+# -------------------------------------------
+SQLITE_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+
+
+def database_url(instance_dir):
+    """DATABASE_URL if set, else the SQLite file in the instance folder."""
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return 'sqlite:///' + os.path.join(instance_dir, 'atme.db').replace('\\', '/')
+    # Some hosts still hand out the pre-1.4 scheme
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def configure_database(app, instance_dir):
+    """Fill in the URI, pool settings and SQLite tuning defaults."""
+    config = app.config
+    config.setdefault('SQLALCHEMY_DATABASE_URI', database_url(instance_dir))
+
+    # SQLite tuning, applied on every new connection
+    config.setdefault('SQLITE_WAL', os.getenv('SQLITE_WAL', '1') != '0')
+    config.setdefault('SQLITE_SYNCHRONOUS', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    config.setdefault('SQLITE_BUSY_TIMEOUT_MS', int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)))
+    config.setdefault('SQLITE_MMAP_SIZE', int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)))
+
+    # Connection pool for server databases (PostgreSQL, MySQL, ...)
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('pool_size', int(os.getenv('DB_POOL_SIZE', 10)))
+        options.setdefault('max_overflow', int(os.getenv('DB_MAX_OVERFLOW', 20)))
+        options.setdefault('pool_timeout', int(os.getenv('DB_POOL_TIMEOUT', 30)))
+        options.setdefault('pool_recycle', int(os.getenv('DB_POOL_RECYCLE', 1800)))
+        options.setdefault('pool_pre_ping', True)
+
+
+def install_sqlite_pragmas(app, engine):
+    """Set WAL/synchronous/busy timeout/mmap on each new SQLite connection.
+
+    WAL lets dashboard reads proceed while an upload holds the write lock;
+    busy_timeout makes writers wait for each other instead of failing with
+    "database is locked".
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    config = app.config
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.close()
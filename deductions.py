@@ -0,0 +1,140 @@
+from . import db, ledger
+from .models import Loan, Repayment, DeductionRun
+from .amortization import build_schedules, project_dues, paise_column
+from .ingest import bulk_insert
+from .money import from_paise
+from .jobs import task, job_queue
+from .stats import stats_cache
+from sqlalchemy import case, exists, func, or_, select
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------
+# Month-end payroll deduction run
+# -------------------------------------------
+DEDUCTIBLE_STATUSES = ['approved']
+
+
+def parse_month(value):
+    """Normalise 'YYYY-MM' (or a date string starting with it).
+
+    ValueError for anything else, and for months after the current one:
+    deducting a payroll that has not happened yet cannot be undone.
+    """
+    try:
+        month = datetime.strptime((value or '').strip()[:7], '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        raise ValueError('Month must be in YYYY-MM format.') from None
+    if month > datetime.utcnow().strftime('%Y-%m'):
+        raise ValueError(f'{month} is in the future; deductions can only be run up to this month.')
+    return month
+
+
+def month_after(month):
+    """Midnight on the first day of the month after 'YYYY-MM'."""
+    year, number = map(int, month.split('-'))
+    return datetime(year + number // 12, number % 12 + 1, 1)
+
+
+def due_loans(month):
+    """Active loans requested by the end of `month` and not yet deducted for it.
+
+    Returned as NumPy arrays, amounts in paise, with the count already deducted.
+    """
+    already = exists().where(Repayment.loan_id == Loan.id, Repayment.month == month)
+    requested = or_(Loan.requested_on.is_(None), Loan.requested_on < month_after(month))
+    active = (Loan.deleted == False) & Loan.status.in_(DEDUCTIBLE_STATUSES) & requested
+    skipped = db.session.scalar(select(func.count(Loan.id)).where(active, already))
+    rows = db.session.execute(
+        select(Loan.id, Loan.staff_id, paise_column(func.coalesce(Loan.total_amount, Loan.amount)),
+               func.coalesce(Loan.tenure_months, 10), paise_column(Loan.paid_amount))
+        .where(active, ~already)
+        .order_by(Loan.id)
+    ).all()
+    ids, staff_ids, total, tenure, paid = zip(*rows) if rows else ([],) * 5
+    book = {
+        'id': np.asarray(ids, dtype=np.int64),
+        'staff_id': np.asarray(staff_ids, dtype=object),
+        'total': np.rint(np.asarray(total, dtype=np.float64)).astype(np.int64),
+        'tenure_months': np.asarray(tenure, dtype=np.int64),
+        'paid': np.rint(np.asarray(paid, dtype=np.float64)).astype(np.int64),
+    }
+    return book, skipped
+
+
+def run_deductions(month, on_progress=None):
+    """Deduct one EMI from every active loan for `month` and return the DeductionRun.
+
+    The instalment is the loan's total spread evenly over tenure_months,
+    less whatever has already been repaid towards it. Repayments are
+    bulk-inserted and loans updated with set-based UPDATEs; the unique
+    (loan, month) constraint makes a second run for the same month a no-op.
+    The caller owns the transaction (commit/rollback).
+    """
+    report = on_progress or (lambda percent: None)
+    book, skipped = due_loans(month)
+    report(20)
+
+    # The stored total already includes interest, so schedule it at 0%
+    schedules = build_schedules(book['total'], np.zeros(len(book['id'])), book['tenure_months'])
+    dues = project_dues(schedules, book['paid'], 1)[:, 0] if len(book['id']) else np.zeros(0, np.int64)
+    owing = dues > 0
+    report(40)
+
+    run = DeductionRun(month=month, loans_checked=len(book['id']), skipped=skipped,
+                       deducted=int(owing.sum()), total_amount=from_paise(int(dues.sum())))
+    db.session.add(run)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    bulk_insert(Repayment, [
+        {'run_id': run.id, 'loan_id': loan_id, 'staff_id': staff_id, 'month': month,
+         'amount': from_paise(amount), 'created_on': now}
+        for loan_id, staff_id, amount in zip(book['id'][owing].tolist(), book['staff_id'][owing],
+                                             dues[owing].tolist())
+    ])
+    report(70)
+
+    # Fold this run's repayments into the loans in two set-based statements
+    loans = Loan.__table__
+    in_run = loans.c.id.in_(select(Repayment.loan_id).where(Repayment.run_id == run.id))
+    # Looked up through the unique (loan_id, month) index, one seek per loan
+    applied = (select(Repayment.amount)
+               .where(Repayment.loan_id == loans.c.id, Repayment.month == month)
+               .scalar_subquery())
+    db.session.execute(loans.update().where(in_run)
+                       .values(paid_amount=func.coalesce(loans.c.paid_amount, 0) + applied))
+    remaining = func.coalesce(loans.c.total_amount, loans.c.amount) - loans.c.paid_amount
+    db.session.execute(loans.update().where(in_run).values(
+        balance_amount=case((remaining > 0, remaining), else_=0),
+        status=case((remaining <= 0, 'paid'), else_=loans.c.status),
+    ))
+    run.loans_closed = db.session.scalar(
+        select(func.count()).select_from(loans).where(in_run, loans.c.status == 'paid'))
+    report(85)
+
+    ledger.refresh(set(book['staff_id'][owing]), payments=False)
+    run.finished_on = datetime.utcnow()
+    return run
+
+
+def run_export(run):
+    """Payroll file for a run: one row per deduction."""
+    rows = db.session.execute(
+        select(Repayment.staff_id, Repayment.loan_id, Repayment.month, Repayment.amount)
+        .where(Repayment.run_id == run.id)
+        .order_by(Repayment.staff_id, Repayment.loan_id)
+    ).all()
+    return pd.DataFrame(rows, columns=['staff_id', 'loan_id', 'month', 'amount'])
+
+
+# -------------------------------------------
+# Background Task
+# -------------------------------------------
+@task('deductions')
+def deductions_task(job, month):
+    run = run_deductions(month, lambda percent: job_queue.report_progress(job.id, percent))
+    db.session.commit()
+    stats_cache.invalidate()
+    return run_export(run).to_csv(index=False).encode(), f'deductions_{month}.csv', 'text/csv'
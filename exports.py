@@ -0,0 +1,177 @@
+from . import db
+from .models import Payment, Loan, Repayment, history
+from .filters import filter_clauses
+from sqlalchemy import literal, select, union_all
+from datetime import datetime
+from decimal import Decimal
+import csv
+import io
+import tempfile
+
+EXPORT_BATCH = 2000     # rows fetched from the cursor (and written) at a time
+FILE_BLOCK = 64 * 1024  # bytes per chunk when streaming a finished file
+
+# -------------------------------------------
+# Export definitions
+# -------------------------------------------
+# Each export is a list of (column, kind) plus a column-only SELECT in the
+# same order. `kind` drives CSV formatting and the Parquet schema.
+PAYMENT_EXPORT = [('id', 'int'), ('staff_id', 'str'), ('month', 'str'), ('amount', 'money'),
+                  ('created_on', 'datetime')]
+LOAN_EXPORT = [('id', 'int'), ('staff_id', 'str'), ('amount', 'money'), ('interest_rate', 'float'),
+               ('tenure_months', 'int'), ('total_amount', 'money'), ('paid_amount', 'money'),
+               ('balance_amount', 'money'), ('status', 'str'), ('requested_on', 'datetime')]
+STATEMENT_EXPORT = [('date', 'datetime'), ('entry', 'str'), ('reference', 'int'), ('detail', 'str'),
+                    ('amount', 'money')]
+
+
+def archived(filters):
+    """?archived=1 adds the archive tables to an export."""
+    return filters.get('archived') == '1'
+
+
+def payments_export(filters):
+    p = history(Payment, archived(filters)).c
+    stmt = (select(p.id, p.staff_id, p.month, p.amount, p.created_on)
+            .where(*filter_clauses(p, p.created_on, filters))
+            .order_by(p.id))
+    return PAYMENT_EXPORT, stmt
+
+
+def loans_export(filters):
+    l = history(Loan, archived(filters)).c
+    stmt = (select(l.id, l.staff_id, l.amount, l.interest_rate, l.tenure_months,
+                   l.total_amount, l.paid_amount, l.balance_amount, l.status, l.requested_on)
+            .where(l.deleted == False, *filter_clauses(l, l.requested_on, filters))
+            .order_by(l.id))
+    return LOAN_EXPORT, stmt
+
+
+def statement_export(staff_id, filters):
+    """One staff member's payments, loans and EMI deductions in date order."""
+    dates = {k: v for k, v in filters.items() if k in ('date_from', 'date_to')}
+    p, l, r = (history(model, archived(filters)).c for model in (Payment, Loan, Repayment))
+    payments = (select(p.created_on.label('date'), literal('payment').label('entry'),
+                       p.id.label('reference'), p.month.label('detail'), p.amount)
+                .where(p.staff_id == staff_id, *filter_clauses(p, p.created_on, dates)))
+    loans = (select(l.requested_on, literal('loan'), l.id, l.status, l.total_amount)
+             .where(l.staff_id == staff_id, l.deleted == False, l.status.in_(['approved', 'paid']),
+                    *filter_clauses(l, l.requested_on, dates)))
+    repayments = (select(r.created_on, literal('repayment'), r.loan_id, r.month, r.amount)
+                  .where(r.staff_id == staff_id, *filter_clauses(r, r.created_on, dates)))
+    statement = union_all(payments, loans, repayments).subquery()
+    stmt = select(statement).order_by(statement.c.date, statement.c.entry, statement.c.reference)
+    return STATEMENT_EXPORT, stmt
+
+
+def iter_batches(stmt):
+    """Lists of rows straight off a server-side cursor; memory stays at one batch."""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+    for batch in result.partitions():
+        yield batch
+
+
+# -------------------------------------------
+# Writers (generators of bytes/str chunks)
+# -------------------------------------------
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def stream_csv(columns, stmt):
+    """Header first (so the download starts at once), then one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    yield buffer.getvalue()
+    for batch in iter_batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_value(v) for v in row] for row in batch)
+        yield buffer.getvalue()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only byte sink the Parquet writer fills and the generator drains."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def stream_parquet(columns, stmt):
+    """One Parquet row group per batch; needs pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'int': pa.int64(), 'str': pa.string(), 'money': pa.decimal128(14, 2),
+             'float': pa.float64(), 'datetime': pa.timestamp('us')}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in iter_batches(stmt):
+        values = list(zip(*batch))
+        writer.write_table(pa.table([pa.array(col, type=field.type) for col, field in zip(values, schema)],
+                                    schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_xlsx(columns, stmt):
+    """Write-only workbook spooled to a temp file, then streamed; needs openpyxl.
+
+    XLSX is a zip, so nothing can be sent until the workbook is complete,
+    but rows are appended a batch at a time and never held in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([name for name, _ in columns])
+    for batch in iter_batches(stmt):
+        for row in batch:
+            sheet.append([float(v) if isinstance(v, Decimal) else v for v in row])
+    with tempfile.TemporaryFile() as fh:
+        workbook.save(fh)
+        fh.seek(0)
+        while block := fh.read(FILE_BLOCK):
+            yield block
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', None),
+    'parquet': (stream_parquet, 'application/vnd.apache.parquet', 'pyarrow'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'openpyxl'),
+}
+
+
+def missing_dependency(fmt):
+    """Name of the optional package `fmt` needs if it is not installed, else None."""
+    package = EXPORT_FORMATS[fmt][2]
+    if package is None:
+        return None
+    try:
+        __import__(package)
+    except ImportError:
+        return package
+    return None
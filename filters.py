@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+# -------------------------------------------
+# Shared list/report filters
+# -------------------------------------------
+FILTER_FIELDS = ('staff_id', 'month', 'status', 'date_from', 'date_to')
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_date(value):
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def clean_filters(args, fields=FILTER_FIELDS):
+    """Pick the non-empty filter values out of `args` (e.g. request.args).
+
+    Returns a plain dict of strings so it can be stored as job params or
+    passed back to url_for. Raises ValueError for malformed dates.
+    """
+    filters = {}
+    for field in fields:
+        value = (args.get(field) or '').strip()
+        if value:
+            filters[field] = value
+    for field in ('date_from', 'date_to'):
+        if field in filters:
+            parse_date(filters[field])
+    return filters
+
+
+def filter_clauses(model, date_column, filters):
+    """WHERE clauses for `filters` on `model`; the date range is inclusive."""
+    clauses = []
+    for field in ('staff_id', 'month', 'status'):
+        if field in filters and hasattr(model, field):
+            clauses.append(getattr(model, field) == filters[field])
+    if 'date_from' in filters:
+        clauses.append(date_column >= parse_date(filters['date_from']))
+    if 'date_to' in filters:
+        clauses.append(date_column < parse_date(filters['date_to']) + timedelta(days=1))
+    return clauses
+
+
+def describe(filters):
+    """Human readable summary, e.g. for report subtitles."""
+    return ', '.join(f"{k.replace('_', ' ')}: {v}" for k, v in filters.items()) or 'All records'
@@ -0,0 +1,588 @@
+from . import db
+from .models import Staff, Payment, Loan, ImportJob, ImportFingerprint
+from .jobs import task, job_queue
+from . import ledger
+from .stats import stats_cache
+from .passwords import password_hasher
+from .money import Money, MAX_PAISE
+from sqlalchemy import BigInteger, bindparam, case, insert, select, func, type_coerce
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from datetime import date
+import numpy as np
+import pandas as pd
+import hashlib
+import os
+import uuid
+
+# -------------------------------------------
+# Settings
+# -------------------------------------------
+PAYMENT_COLUMNS = {'staff_id', 'amount', 'month'}
+LOAN_COLUMNS = {'staff_id', 'amount', 'status'}
+STAFF_COLUMNS = {'staff_id', 'name', 'password'}  # optional: approved (yes/no, default yes)
+TEXT_COLUMNS = {'staff_id': str, 'month': str, 'status': str, 'name': str, 'password': str, 'approved': str}
+REPAYMENT_STATUSES = ['paid', 'repayment', 'paid_part']
+NEW_LOAN_STATUSES = ['approved', 'pending', 'rejected']
+ACTIVE_LOAN_STATUSES = ['approved', 'paid']
+
+INSERT_CHUNK_SIZE = 5000  # rows per executemany batch
+LOOKUP_CHUNK_SIZE = 900   # stay under SQLite's bound-parameter limit
+REPORT_DIR = 'upload_reports'
+UPLOAD_DIR = 'uploads'
+UPLOAD_BLOCK = 1 << 20  # bytes read per step while storing and hashing an upload
+FINGERPRINT_MONTH_FILTER = 100  # above this many distinct months, look up by staff only
+
+
+# -------------------------------------------
+# Ingest Report
+# -------------------------------------------
+class IngestReport:
+    """Outcome of a bulk upload: summary counts plus per-row rejections."""
+
+    def __init__(self):
+        self.total = 0
+        self.counts = {}
+        self.rejected = []
+        self.details = None  # optional per-row outcome DataFrame
+
+    def count(self, label, n):
+        self.counts[label] = self.counts.get(label, 0) + int(n)
+
+    def reject(self, frame, reason):
+        """Record every row of `frame` as rejected with the same reason."""
+        for row, staff_id in zip(frame['row'], frame['staff_id']):
+            self.rejected.append({'row': int(row), 'staff_id': staff_id, 'reason': reason})
+
+    @property
+    def summary(self):
+        return [('Rows Read', self.total), *self.counts.items(), ('Rejected', len(self.rejected))]
+
+    def to_frame(self):
+        if self.details is not None:
+            return self.details
+        return pd.DataFrame(self.rejected, columns=['row', 'staff_id', 'reason'])
+
+
+
+def report_path(name):
+    """Location of a detail report CSV under the instance folder."""
+    directory = os.path.join(current_app.instance_path, REPORT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{name}.csv')
+
+
+# -------------------------------------------
+# Helpers
+# -------------------------------------------
+def read_upload(file):
+    """Read an uploaded CSV keeping identifiers as text (no 007 -> 7)."""
+    return pd.read_csv(file, dtype=TEXT_COLUMNS)
+
+
+def staff_keys(staff_ids):
+    """Map the existing `staff_ids` to their integer keys, using chunked IN lookups."""
+    staff_ids = list(staff_ids)
+    found = {}
+    for start in range(0, len(staff_ids), LOOKUP_CHUNK_SIZE):
+        chunk = staff_ids[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(db.session.execute(select(Staff.staff_id, Staff.id).where(Staff.staff_id.in_(chunk))).all())
+    return found
+
+
+def bulk_insert(model, records, chunk_size=INSERT_CHUNK_SIZE):
+    """Insert plain dict rows in executemany batches (no ORM hydration)."""
+    table = model.__table__  # Core insert skips the ORM bulk-persistence layer
+    for start in range(0, len(records), chunk_size):
+        db.session.execute(insert(table), records[start:start + chunk_size])
+    return len(records)
+
+
+def validate(df, report, checks):
+    """Apply (check, reason) pairs; each row is rejected for the first one it fails."""
+    for check, reason in checks:
+        mask = check(df)
+        report.reject(df[mask], reason)
+        df = df[~mask]
+    return df
+
+
+def common_checks():
+    return [
+        (lambda d: d['staff_id'] == '', 'missing staff_id'),
+        # NaN (unparseable), inf, or too large for a BIGINT of paise
+        (lambda d: ~np.isfinite(d['amount']) | (d['amount'].abs() * 100 >= MAX_PAISE), 'invalid amount'),
+        (lambda d: d['amount'] <= 0, 'amount must be positive'),
+    ]
+
+
+def with_staff_keys(df, report):
+    """Reject unknown staff and attach the integer staff_pk column."""
+    keys = staff_keys(df['staff_id'].unique())
+    df = validate(df, report, [(lambda d: ~d['staff_id'].isin(list(keys)), 'unknown staff_id')])
+    return df.assign(staff_pk=df['staff_id'].map(keys))
+
+
+# -------------------------------------------
+# Row fingerprints (idempotent re-uploads)
+# -------------------------------------------
+FINGERPRINT_KEY = ['source', 'staff_id', 'month', 'paise']
+
+
+def seen_fingerprints(keys):
+    """Fingerprints already stored for the staff, sources and months in `keys`."""
+    fp = ImportFingerprint
+    sources, months = keys['source'].unique().tolist(), keys['month'].unique().tolist()
+    staff_ids = keys['staff_id'].unique().tolist()
+    rows = []
+    for start in range(0, len(staff_ids), LOOKUP_CHUNK_SIZE):
+        query = select(fp.source, fp.staff_id, fp.month, type_coerce(fp.amount, BigInteger)) \
+            .where(fp.staff_id.in_(staff_ids[start:start + LOOKUP_CHUNK_SIZE]), fp.source.in_(sources))
+        if len(months) <= FINGERPRINT_MONTH_FILTER:
+            query = query.where(fp.month.in_(months))
+        rows.extend(db.session.execute(query).all())
+    return pd.DataFrame(rows, columns=FINGERPRINT_KEY).astype({'paise': 'int64'})
+
+
+def fingerprints(df):
+    return pd.DataFrame({'source': df['source'], 'staff_id': df['staff_id'], 'month': df['month'],
+                         'paise': (df['amount'] * 100).round().astype('int64')}, index=df.index)
+
+
+def drop_seen(df, report, source):
+    """Reject rows ingested before or repeated within the file; adds a `source` column.
+
+    A row's fingerprint is (source, staff_id, month, amount). Existing ones
+    are found with one chunked lookup and a merge. Nothing is stored here:
+    call record_fingerprints() with the rows that were actually written.
+    """
+    df = df.assign(source=source)
+    keys = fingerprints(df)
+    seen = seen_fingerprints(keys)
+    imported = pd.Series(keys.merge(seen.drop_duplicates().assign(seen=True), on=FINGERPRINT_KEY, how='left')
+                         ['seen'].notna().values, index=keys.index)
+    return validate(df, report, [
+        (lambda d: imported[d.index], 'already imported'),
+        (lambda d: keys.loc[d.index].duplicated(), 'duplicate row in file'),
+    ])
+
+
+def record_fingerprints(df, import_id=None):
+    """Store the fingerprints of rows written by this chunk (executemany).
+
+    The unique constraint backs up drop_seen() against a concurrent upload
+    of an overlapping file: that chunk fails and can be resumed.
+    """
+    keys = fingerprints(df)
+    bulk_insert(ImportFingerprint, [
+        {'source': src, 'staff_id': sid, 'month': m, 'amount': paise / 100, 'import_id': import_id}
+        for src, sid, m, paise in zip(keys['source'], keys['staff_id'], keys['month'], keys['paise'].tolist())
+    ])
+
+
+# -------------------------------------------
+# Payments
+# -------------------------------------------
+def prepare_payments(df, report):
+    """Coerce and validate payment columns; rejected rows go to `report`."""
+    df = pd.DataFrame({
+        # CSV line number: header is line 1, first data row is line 2
+        'row': df.index + 2,
+        'staff_id': df['staff_id'].fillna('').astype(str).str.strip(),
+        'amount': pd.to_numeric(df['amount'], errors='coerce').round(2),  # whole paise
+        'month': df['month'].fillna('').astype(str).str.strip(),
+    })
+    df = validate(df, report, [
+        *common_checks(),
+        (lambda d: d['month'] == '', 'missing month'),
+    ])
+    return with_staff_keys(df, report)
+
+
+def ingest_payments(df, chunk_size=INSERT_CHUNK_SIZE, import_id=None):
+    """Bulk-insert a payments DataFrame and return an IngestReport.
+
+    Rows already imported (same staff_id, month and amount) are rejected.
+    The caller owns the transaction (commit/rollback).
+    """
+    report = IngestReport()
+    report.total = len(df)
+    valid = prepare_payments(df, report)
+    valid = drop_seen(valid, report, 'payment')
+    records = valid[['staff_id', 'staff_pk', 'amount', 'month']].to_dict('records')
+    report.count('Inserted', bulk_insert(Payment, records, chunk_size))
+    record_fingerprints(valid, import_id)
+    ledger.add_payments(valid)
+    return report
+
+
+# -------------------------------------------
+# Loans
+# -------------------------------------------
+def prepare_loans(df, report):
+    """Coerce and validate loan columns; rejected rows go to `report`."""
+    df = pd.DataFrame({
+        'row': df.index + 2,
+        'staff_id': df['staff_id'].fillna('').astype(str).str.strip(),
+        'amount': pd.to_numeric(df['amount'], errors='coerce').round(2),  # whole paise
+        'status': df['status'].fillna('pending').astype(str).str.strip().str.lower(),
+        # Optional column; without it a row counts once per calendar month
+        'month': (df['month'].fillna('').astype(str).str.strip() if 'month' in df else '')
+    })
+    df['month'] = df['month'].mask(df['month'] == '', date.today().strftime('%Y-%m'))
+    return with_staff_keys(validate(df, report, common_checks()), report)
+
+
+def active_loans(staff_ids):
+    """Latest approved/paid, non-deleted loan per staff, as a DataFrame."""
+    staff_ids = list(staff_ids)
+    rows = []
+    for start in range(0, len(staff_ids), LOOKUP_CHUNK_SIZE):
+        chunk = staff_ids[start:start + LOOKUP_CHUNK_SIZE]
+        latest = (
+            select(func.max(Loan.id))
+            .where(Loan.staff_id.in_(chunk), Loan.deleted == False, Loan.status.in_(ACTIVE_LOAN_STATUSES))
+            .group_by(Loan.staff_id)
+        )
+        rows.extend(db.session.execute(
+            select(Loan.id, Loan.staff_id, Loan.amount, Loan.total_amount, Loan.paid_amount, Loan.status)
+            .where(Loan.id.in_(latest))
+        ).all())
+
+    df = pd.DataFrame(rows, columns=['id', 'staff_id', 'amount', 'total_amount', 'paid_amount', 'status'])
+    # Same fallbacks the row-by-row code used: total defaults to principal, paid to zero
+    df['total'] = df['total_amount'].where(df['total_amount'] > 0, df['amount']).astype(float)
+    df['paid'] = df['paid_amount'].fillna(0).astype(float)
+    return df[['id', 'staff_id', 'total', 'paid', 'status']]
+
+
+def apply_repayments(deltas, chunk_size=INSERT_CHUNK_SIZE):
+    """Add {loan id: amount} onto existing loans' paid_amount, then settle their balance and status.
+
+    The increments are relative (paid_amount = paid_amount + delta), like a
+    deduction run's, so a run that commits while an upload is reconciling is
+    added to rather than overwritten.
+    """
+    loans = Loan.__table__
+    add = (loans.update().where(loans.c.id == bindparam('loan_id'))
+           .values(paid_amount=func.coalesce(loans.c.paid_amount, 0) + bindparam('delta', type_=Money)))
+    records = [{'loan_id': int(loan_id), 'delta': delta} for loan_id, delta in deltas.items()]
+    for start in range(0, len(records), chunk_size):
+        db.session.execute(add, records[start:start + chunk_size])
+
+    total = case((loans.c.total_amount > 0, loans.c.total_amount), else_=loans.c.amount)
+    remaining = total - loans.c.paid_amount
+    for chunk in ledger.chunks(deltas.index.tolist(), LOOKUP_CHUNK_SIZE):
+        db.session.execute(loans.update().where(loans.c.id.in_(chunk)).values(
+            balance_amount=case((remaining > 0, remaining), else_=0),
+            status=case((remaining <= 0, 'paid'), else_=loans.c.status),
+        ))
+
+
+def ingest_loans(df, chunk_size=INSERT_CHUNK_SIZE, import_id=None):
+    """Reconcile a loans/repayments DataFrame set-wise and return an IngestReport.
+
+    Rows whose status is a repayment status reduce the staff member's latest
+    active loan; every other row creates a new loan. Repayments are applied in
+    file order, so a repayment that follows an approved loan row for the same
+    staff lands on that new loan, exactly as the old per-row loop behaved.
+    A loan or repayment row already imported for the same staff_id, month
+    and amount is rejected instead of being applied twice.
+    The caller owns the transaction (commit/rollback).
+    """
+    report = IngestReport()
+    report.total = len(df)
+    valid = prepare_loans(df, report)
+    source = np.where(valid['status'].isin(REPAYMENT_STATUSES), 'repayment', 'loan')
+    valid = drop_seen(valid, report, source)
+
+    is_repayment = valid['status'].isin(REPAYMENT_STATUSES)
+    new = valid[~is_repayment].copy()
+    new['status'] = new['status'].where(new['status'].isin(NEW_LOAN_STATUSES), 'pending')
+    repay = valid[is_repayment]
+
+    # Target of each repayment: the latest approved loan row earlier in the file
+    # (keyed by negative CSV line) or else the staff's current active loan (by id)
+    approved = new.loc[new['status'] == 'approved', ['row', 'staff_id']].rename(columns={'row': 'loan_row'})
+    repay = pd.merge_asof(repay.sort_values('row'), approved.sort_values('loan_row'),
+                          left_on='row', right_on='loan_row', by='staff_id', direction='backward')
+    from_file = repay['loan_row'].notna()
+    active = active_loans(repay.loc[~from_file, 'staff_id'].unique())
+    repay['target'] = (-repay['loan_row']).fillna(repay['staff_id'].map(active.set_index('staff_id')['id']))
+
+    orphan = repay['target'].isna()
+    report.reject(repay[orphan], 'no active loan')
+    repay = repay[~orphan].astype({'target': 'int64'})
+    record_fingerprints(pd.concat([new, repay]), import_id)  # only rows that are written
+
+    parts = [
+        pd.DataFrame({'total': new['amount'].values, 'paid': 0.0, 'status': new['status'].values},
+                     index=-new['row'].values),
+        active.set_index('id')[['total', 'paid', 'status']],
+    ]
+    base = pd.concat([p for p in parts if not p.empty] or parts).rename(columns={'status': 'loan_status'})
+    repay = repay.join(base, on='target')
+    # Round back to paise so float sums cannot leave a loan open by 1e-15
+    repay['paid_after'] = (repay['paid'] + repay.groupby('target')['amount'].cumsum()).round(2)
+    repay['remaining'] = (repay['total'] - repay['paid_after']).round(2).clip(lower=0)
+    repay['closes'] = (repay['remaining'] <= 0) & (repay['paid_after'] - repay['amount'] < repay['total'])
+
+    final = repay.groupby('target').agg(paid_amount=('paid_after', 'last'),
+                                        balance_amount=('remaining', 'last'))
+    final['status'] = np.where(final['balance_amount'] <= 0, 'paid', base.loc[final.index, 'loan_status'])
+
+    # New loans are inserted with their in-file repayments already applied
+    new['total_amount'] = new['amount']
+    new_final = final.loc[final.index < 0].set_index(-final.index[final.index < 0])
+    new['paid_amount'] = new['row'].map(new_final['paid_amount']).fillna(0.0)
+    new['balance_amount'] = new['total_amount'] - new['paid_amount']
+    new['status'] = new['row'].map(new_final['status']).fillna(new['status'])
+    bulk_insert(Loan, new[['staff_id', 'staff_pk', 'amount', 'status', 'total_amount', 'paid_amount',
+                           'balance_amount']].to_dict('records'), chunk_size)
+
+    existing = repay[repay['target'] > 0]
+    apply_repayments(existing.groupby('target')['amount'].sum().round(2), chunk_size)
+    ledger.refresh(set(new['staff_id']) | set(repay['staff_id']), payments=False)
+
+    report.count('Loans Created', len(new))
+    report.count('Repayments Applied', len(repay))
+    report.count('Loans Closed', repay['closes'].sum())
+    report.details = loan_details(new, repay, report.rejected)
+    return report
+
+
+def loan_details(new, repay, rejected):
+    """Per-row outcome of a loans upload, in CSV line order."""
+    created = pd.DataFrame({
+        'row': new['row'], 'staff_id': new['staff_id'], 'amount': new['amount'],
+        'action': 'loan created', 'loan_id': pd.Series(pd.NA, index=new.index, dtype='Int64'),
+        'remaining': new['amount'], 'note': new['status'],
+    })
+    note = pd.Series('', index=repay.index).mask(repay['closes'], 'loan closed')
+    note = note.mask(repay['target'] < 0,
+                     note + ' (loan from line ' + (-repay['target']).astype(str) + ')').str.strip()
+    repaid = pd.DataFrame({
+        'row': repay['row'], 'staff_id': repay['staff_id'], 'amount': repay['amount'],
+        'action': 'repayment', 'loan_id': repay['target'].where(repay['target'] > 0).astype('Int64'),
+        'remaining': repay['remaining'].round(2), 'note': note,
+    })
+    failed = pd.DataFrame(rejected, columns=['row', 'staff_id', 'reason']).rename(columns={'reason': 'note'})
+    failed['action'] = 'rejected'
+
+    frames = [f for f in (created, repaid, failed) if not f.empty] or [created]
+    details = pd.concat(frames, ignore_index=True)
+    columns = ['row', 'staff_id', 'amount', 'action', 'loan_id', 'remaining', 'note']
+    return details.reindex(columns=columns).sort_values('row', kind='stable').reset_index(drop=True)
+
+
+# -------------------------------------------
+# Staff
+# -------------------------------------------
+def prepare_staff(df, report):
+    """Coerce and validate staff rows; duplicates are checked in one set-based pass."""
+    approved = df['approved'] if 'approved' in df else pd.Series('', index=df.index)
+    df = pd.DataFrame({
+        'row': df.index + 2,
+        'staff_id': df['staff_id'].fillna('').astype(str).str.strip(),
+        'name': df['name'].fillna('').astype(str).str.strip(),
+        'password': df['password'].fillna('').astype(str),
+        'approved': ~approved.fillna('').astype(str).str.strip().str.lower().isin(['no', 'n', 'false', '0']),
+    })
+    df = validate(df, report, [
+        (lambda d: d['staff_id'] == '', 'missing staff_id'),
+        (lambda d: d['staff_id'].str.len() > Staff.staff_id.type.length, 'staff_id too long'),
+        (lambda d: d['name'] == '', 'missing name'),
+        (lambda d: d['password'] == '', 'missing password'),
+        (lambda d: d['staff_id'].duplicated(), 'duplicate staff_id in file'),
+    ])
+    existing = staff_keys(df['staff_id'].unique())
+    return validate(df, report, [(lambda d: d['staff_id'].isin(list(existing)), 'staff_id already exists')])
+
+
+def ingest_staff(df, chunk_size=INSERT_CHUNK_SIZE, import_id=None):
+    """Create staff accounts from a DataFrame and return an IngestReport.
+
+    Initial passwords are hashed in parallel on the password pool, then all
+    rows go in with executemany. Staff rows need no fingerprint: staff_id is
+    unique already. The caller owns the transaction.
+    """
+    report = IngestReport()
+    report.total = len(df)
+    valid = prepare_staff(df, report)
+    hashes = password_hasher.hash_many(valid['password'].tolist())
+    records = valid[['staff_id', 'name', 'approved']].assign(password=hashes).to_dict('records')
+    report.count('Staff Created', bulk_insert(Staff, records, chunk_size))
+    return report
+
+
+# -------------------------------------------
+# Streaming Imports
+# -------------------------------------------
+INGESTERS = {
+    'payments': (PAYMENT_COLUMNS, ingest_payments),
+    'loans': (LOAN_COLUMNS, ingest_loans),
+    'staff': (STAFF_COLUMNS, ingest_staff),
+}
+
+
+class DuplicateUpload(Exception):
+    """The same file was uploaded before; `job` is the import that has it."""
+
+    def __init__(self, job):
+        super().__init__(f'File already uploaded as import #{job.id}')
+        self.job = job
+
+
+def store_upload(file):
+    """Stream an uploaded file to the instance folder; returns (path, sha256 hex)."""
+    directory = os.path.join(current_app.instance_path, UPLOAD_DIR)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}.csv')
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        while block := file.stream.read(UPLOAD_BLOCK):
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+
+def find_import(kind, content_hash):
+    return db.session.execute(
+        select(ImportJob).where(ImportJob.kind == kind, ImportJob.content_hash == content_hash)
+    ).scalar()
+
+
+def read_header(path):
+    return set(pd.read_csv(path, nrows=0).columns)
+
+
+def count_rows(path, block_size=1 << 20):
+    """Count data rows by scanning newlines in fixed-size blocks."""
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as fh:
+        while block := fh.read(block_size):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1  # final line without a trailing newline
+    return max(0, lines - 1)
+
+
+def iter_chunks(path, chunk_size, skip=0):
+    """Yield DataFrames of at most `chunk_size` rows, skipping `skip` data rows.
+
+    Each chunk keeps a file-wide index so CSV line numbers stay correct.
+    """
+    reader = pd.read_csv(path, dtype=TEXT_COLUMNS,
+                         chunksize=chunk_size, skiprows=range(1, skip + 1))
+    offset = skip
+    with reader:
+        for chunk in reader:
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+
+def create_import(kind, file, chunk_size):
+    """Store the upload and create its ImportJob (not yet run).
+
+    Returns None when the CSV header lacks the required columns. Raises
+    DuplicateUpload when a file with the same content was uploaded before
+    (one indexed lookup, before any row is read).
+    """
+    required, _ = INGESTERS[kind]
+    path, content_hash = store_upload(file)
+    existing = find_import(kind, content_hash)
+    if existing:
+        os.remove(path)
+        raise DuplicateUpload(existing)
+    if not required.issubset(read_header(path)):
+        os.remove(path)
+        return None
+
+    job = ImportJob(kind=kind, filename=file.filename, path=path, chunk_size=chunk_size, content_hash=content_hash,
+                    total_rows=count_rows(path), counts={}, rejected=0, rows_done=0)
+    job_queue.claim(job)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:  # the same file, submitted twice at once
+        db.session.rollback()
+        os.remove(path)
+        raise DuplicateUpload(find_import(kind, content_hash))
+    # A report left over from a reset database must not leak into this job's
+    stale = report_path(f'import-{job.id}')
+    if os.path.exists(stale):
+        os.remove(stale)
+    return job
+
+
+def run_import(job, on_progress=None):
+    """Process `job` chunk by chunk, resuming after the last committed row.
+
+    Every chunk is committed together with the job's progress, so a failure
+    never leaves rows committed that the job does not know about; resuming
+    simply continues from `rows_done`.
+    """
+    _, ingest = INGESTERS[job.kind]
+    job.status = 'running'
+    job_queue.claim(job)
+    job.error = None
+    db.session.commit()
+
+    try:
+        for chunk in iter_chunks(job.path, job.chunk_size, skip=job.rows_done):
+            report = ingest(chunk, import_id=job.id)
+            job.rows_done += len(chunk)
+            job.add_counts(report)
+            db.session.commit()
+            stats_cache.invalidate()
+            append_report(job, report)
+            if on_progress:
+                on_progress(job.progress)
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+        db.session.commit()
+        return job
+
+    job.status = 'done'
+    db.session.commit()
+    os.remove(job.path)
+    return job
+
+
+@task('import')
+def import_task(job, import_id):
+    """Background wrapper around run_import; a failed import fails the job."""
+    imported = db.session.get(ImportJob, import_id)
+    run_import(imported, lambda pct: job_queue.report_progress(job.id, pct))
+    if imported.status == 'failed':
+        raise RuntimeError(imported.error)
+
+
+def append_report(job, report):
+    """Append one chunk's detail rows to the job's report CSV."""
+    frame = report.to_frame()
+    if frame.empty:
+        return
+    path = report_path(f'import-{job.id}')
+    frame.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+
+def rejection_preview(job, limit):
+    """First `limit` rejected rows from the job's report, read in bounded chunks."""
+    path = report_path(f'import-{job.id}')
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with pd.read_csv(path, chunksize=LOOKUP_CHUNK_SIZE, dtype={'staff_id': str}) as reader:
+        for chunk in reader:
+            if 'action' in chunk.columns:
+                chunk = chunk[chunk['action'] == 'rejected'].rename(columns={'note': 'reason'})
+            rows.extend(chunk[['row', 'staff_id', 'reason']].fillna('').to_dict('records'))
+            if len(rows) >= limit:
+                break
+    return rows[:limit]
@@ -0,0 +1,186 @@
+from . import db
+from .models import Job, ImportJob
+from sqlalchemy import or_, update
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from importlib import import_module
+import os
+import socket
+import threading
+import time
+import uuid
+
+RESULT_DIR = 'job_results'
+STALE_HEARTBEATS = 4  # missed heartbeats before a job's process is presumed gone
+
+# -------------------------------------------
+# Task Registry
+# -------------------------------------------
+TASKS = {}
+# Modules that register each task, imported on first use so the web process
+# does not load pandas/numpy/ReportLab until a job actually needs them
+TASK_MODULES = {
+    'import': 'ingest',
+    'report_payments': 'reports',
+    'report_loans': 'reports',
+    'deductions': 'deductions',
+}
+
+
+def task(name):
+    """Register `fn(job, **params)` as a background task.
+
+    A task may return (source, filename, mimetype) to attach a downloadable
+    artifact to the job, where source is bytes or a path from
+    JobQueue.artifact_path(); or None.
+    """
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+def get_task(name):
+    if name not in TASKS and name in TASK_MODULES:
+        import_module(f'.{TASK_MODULES[name]}', __package__)
+    return TASKS[name]
+
+
+# -------------------------------------------
+# In-process Job Queue (no external broker)
+# -------------------------------------------
+class JobQueue:
+    """Thread pool that runs registered tasks against persisted Job rows.
+
+    Status and results live in the `jobs` table; live progress is kept in
+    memory so tasks can report it without writing to the database while
+    they are still reading from it.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.executor = None
+        self.heartbeat = 30
+        self._progress = {}
+        self._lock = threading.Lock()
+        self._owner = None
+        self._pid = None
+        self._beating = None
+
+    def init_app(self, app):
+        self.app = app
+        self.heartbeat = app.config['JOB_HEARTBEAT_SECONDS']
+        self.executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                           thread_name_prefix='job')
+        app.extensions['job_queue'] = self
+
+    @property
+    def owner(self):
+        """Identity of this process (host:pid:nonce); a forked worker gets its own."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._owner = f'{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}'
+            self._beating = None
+        return self._owner
+
+    def claim(self, row):
+        """Mark a Job/ImportJob as run by this process, and keep it heartbeating."""
+        row.owner = self.owner
+        row.heartbeat_on = datetime.utcnow()
+        self._start_heartbeat()
+
+    def recover(self):
+        """Fail jobs (and imports) whose process stopped heartbeating.
+
+        Rows owned by live workers, in this or another process, are left
+        alone. Interrupted imports keep their committed rows and can be resumed.
+        """
+        error = 'Interrupted by a server restart.'
+        stale = datetime.utcnow() - timedelta(seconds=self.heartbeat * STALE_HEARTBEATS)
+        (Job.query.filter(Job.status.in_(['queued', 'running']),
+                          or_(Job.heartbeat_on.is_(None), Job.heartbeat_on < stale))
+            .update({'status': 'failed', 'error': error, 'finished_on': datetime.utcnow()},
+                    synchronize_session=False))
+        (ImportJob.query.filter(ImportJob.status.in_(['pending', 'running']),
+                                or_(ImportJob.heartbeat_on.is_(None), ImportJob.heartbeat_on < stale))
+            .update({'status': 'failed', 'error': error}, synchronize_session=False))
+        db.session.commit()
+
+    def _start_heartbeat(self):
+        if self._beating is None:
+            self._beating = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+            self._beating.start()
+
+    def _beat(self):
+        """Refresh this process's unfinished rows, and fail rows of dead processes."""
+        owner = self.owner
+        while True:
+            time.sleep(self.heartbeat)
+            with self.app.app_context():
+                try:
+                    now = datetime.utcnow()
+                    for model, unfinished in ((Job, ['queued', 'running']), (ImportJob, ['pending', 'running'])):
+                        db.session.execute(update(model).where(model.owner == owner, model.status.in_(unfinished))
+                                           .values(heartbeat_on=now))
+                    db.session.commit()
+                    self.recover()
+                except Exception:  # e.g. "database is locked" behind a long import chunk
+                    db.session.rollback()
+                    self.app.logger.warning('Job heartbeat failed', exc_info=True)
+
+    def enqueue(self, kind, **params):
+        if kind not in TASKS and kind not in TASK_MODULES:
+            raise KeyError(f'Unknown job kind: {kind}')
+        job = Job(kind=kind, params=params, status='queued', progress=0)
+        self.claim(job)
+        db.session.add(job)
+        db.session.commit()
+        self.executor.submit(self._execute, job.id)
+        return job
+
+    def artifact_path(self, job, extension):
+        """File a task can write a large artifact to instead of returning bytes."""
+        directory = os.path.join(self.app.instance_path, RESULT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f'{job.id}.{extension}')
+
+    def report_progress(self, job_id, percent):
+        with self._lock:
+            self._progress[job_id] = max(0, min(100, int(percent)))
+
+    def progress(self, job):
+        """Live progress for running jobs, persisted progress otherwise."""
+        with self._lock:
+            return self._progress.get(job.id, job.progress or 0)
+
+    def _execute(self, job_id):
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            job.status = 'running'
+            job.started_on = datetime.utcnow()
+            db.session.commit()
+
+            try:
+                artifact = get_task(job.kind)(job, **(job.params or {}))
+            except Exception as e:
+                db.session.rollback()
+                job.status = 'failed'
+                job.error = str(e)
+                self.app.logger.exception('Job %s (%s) failed', job.id, job.kind)
+            else:
+                if artifact:
+                    source, job.result_name, job.result_mimetype = artifact
+                    if isinstance(source, str):
+                        job.result_path = source
+                    else:
+                        job.result = source
+                job.status = 'done'
+                job.progress = 100
+            job.finished_on = datetime.utcnow()
+            db.session.commit()
+
+            with self._lock:
+                self._progress.pop(job_id, None)
+
+
+job_queue = JobQueue()
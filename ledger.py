@@ -0,0 +1,152 @@
+from . import db
+from .models import Staff, Payment, PaymentArchive, Loan, StaffBalance
+from .stats import stats_cache
+from sqlalchemy import event, select, func, bindparam, and_
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+# -------------------------------------------
+# Per-staff balance ledger
+# -------------------------------------------
+# StaffBalance rows are kept in step with payments and loans inside the same
+# transaction as the write that changes them:
+#   * bulk uploads call add_payments()/refresh() explicitly;
+#   * ORM writes (approvals, apply_payment, deletions) are caught by the
+#     after_flush hook below.
+# `flask rebuild-balances` recomputes everything from scratch.
+
+LOOKUP_CHUNK_SIZE = 900
+OUTSTANDING_STATUSES = ['approved', 'paid']
+
+balances = StaffBalance.__table__
+
+
+def chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def ensure_rows(session, staff_ids):
+    """Insert zeroed balance rows for staff that do not have one yet."""
+    for chunk in chunks(staff_ids):
+        existing = set(session.execute(
+            select(balances.c.staff_id).where(balances.c.staff_id.in_(chunk))).scalars())
+        missing = [{'staff_id': sid, 'total_paid': 0.0, 'payment_count': 0,
+                    'outstanding_loans': 0.0, 'active_loans': 0}
+                   for sid in chunk if sid not in existing]
+        if missing:
+            session.execute(balances.insert(), missing)
+
+
+def refresh(staff_ids, payments=True, loans=True, session=None):
+    """Recompute balance rows for `staff_ids` from the payments/loans tables."""
+    session = session or db.session
+    staff_ids = {sid for sid in staff_ids if sid}
+    if not staff_ids:
+        return
+    ensure_rows(session, staff_ids)
+
+    owner = balances.c.staff_id
+    values = {'updated_on': datetime.utcnow()}
+    if payments:
+        # Lifetime totals: archived payments still count (see archive.py)
+        mine = Payment.__table__.c.staff_id == owner
+        archived = PaymentArchive.__table__.c.staff_id == owner
+        values.update(
+            total_paid=select(func.coalesce(func.sum(Payment.amount), 0.0)).where(mine).scalar_subquery()
+            + select(func.coalesce(func.sum(PaymentArchive.amount), 0.0)).where(archived).scalar_subquery(),
+            payment_count=select(func.count(Payment.id)).where(mine).scalar_subquery()
+            + select(func.count(PaymentArchive.id)).where(archived).scalar_subquery(),
+            last_payment_on=func.coalesce(
+                select(func.max(Payment.created_on)).where(mine).scalar_subquery(),
+                select(func.max(PaymentArchive.created_on)).where(archived).scalar_subquery()),
+            last_payment_month=func.coalesce(
+                select(Payment.month).where(mine).order_by(Payment.id.desc()).limit(1).scalar_subquery(),
+                select(PaymentArchive.month).where(archived)
+                .order_by(PaymentArchive.id.desc()).limit(1).scalar_subquery()),
+        )
+    if loans:
+        outstanding = and_(Loan.__table__.c.staff_id == owner, Loan.deleted == False,
+                           Loan.status.in_(OUTSTANDING_STATUSES), Loan.balance_amount > 0)
+        values.update(
+            outstanding_loans=select(func.coalesce(func.sum(Loan.balance_amount), 0.0))
+            .where(outstanding).scalar_subquery(),
+            active_loans=select(func.count(Loan.id)).where(outstanding).scalar_subquery(),
+        )
+
+    for chunk in chunks(staff_ids):
+        session.execute(balances.update().where(owner.in_(chunk)).values(**values))
+
+
+def add_payments(frame, session=None):
+    """Fold freshly bulk-inserted payments (staff_id, amount, month) into the ledger.
+
+    Incremental: only the uploaded rows are aggregated, not the staff's history.
+    """
+    if frame.empty:
+        return
+    session = session or db.session
+    per_staff = frame.groupby('staff_id', sort=False).agg(
+        delta=('amount', 'sum'), n=('amount', 'size'), month=('month', 'last'))
+    ensure_rows(session, per_staff.index)
+
+    now = datetime.utcnow()
+    stmt = (balances.update()
+            .where(balances.c.staff_id == bindparam('b_staff_id'))
+            .values(total_paid=balances.c.total_paid + bindparam('b_delta'),
+                    payment_count=balances.c.payment_count + bindparam('b_n'),
+                    last_payment_month=bindparam('b_month'),
+                    last_payment_on=now,
+                    updated_on=now))
+    session.execute(stmt, [
+        {'b_staff_id': sid, 'b_delta': float(delta), 'b_n': int(n), 'b_month': month}
+        for sid, delta, n, month in zip(per_staff.index, per_staff['delta'], per_staff['n'], per_staff['month'])
+    ])
+
+
+def rebuild():
+    """Repair loan totals and recompute every balance row; returns staff count."""
+    # Same repairs the dashboard used to apply on every page view
+    active = and_(Loan.deleted == False, Loan.status.in_(OUTSTANDING_STATUSES))
+    loans = Loan.__table__
+    db.session.execute(loans.update().where(active, loans.c.total_amount.is_(None))
+                       .values(total_amount=loans.c.amount))
+    db.session.execute(loans.update().where(active, loans.c.paid_amount.is_(None))
+                       .values(paid_amount=0))
+    db.session.execute(loans.update()
+                       .where(active, (loans.c.balance_amount.is_(None)) | (loans.c.balance_amount < 0))
+                       .values(balance_amount=loans.c.total_amount - loans.c.paid_amount))
+    db.session.execute(loans.update().where(active, loans.c.balance_amount <= 0)
+                       .values(status='paid'))
+
+    db.session.execute(balances.delete())
+    staff_ids = db.session.execute(select(Staff.staff_id)).scalars().all()
+    refresh(staff_ids)
+    db.session.commit()
+    stats_cache.invalidate()
+    return len(staff_ids)
+
+
+# -------------------------------------------
+# ORM write hook
+# -------------------------------------------
+@event.listens_for(Session, 'after_flush')
+def sync_after_flush(session, flush_context):
+    """Refresh balances for staff whose payments/loans changed in this flush."""
+    paid, owing, removed = set(), set(), set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Payment):
+            paid.add(obj.staff_id)
+        elif isinstance(obj, Loan):
+            owing.add(obj.staff_id)
+    for obj in session.deleted:
+        if isinstance(obj, Staff):
+            removed.add(obj.staff_id)
+
+    if paid:
+        refresh(paid, loans=False, session=session)
+    if owing:
+        refresh(owing, payments=False, session=session)
+    if removed:
+        session.execute(balances.delete().where(balances.c.staff_id.in_(list(removed))))
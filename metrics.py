@@ -0,0 +1,174 @@
+from . import db
+from flask import g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from bisect import bisect_left
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+
+# Upper bounds (seconds / counts); a +Inf bucket is always added
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+# -------------------------------------------
+# Histograms (Prometheus text format)
+# -------------------------------------------
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, values, amount):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, amount)] += 1
+        series[-1] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self._series.items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+            prefix = labels + ',' if labels else ''
+            running = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                running += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {running}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {running}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def current_endpoint():
+    """Route the current work belongs to; 'background' for jobs and CLI commands."""
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+# -------------------------------------------
+# Instrumentation
+# -------------------------------------------
+class Metrics:
+    """Opt-in request, SQL, template and bcrypt timings, plus sampled cProfile.
+
+    METRICS_ENABLED turns on the histograms served at /admin/metrics.
+    PROFILE_SAMPLE_RATE (0-1) profiles that fraction of requests and writes
+    one .prof file per profiled request to PROFILE_DIR. Both are off by
+    default, and nothing is hooked in when they are. Figures are per
+    process; scrape every worker.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.token = ''
+        self.sample_rate = 0.0
+        self.profile_dir = None
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()  # cProfile allows one active profiler at a time
+        self.requests = Histogram('http_request_duration_seconds', 'Time to build the response.',
+                                  ('endpoint', 'method', 'status'))
+        self.request_queries = Histogram('http_request_sql_queries', 'SQL statements issued per request.',
+                                         ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.queries = Histogram('sql_query_duration_seconds', 'Time spent executing each SQL statement.',
+                                 ('endpoint',))
+        self.templates = Histogram('template_render_seconds', 'Time to render a template.', ('template',))
+        self.hashing = Histogram('bcrypt_duration_seconds', 'Time spent in bcrypt, including pool wait.',
+                                 ('operation',))
+
+    def init_app(self, app):
+        self.enabled = app.config['METRICS_ENABLED']
+        self.token = app.config['METRICS_TOKEN']
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.profile_dir = app.config['PROFILE_DIR']
+        app.extensions['metrics'] = self
+        if self.enabled or self.sample_rate > 0:
+            app.before_request(self._start_request)
+            app.after_request(self._finish_request)
+        if self.enabled:
+            with app.app_context():
+                event.listen(db.engine, 'before_cursor_execute', self._start_query)
+                event.listen(db.engine, 'after_cursor_execute', self._finish_query)
+            before_render_template.connect(self._start_render, app)
+            template_rendered.connect(self._finish_render, app)
+
+    def observe(self, histogram, values, amount):
+        if self.enabled:
+            with self._lock:
+                histogram.observe(values, amount)
+
+    def time_hash(self, operation, started):
+        """Record a bcrypt call that began at perf_counter() value `started`."""
+        self.observe(self.hashing, (operation,), time.perf_counter() - started)
+
+    def token_matches(self, header):
+        """True for an 'Authorization: Bearer <METRICS_TOKEN>' header."""
+        return bool(self.token) and hmac.compare_digest(header, f'Bearer {self.token}')
+
+    def render(self):
+        with self._lock:
+            histograms = (self.requests, self.request_queries, self.queries, self.templates, self.hashing)
+            return '\n'.join(line for h in histograms for line in h.render()) + '\n'
+
+    # Request hooks
+    def _start_request(self):
+        g.metrics_queries = 0
+        g.metrics_started = time.perf_counter()
+        if self.sample_rate > 0 and random.random() < self.sample_rate and self._profiling.acquire(blocking=False):
+            g.metrics_profile = cProfile.Profile()
+            g.metrics_profile.enable()
+
+    def _finish_request(self, response):
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            profile.disable()
+            self._profiling.release()
+            self._dump(profile)
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = current_endpoint()
+            self.observe(self.requests, (endpoint, request.method, str(response.status_code)),
+                         time.perf_counter() - started)
+            self.observe(self.request_queries, (endpoint,), g.pop('metrics_queries', 0))
+        return response
+
+    def _dump(self, profile):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = f"{current_endpoint()}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{random.randrange(1 << 16):04x}.prof"
+        profile.dump_stats(os.path.join(self.profile_dir, name))
+
+    # SQLAlchemy engine events
+    def _start_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _finish_query(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        self.observe(self.queries, (current_endpoint(),), time.perf_counter() - started)
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+
+    # Template signals
+    def _start_render(self, app, template, context, **extra):
+        g.setdefault('metrics_renders', []).append(time.perf_counter())
+
+    def _finish_render(self, app, template, context, **extra):
+        renders = g.get('metrics_renders')
+        if renders:
+            self.observe(self.templates, (template.name or 'string',), time.perf_counter() - renders.pop())
+
+
+metrics = Metrics()
@@ -1,6 +1,10 @@
 from . import db, login_manager
+from .money import Money, as_money
 from flask_login import UserMixin
-from datetime import datetime
+from sqlalchemy import event, select, true, union_all
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 # -------------------------------------------
 # Admin Model
@@ -38,9 +42,13 @@ class Staff(UserMixin, db.Model):
 # -------------------------------------------
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_staff_created', 'staff_id', 'created_on'),  # staff dashboard, ledger
+    )
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.String(20), db.ForeignKey('staff.staff_id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    staff_pk = db.Column(db.Integer, db.ForeignKey('staff.id'), index=True)  # integer FK, see migrate_staff_keys
+    amount = db.Column(Money, nullable=False)
     month = db.Column(db.String(20), nullable=False)
     created_on = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -50,31 +58,341 @@ class Payment(db.Model):
 # -------------------------------------------
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        db.Index('ix_loans_staff_active', 'staff_id', 'deleted', 'status', 'id'),  # active-loan lookups
+        db.Index('ix_loans_status_requested', 'status', 'requested_on'),  # pending loans list
+    )
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.String(20), db.ForeignKey('staff.staff_id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)  # Principal amount
+    staff_pk = db.Column(db.Integer, db.ForeignKey('staff.id'), index=True)  # integer FK, see migrate_staff_keys
+    amount = db.Column(Money, nullable=False)  # Principal amount
     interest_rate = db.Column(db.Float, default=0.0)  # Interest rate (%)
     tenure_months = db.Column(db.Integer, default=10)  # Loan duration
-    total_amount = db.Column(db.Float, default=0.0)  # Principal + interest
-    paid_amount = db.Column(db.Float, default=0.0)  # Total paid till date
-    balance_amount = db.Column(db.Float, default=0.0)  # Remaining balance
+    total_amount = db.Column(Money, default=0)  # Principal + interest
+    paid_amount = db.Column(Money, default=0)  # Total paid till date
+    balance_amount = db.Column(Money, default=0)  # Remaining balance
     status = db.Column(db.String(20), default='pending')  # pending/approved/rejected
     requested_on = db.Column(db.DateTime, default=datetime.utcnow)
     deleted = db.Column(db.Boolean, default=False)
 
     def calculate_total_with_interest(self):
-        """Compute total payable (principal + interest)"""
-        interest = (self.amount * self.interest_rate) / 100
-        self.total_amount = self.amount + interest
+        """Compute total payable (principal + interest), rounded to the paisa"""
+        amount = as_money(self.amount)
+        interest = as_money(amount * Decimal(str(self.interest_rate or 0)) / 100)
+        self.total_amount = amount + interest
         self.balance_amount = self.total_amount
 
     def apply_payment(self, payment_amount):
         """Reduce balance when admin updates payment"""
-        self.paid_amount += payment_amount
-        self.balance_amount = max(0.0, self.total_amount - self.paid_amount)
+        self.paid_amount = as_money(self.paid_amount or 0) + as_money(payment_amount)
+        self.balance_amount = max(as_money(0), as_money(self.total_amount) - self.paid_amount)
         if self.balance_amount <= 0:
             self.status = 'paid'
 
+    def sync_balance(self):
+        """Fill in missing totals and close the loan once nothing is owed"""
+        if self.total_amount is None:
+            self.total_amount = self.amount
+        if self.paid_amount is None:
+            self.paid_amount = 0
+        if self.balance_amount is None or self.balance_amount < 0:
+            self.balance_amount = as_money(self.total_amount) - as_money(self.paid_amount)
+        if self.balance_amount <= 0:
+            self.status = 'paid'
+
+
+# -------------------------------------------
+# Deduction Run Model (month-end payroll EMI recovery)
+# -------------------------------------------
+class DeductionRun(db.Model):
+    __tablename__ = 'deduction_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+    loans_checked = db.Column(db.Integer, default=0)  # active loans not yet deducted this month
+    deducted = db.Column(db.Integer, default=0)  # repayments written
+    skipped = db.Column(db.Integer, default=0)  # already deducted for this month
+    total_amount = db.Column(Money, default=0)
+    loans_closed = db.Column(db.Integer, default=0)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_on = db.Column(db.DateTime)
+
+    @property
+    def summary(self):
+        return [('Loans Checked', self.loans_checked), ('Deductions', self.deducted),
+                ('Already Deducted', self.skipped), ('Loans Closed', self.loans_closed)]
+
+
+# -------------------------------------------
+# Repayment Model (one EMI recovered from a loan)
+# -------------------------------------------
+class Repayment(db.Model):
+    __tablename__ = 'repayments'
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'month', name='uq_repayments_loan_month'),  # one EMI per loan per month
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('deduction_runs.id'), index=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
+    staff_id = db.Column(db.String(20), db.ForeignKey('staff.staff_id'), nullable=False, index=True)  # statements
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    amount = db.Column(Money, nullable=False)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# -------------------------------------------
+# Staff Balance Model (per-staff ledger summary)
+# -------------------------------------------
+class StaffBalance(db.Model):
+    """Running totals per staff, maintained by the payment/loan write paths"""
+    __tablename__ = 'staff_balances'
+    staff_id = db.Column(db.String(20), db.ForeignKey('staff.staff_id'), primary_key=True)
+    total_paid = db.Column(Money, default=0)
+    payment_count = db.Column(db.Integer, default=0)
+    last_payment_month = db.Column(db.String(20))
+    last_payment_on = db.Column(db.DateTime)
+    outstanding_loans = db.Column(Money, default=0)  # balance of approved/paid loans
+    active_loans = db.Column(db.Integer, default=0)
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# -------------------------------------------
+# Import Job Model (resumable chunked CSV uploads)
+# -------------------------------------------
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    __table_args__ = (
+        db.Index('ux_import_jobs_kind_content', 'kind', 'content_hash', unique=True),  # one job per file
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # payments/loans
+    filename = db.Column(db.String(255))  # original upload name
+    content_hash = db.Column(db.String(64))  # sha256 of the uploaded bytes
+    path = db.Column(db.String(500), nullable=False)  # stored copy of the upload
+    chunk_size = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending/running/done/failed
+    total_rows = db.Column(db.Integer, default=0)
+    rows_done = db.Column(db.Integer, default=0)  # rows committed so far
+    counts = db.Column(db.JSON, default=dict)  # summary counts, e.g. {"Inserted": 10}
+    rejected = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    owner = db.Column(db.String(100))  # process running it, see JobQueue.owner
+    heartbeat_on = db.Column(db.DateTime)  # refreshed by the owner while pending/running
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def progress(self):
+        """Percentage of rows committed"""
+        if not self.total_rows:
+            return 100 if self.status == 'done' else 0
+        return min(100, int(self.rows_done * 100 / self.total_rows))
+
+    @property
+    def summary(self):
+        return [('Rows Read', self.rows_done), *(self.counts or {}).items(), ('Rejected', self.rejected or 0)]
+
+    def add_counts(self, report):
+        """Fold one chunk's IngestReport into the running totals"""
+        counts = dict(self.counts or {})
+        for label, n in report.counts.items():
+            counts[label] = counts.get(label, 0) + n
+        self.counts = counts
+        self.rejected = (self.rejected or 0) + len(report.rejected)
+
+
+# -------------------------------------------
+# Import Fingerprint Model (rows already ingested from uploads)
+# -------------------------------------------
+class ImportFingerprint(db.Model):
+    """One logical upload row; the unique key makes re-imported rows no-ops"""
+    __tablename__ = 'import_fingerprints'
+    __table_args__ = (
+        db.UniqueConstraint('source', 'staff_id', 'month', 'amount', name='uq_import_fingerprints_row'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(10), nullable=False)  # payment/loan/repayment
+    staff_id = db.Column(db.String(20), nullable=False)
+    month = db.Column(db.String(20), nullable=False)  # the row's month, or the upload month (YYYY-MM)
+    amount = db.Column(Money, nullable=False)
+    import_id = db.Column(db.Integer, db.ForeignKey('import_jobs.id'))
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# -------------------------------------------
+# Background Job Model
+# -------------------------------------------
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)  # registered task name
+    params = db.Column(db.JSON, default=dict)
+    status = db.Column(db.String(20), default='queued')  # queued/running/done/failed
+    progress = db.Column(db.Integer, default=0)  # 0-100
+    error = db.Column(db.Text)
+    result = db.Column(db.LargeBinary)  # small finished artifact, if any
+    result_path = db.Column(db.String(500))  # large artifact written to disk
+    result_name = db.Column(db.String(255))
+    result_mimetype = db.Column(db.String(100))
+    owner = db.Column(db.String(100))  # process running it, see JobQueue.owner
+    heartbeat_on = db.Column(db.DateTime)  # refreshed by the owner while queued/running
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    started_on = db.Column(db.DateTime)
+    finished_on = db.Column(db.DateTime)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    @property
+    def has_result(self):
+        return self.result is not None or self.result_path is not None
+
+
+# -------------------------------------------
+# Schema Migration Model (one-off data migrations already applied)
+# -------------------------------------------
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    name = db.Column(db.String(100), primary_key=True)
+    applied_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# -------------------------------------------
+# Monthly Rollups (analytics, refreshed incrementally)
+# -------------------------------------------
+class CollectionRollup(db.Model):
+    """Money collected per calendar month and staff, by source (payment/emi)"""
+    __tablename__ = 'collection_rollups'
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    staff_id = db.Column(db.String(20), primary_key=True, index=True)  # no FK: history outlives staff rows
+    source = db.Column(db.String(10), primary_key=True)  # payment = uploaded payment, emi = loan deduction
+    total = db.Column(Money, default=0)
+    count = db.Column(db.Integer, default=0)
+
+
+class LoanBookSnapshot(db.Model):
+    """Loan book by status as last seen in `month`; earlier months stay frozen"""
+    __tablename__ = 'loan_book_snapshots'
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    status = db.Column(db.String(20), primary_key=True)
+    loans = db.Column(db.Integer, default=0)
+    disbursed = db.Column(Money, default=0)  # principal
+    total_payable = db.Column(Money, default=0)
+    repaid = db.Column(Money, default=0)
+    outstanding = db.Column(Money, default=0)
+    requested = db.Column(db.Integer, default=0)  # loans requested during the month
+    requested_amount = db.Column(Money, default=0)
+    taken_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RollupWatermark(db.Model):
+    """Highest source row id already folded into the rollups"""
+    __tablename__ = 'rollup_watermarks'
+    name = db.Column(db.String(40), primary_key=True)
+    last_id = db.Column(db.Integer, default=0)
+    refreshed_on = db.Column(db.DateTime)
+
+
+# -------------------------------------------
+# Archive (cold) tables: old payments, closed loans and their repayments
+# -------------------------------------------
+# Same columns as the hot tables plus archived_on; ids are kept, so id-based
+# cursors and rollup watermarks stay valid. No foreign keys: history
+# outlives the staff rows and loans it refers to.
+class PaymentArchive(db.Model):
+    __tablename__ = 'payments_archive'
+    __table_args__ = (
+        db.Index('ix_payments_archive_staff_created', 'staff_id', 'created_on'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    staff_id = db.Column(db.String(20), nullable=False)
+    staff_pk = db.Column(db.Integer)
+    amount = db.Column(Money, nullable=False)
+    month = db.Column(db.String(20), nullable=False)
+    created_on = db.Column(db.DateTime)
+    archived_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class LoanArchive(db.Model):
+    __tablename__ = 'loans_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    staff_id = db.Column(db.String(20), nullable=False, index=True)
+    staff_pk = db.Column(db.Integer)
+    amount = db.Column(Money, nullable=False)
+    interest_rate = db.Column(db.Float, default=0.0)
+    tenure_months = db.Column(db.Integer, default=10)
+    total_amount = db.Column(Money, default=0)
+    paid_amount = db.Column(Money, default=0)
+    balance_amount = db.Column(Money, default=0)
+    status = db.Column(db.String(20))
+    requested_on = db.Column(db.DateTime)
+    deleted = db.Column(db.Boolean, default=False)
+    archived_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RepaymentArchive(db.Model):
+    __tablename__ = 'repayments_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    run_id = db.Column(db.Integer)
+    loan_id = db.Column(db.Integer, nullable=False, index=True)
+    staff_id = db.Column(db.String(20), nullable=False, index=True)
+    month = db.Column(db.String(7), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    created_on = db.Column(db.DateTime)
+    archived_on = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+ARCHIVES = {Payment: PaymentArchive, Loan: LoanArchive, Repayment: RepaymentArchive}
+
+
+def history(model, archived=False):
+    """`model`'s table, or with archived=True a UNION ALL of it and its archive.
+
+    Either way the result has the hot table's columns (and types), so the
+    same query works against both; filter through `.c`.
+    """
+    table = model.__table__
+    if not archived:
+        return table
+    archive = ARCHIVES[model].__table__
+    return union_all(select(table), select(*(archive.c[c.name] for c in table.c))).subquery(table.name)
+
+
+# -------------------------------------------
+# Id cursors over append-only tables
+# -------------------------------------------
+# SQLite has a single writer, so ids become visible in commit order and
+# "everything up to the largest id seen" is a safe cursor. Server databases
+# (PostgreSQL, MySQL) take ids from a sequence before commit: a transaction
+# still in flight can commit a smaller id after a reader has moved past it.
+# There, id cursors only move over rows older than ID_CURSOR_SETTLE, which
+# assumes no write transaction stays open longer than that.
+ID_CURSOR_SETTLE = timedelta(minutes=5)
+
+
+def settled(created_on):
+    """Filter for rows an id cursor may move past (everything on SQLite)."""
+    if db.engine.dialect.name == 'sqlite':
+        return true()
+    return created_on < datetime.utcnow() - ID_CURSOR_SETTLE
+
+
+# -------------------------------------------
+# Integer staff key (staff_pk) for new payments/loans
+# -------------------------------------------
+@event.listens_for(Session, 'before_flush')
+def fill_staff_keys(session, flush_context, instances):
+    """Resolve staff_pk from staff_id for pending Payment/Loan rows in one query"""
+    pending = [obj for obj in session.new
+               if isinstance(obj, (Payment, Loan)) and obj.staff_pk is None and obj.staff_id]
+    if not pending:
+        return
+    keys = dict(session.execute(
+        select(Staff.staff_id, Staff.id).where(Staff.staff_id.in_({obj.staff_id for obj in pending}))
+    ).all())
+    for obj in pending:
+        obj.staff_pk = keys.get(obj.staff_id)
+
 
 # -------------------------------------------
 # Flask-Login Loader (supports Admin & Staff)
@@ -91,8 +409,10 @@ def load_user(compound_id):
     except ValueError:
         return None
 
+    # Flask-Login calls this at most once per request and caches the result
+    # on flask.g; Session.get also short-circuits via the identity map.
     if role == 'Admin':
-        return Admin.query.get(user_id)
+        return db.session.get(Admin, user_id)
     elif role == 'Staff':
-        return Staff.query.get(user_id)
+        return db.session.get(Staff, user_id)
     return None
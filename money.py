@@ -0,0 +1,46 @@
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import types
+
+# -------------------------------------------
+# Exact money: integer paise in the database, Decimal rupees in Python
+# -------------------------------------------
+PAISA = Decimal('0.01')
+MAX_PAISE = 2**63 - 1  # BIGINT
+
+
+def as_money(value):
+    """Round any number (float, str, Decimal, numpy scalar) to whole paise as a Decimal."""
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def to_paise(value):
+    """Rupees -> integer paise, rounding half up."""
+    if isinstance(value, Decimal):
+        return int(value.quantize(PAISA, rounding=ROUND_HALF_UP).scaleb(2))
+    # Two-decimal floats are within 1e-9 of a whole paisa, so this is exact for them
+    return int(Decimal(round(float(value) * 100, 6)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_paise(paise):
+    """Integer paise -> Decimal rupees (tolerates REAL columns from older databases)."""
+    return Decimal(int(round(paise))).scaleb(-2)
+
+
+class Money(types.TypeDecorator):
+    """Rupee amount stored exactly as an integer number of paise.
+
+    Binds accept floats, ints, strings or Decimals; results come back as
+    Decimal rupees, so sums and repayments never drift.
+    """
+    impl = types.BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_paise(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_paise(value)
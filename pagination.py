@@ -0,0 +1,113 @@
+from flask import request
+from sqlalchemy import and_, or_
+from datetime import datetime
+from decimal import Decimal
+import base64
+import json
+
+# -------------------------------------------
+# Keyset (seek) pagination for admin lists
+# -------------------------------------------
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+class Page:
+    """One page of rows plus opaque cursors for the neighbouring pages."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, sort=None, order=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.sort = sort
+        self.order = order
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(value, row_id):
+    if isinstance(value, datetime):
+        value = {'dt': value.isoformat()}
+    elif isinstance(value, Decimal):
+        value = {'dec': str(value)}
+    raw = json.dumps([value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (value, id) or None for a missing/garbled cursor."""
+    if not token:
+        return None
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if isinstance(value, dict):
+            value = Decimal(value['dec']) if 'dec' in value else datetime.fromisoformat(value['dt'])
+        return value, int(row_id)
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        return None
+
+
+def keyset_page(query, sort_column, id_column, after=None, before=None, descending=True,
+                per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of `query` ordered by (sort_column, id_column).
+
+    Seeks past the cursor with a WHERE clause instead of OFFSET, so every
+    page costs one indexed query no matter how deep it is.
+    """
+    cursor = decode_cursor(before) or decode_cursor(after)
+    backwards = cursor is not None and decode_cursor(before) is not None
+    scan_desc = descending != backwards
+
+    if cursor:
+        value, last_id = cursor
+        if scan_desc:
+            seek = or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+        else:
+            seek = or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+        query = query.filter(seek)
+
+    if scan_desc:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    # Leaving a page always means the page we came from exists
+    has_next = more if not backwards else True
+    has_prev = more if backwards else cursor is not None
+    return Page(rows, per_page,
+                next_cursor=key(rows[-1]) if rows and has_next else None,
+                prev_cursor=key(rows[0]) if rows and has_prev else None)
+
+
+def paginate(query, sortable, default_sort, id_column):
+    """Keyset-paginate `query` using the current request's query string.
+
+    `sortable` maps the public `sort` values to columns. Understands
+    `sort`, `order` (asc/desc), `after`, `before` and `per_page`.
+    """
+    sort = request.args.get('sort', default_sort)
+    if sort not in sortable:
+        sort = default_sort
+    order = 'asc' if request.args.get('order') == 'asc' else 'desc'
+    per_page = min(max(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+
+    page = keyset_page(query, sortable[sort], id_column,
+                       after=request.args.get('after'), before=request.args.get('before'),
+                       descending=order == 'desc', per_page=per_page)
+    page.sort, page.order = sort, order
+    return page
@@ -0,0 +1,140 @@
+from . import db
+from .metrics import metrics
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError, wait
+from werkzeug.exceptions import TooManyRequests
+import bcrypt as _bcrypt
+import threading
+import time
+
+HASH_BATCH = 8  # passwords per pool task in hash_many
+
+
+# -------------------------------------------
+# bcrypt work (runs in the pool processes)
+# -------------------------------------------
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _hash_batch(passwords, rounds):
+    return [_hash(password, rounds) for password in passwords]
+
+
+def _check(pw_hash, password):
+    try:
+        return _bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    except ValueError:  # malformed stored hash
+        return False
+
+
+class HasherBusy(TooManyRequests):
+    """Every hashing slot is taken; the client should retry shortly."""
+    description = 'The server is busy signing people in. Please try again in a few seconds.'
+
+    def __init__(self):
+        super().__init__(retry_after=2)
+
+
+# -------------------------------------------
+# Bounded password hasher
+# -------------------------------------------
+class PasswordHasher:
+    """Runs bcrypt in a process pool with a cap on waiting requests.
+
+    At most HASH_WORKERS hashes run at once and HASH_QUEUE_LIMIT more may
+    wait; beyond that callers get HasherBusy (HTTP 429) straight away
+    instead of piling up behind a login storm. HASH_WORKERS = 0 hashes
+    inline in the request thread.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 0
+        self.timeout = 10
+        self._slots = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.workers = app.config['HASH_WORKERS']
+        self.timeout = app.config['HASH_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) + app.config['HASH_QUEUE_LIMIT'])
+        app.extensions['password_hasher'] = self
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                return fn(*args)
+            try:
+                return self._executor().submit(fn, *args).result(timeout=self.timeout)
+            except TimeoutError:
+                raise HasherBusy()
+        finally:
+            self._slots.release()
+            metrics.time_hash(operation, started)
+
+    def _executor(self):
+        # Started on first use so CLI commands and imports never fork
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def hash(self, password):
+        return self._run('hash', _hash, password, self.rounds)
+
+    def hash_many(self, passwords):
+        """Hash a list of passwords in parallel (bulk imports).
+
+        Only one small batch per worker is in flight at a time, so a login
+        arriving mid-import waits behind at most one batch, not the whole file.
+        Bypasses the request slots: callers are background jobs.
+        """
+        started = time.perf_counter()
+        try:
+            return self._hash_many(passwords)
+        finally:
+            metrics.time_hash('hash_many', started)
+
+    def _hash_many(self, passwords):
+        if not self.workers:
+            return _hash_batch(passwords, self.rounds)
+        batches = [passwords[i:i + HASH_BATCH] for i in range(0, len(passwords), HASH_BATCH)]
+        results = [None] * len(batches)
+        pending = {}
+        for index, batch in enumerate(batches):
+            if len(pending) >= self.workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            pending[self._executor().submit(_hash_batch, batch, self.rounds)] = index
+        for future, index in pending.items():
+            results[index] = future.result()
+        return [pw_hash for batch in results for pw_hash in batch]
+
+    def check(self, pw_hash, password):
+        return self._run('check', _check, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True when the stored hash was made with a different cost factor."""
+        try:
+            return int(pw_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def verify(self, user, password):
+        """Check `user.password`, upgrading the stored hash if the cost changed."""
+        if not user or not user.password or not self.check(user.password, password):
+            return False
+        if self.needs_rehash(user.password):
+            user.password = self.hash(password)
+            db.session.commit()
+        return True
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,248 @@
+from . import db
+from .models import Payment, Loan
+from .jobs import task, job_queue
+from .filters import filter_clauses, describe
+from sqlalchemy import select, func
+from datetime import datetime
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from array import array
+import os
+import zlib
+
+ROWS_PER_PAGE = 40
+ROW_HEIGHT = 17
+YIELD_PER = 2000       # rows fetched from the cursor at a time
+PROGRESS_EVERY = 1000  # rows between progress updates
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 40
+
+
+# -------------------------------------------
+# Page-at-a-time PDF writer
+# -------------------------------------------
+# ReportLab's canvas keeps every finished page until save(), so a 100k-row
+# report holds thousands of pages in memory. The reports only need text in
+# the standard Helvetica faces and rules, so PageWriter offers those canvas
+# calls and writes each page to the file as soon as it is finished; all it
+# keeps across pages is two byte offsets per page for the xref table.
+FONTS = {'Helvetica': 'F1', 'Helvetica-Bold': 'F2', 'Helvetica-Oblique': 'F3'}
+CATALOG, PAGES, FIRST_FONT = 1, 2, 3
+FIRST_PAGE = FIRST_FONT + len(FONTS)  # each page is a content stream, then its page object
+
+
+def pdf_text(value):
+    raw = str(value).encode('cp1252', 'replace')  # WinAnsiEncoding
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class PageWriter:
+    """The subset of reportlab's Canvas API TableReport uses, streamed to `out` (path or binary file)."""
+
+    def __init__(self, out, pagesize):
+        self.own_file = isinstance(out, (str, os.PathLike))
+        self.out = open(out, 'wb') if self.own_file else out
+        self.width, self.height = pagesize
+        self.written = 0
+        self.offsets = {}  # byte offset of each fixed object, for the xref table
+        self.page_offsets = array('Q')  # and of each page's two objects, in order
+        self.pages = 0
+        self.ops = []  # drawing operators of the current page only
+        self.font = ('Helvetica', 9)
+        self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def write(self, data):
+        self.out.write(data)
+        self.written += len(data)
+
+    def write_object(self, number, body, stream=None):
+        if number < FIRST_PAGE:
+            self.offsets[number] = self.written
+        else:
+            self.page_offsets.append(self.written)
+        self.write(b'%d 0 obj\n' % number + body)
+        if stream is not None:
+            self.write(b'\nstream\n' + stream + b'\nendstream')
+        self.write(b'\nendobj\n')
+
+    # Canvas calls
+    def setFont(self, name, size):
+        self.font = (name, size)
+
+    def drawString(self, x, y, text):
+        name, size = self.font
+        self.ops.append(b'BT /%s %g Tf %.2f %.2f Td (%s) Tj ET' % (FONTS[name].encode(), size, x, y, pdf_text(text)))
+
+    def drawRightString(self, x, y, text):
+        self.drawString(x - stringWidth(str(text), *self.font), y, text)
+
+    def line(self, x1, y1, x2, y2):
+        self.ops.append(b'%.2f %.2f m %.2f %.2f l S' % (x1, y1, x2, y2))
+
+    def showPage(self):
+        contents = FIRST_PAGE + 2 * self.pages
+        stream = zlib.compress(b'\n'.join(self.ops))
+        self.write_object(contents, b'<< /Length %d /Filter /FlateDecode >>' % len(stream), stream)
+        fonts = b' '.join(b'/%s %d 0 R' % (ref.encode(), FIRST_FONT + i) for i, ref in enumerate(FONTS.values()))
+        self.write_object(contents + 1, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] '
+                                        b'/Resources << /Font << %s >> >> /Contents %d 0 R >>'
+                          % (PAGES, self.width, self.height, fonts, contents))
+        self.pages += 1
+        self.ops = []
+
+    def save(self):
+        if self.ops or not self.pages:
+            self.showPage()
+        for i, name in enumerate(FONTS):
+            self.write_object(FIRST_FONT + i, b'<< /Type /Font /Subtype /Type1 /BaseFont /%s '
+                                              b'/Encoding /WinAnsiEncoding >>' % name.encode())
+        kids = b' '.join(b'%d 0 R' % (FIRST_PAGE + 2 * i + 1) for i in range(self.pages))
+        self.write_object(PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, self.pages))
+        self.write_object(CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES)
+
+        xref = self.written
+        count = FIRST_PAGE + 2 * self.pages
+        self.write(b'xref\n0 %d\n0000000000 65535 f \n' % count)
+        self.write(b''.join(b'%010d 00000 n \n' % self.offsets[n] for n in range(1, FIRST_PAGE)))
+        for start in range(0, len(self.page_offsets), 1000):
+            self.write(b''.join(b'%010d 00000 n \n' % offset for offset in self.page_offsets[start:start + 1000]))
+        self.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (count, CATALOG, xref))
+        if self.own_file:
+            self.out.close()
+
+
+# -------------------------------------------
+# Tabular PDF Rendering
+# -------------------------------------------
+class TableReport:
+    """Fixed-row paginated table drawn straight onto a canvas.
+
+    `columns` is a list of (header, width, align) with align 'left' or
+    'right'. Rows are consumed one at a time and each finished page is
+    written out, so nothing but the current page is held in memory.
+    """
+
+    def __init__(self, out, title, subtitle, columns):
+        self.pdf = PageWriter(out, A4)
+        self.title = title
+        self.subtitle = subtitle
+        self.columns = columns
+        self.generated = datetime.now().strftime('%Y-%m-%d %H:%M')
+        self.page = 0
+        self.row_on_page = ROWS_PER_PAGE  # forces a header before the first row
+
+    def start_page(self):
+        if self.page:
+            self.pdf.showPage()
+        self.page += 1
+        self.row_on_page = 0
+
+        pdf = self.pdf
+        top = PAGE_HEIGHT - MARGIN
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(MARGIN, top, self.title)
+        pdf.setFont("Helvetica", 9)
+        pdf.drawString(MARGIN, top - 16, self.subtitle)
+        pdf.drawRightString(PAGE_WIDTH - MARGIN, top - 16, f"Generated {self.generated}")
+
+        self.draw_cells(top - 44, [header for header, _, _ in self.columns], bold=True)
+        pdf.line(MARGIN, top - 49, PAGE_WIDTH - MARGIN, top - 49)
+        pdf.setFont("Helvetica", 8)
+        pdf.drawRightString(PAGE_WIDTH - MARGIN, MARGIN - 15, f"Page {self.page}")
+
+    def draw_cells(self, y, values, bold=False):
+        self.pdf.setFont("Helvetica-Bold" if bold else "Helvetica", 9)
+        x = MARGIN
+        for value, (_, width, align) in zip(values, self.columns):
+            if align == 'right':
+                self.pdf.drawRightString(x + width - 4, y, value)
+            else:
+                self.pdf.drawString(x + 2, y, value)
+            x += width
+
+    def add_row(self, values):
+        if self.row_on_page >= ROWS_PER_PAGE:
+            self.start_page()
+        y = PAGE_HEIGHT - MARGIN - 66 - self.row_on_page * ROW_HEIGHT
+        self.draw_cells(y, values)
+        self.row_on_page += 1
+
+    def finish(self, total):
+        if not self.page:
+            self.start_page()
+        self.pdf.setFont("Helvetica-Oblique", 8)
+        self.pdf.drawString(MARGIN, MARGIN - 15, f"{total} records")
+        self.pdf.save()
+
+
+def money(value):
+    return f"{value or 0:,.2f}"
+
+
+def stream_rows(stmt):
+    """Iterate a column-only SELECT in batches without hydrating ORM objects."""
+    return db.session.execute(stmt.execution_options(yield_per=YIELD_PER))
+
+
+def render(out, title, filters, columns, count_stmt, stmt, format_row, on_progress=None):
+    total = db.session.scalar(count_stmt)
+    report = TableReport(out, title, describe(filters), columns)
+    count = 0
+    for count, row in enumerate(stream_rows(stmt), 1):
+        report.add_row(format_row(row))
+        if on_progress and count % PROGRESS_EVERY == 0:
+            on_progress(count * 100 // max(total, 1))
+    report.finish(count)
+
+
+# -------------------------------------------
+# Reports
+# -------------------------------------------
+PAYMENT_COLUMNS = [('Staff ID', 130, 'left'), ('Month', 120, 'left'),
+                   ('Amount (Rs.)', 130, 'right'), ('Date', 135, 'right')]
+
+LOAN_COLUMNS = [('Loan', 40, 'left'), ('Staff ID', 75, 'left'), ('Principal', 70, 'right'),
+                ('Total', 70, 'right'), ('Paid', 70, 'right'), ('Balance', 70, 'right'),
+                ('Status', 60, 'right'), ('Requested', 60, 'right')]
+
+
+def payments_report(out, filters=None, on_progress=None):
+    filters = filters or {}
+    clauses = filter_clauses(Payment, Payment.created_on, filters)
+    stmt = (select(Payment.staff_id, Payment.month, Payment.amount, Payment.created_on)
+            .where(*clauses).order_by(Payment.created_on.desc()))
+    count_stmt = select(func.count(Payment.id)).where(*clauses)
+    render(out, "Staff Payments Report", filters, PAYMENT_COLUMNS, count_stmt, stmt,
+           lambda r: [r.staff_id, r.month, money(r.amount), r.created_on.strftime('%Y-%m-%d')],
+           on_progress)
+
+
+def loans_report(out, filters=None, on_progress=None):
+    filters = filters or {}
+    clauses = filter_clauses(Loan, Loan.requested_on, filters)
+    stmt = (select(Loan.id, Loan.staff_id, Loan.amount, Loan.total_amount, Loan.paid_amount,
+                   Loan.balance_amount, Loan.status, Loan.requested_on)
+            .where(*clauses).order_by(Loan.requested_on.desc()))
+    count_stmt = select(func.count(Loan.id)).where(*clauses)
+    render(out, "Staff Loans Report", filters, LOAN_COLUMNS, count_stmt, stmt,
+           lambda r: [str(r.id), r.staff_id, money(r.amount), money(r.total_amount), money(r.paid_amount),
+                      money(r.balance_amount), r.status, r.requested_on.strftime('%Y-%m-%d')],
+           on_progress)
+
+
+# -------------------------------------------
+# Background Tasks
+# -------------------------------------------
+@task('report_payments')
+def report_payments_task(job, filters=None):
+    path = job_queue.artifact_path(job, 'pdf')
+    payments_report(path, filters, lambda pct: job_queue.report_progress(job.id, pct))
+    return path, "payments_report.pdf", "application/pdf"
+
+
+@task('report_loans')
+def report_loans_task(job, filters=None):
+    path = job_queue.artifact_path(job, 'pdf')
+    loans_report(path, filters, lambda pct: job_queue.report_progress(job.id, pct))
+    return path, "loans_report.pdf", "application/pdf"
@@ -0,0 +1,255 @@
+from . import db
+from .models import (Payment, Loan, Repayment, CollectionRollup, LoanBookSnapshot, RollupWatermark, ARCHIVES,
+                     history, settled)
+from .money import Money
+from .ledger import OUTSTANDING_STATUSES
+from sqlalchemy import case, delete, func, insert, literal, select, type_coerce, update
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from flask import current_app
+import threading
+import time
+
+# -------------------------------------------
+# Monthly rollups (collections and loan book)
+# -------------------------------------------
+# Each append-only source is folded in by id: rows above the watermark are
+# grouped by (month, staff_id) and added onto the existing totals, so a
+# refresh costs the rows written since the previous one, not the history.
+COLLECTION_SOURCES = {'payment': Payment, 'emi': Repayment}
+
+
+def month_bucket(source, table):
+    if source == 'emi':
+        return table.c.month  # already the payroll month, YYYY-MM
+    return month_of(table.c.created_on)
+
+
+def month_of(column):
+    """SQL expression for the YYYY-MM of a timestamp column."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return func.to_char(column, 'YYYY-MM')
+    if dialect in ('mysql', 'mariadb'):
+        return func.date_format(column, '%Y-%m')
+    return func.strftime('%Y-%m', column)
+
+
+def current_month():
+    return datetime.utcnow().strftime('%Y-%m')
+
+
+def claim(name, model):
+    """Advance `name`'s watermark to the newest settled id; returns (old, new) or None.
+
+    The conditional UPDATE doubles as a lock: a concurrent refresh that read
+    the same watermark updates no row and skips, so nothing is counted twice.
+    Only settled rows count (see models.settled), so on server databases a
+    smaller id committed late is not left behind the watermark.
+    """
+    mark = db.session.get(RollupWatermark, name)
+    if mark is None:
+        mark = RollupWatermark(name=name, last_id=0)
+        db.session.add(mark)
+        db.session.flush()
+    low = mark.last_id or 0
+    high = db.session.scalar(select(func.coalesce(func.max(model.id), 0)).where(settled(model.created_on)))
+    if high <= low:
+        return None
+    claimed = db.session.execute(
+        update(RollupWatermark).where(RollupWatermark.name == name, RollupWatermark.last_id == low)
+        .values(last_id=high, refreshed_on=datetime.utcnow())
+        .execution_options(synchronize_session=False))
+    return (low, high) if claimed.rowcount else None
+
+
+def upsert_add(rows_select):
+    """INSERT the aggregated rows, adding onto totals that already exist."""
+    table = CollectionRollup.__table__
+    columns = ['month', 'staff_id', 'source', 'total', 'count']
+    dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(db.engine.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(table).from_select(columns, rows_select)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['month', 'staff_id', 'source'],
+            set_={'total': table.c.total + stmt.excluded.total, 'count': table.c.count + stmt.excluded.count}))
+        return
+    # Other backends: merge the (small) increment row by row
+    for month, staff_id, source, total, count in db.session.execute(rows_select):
+        row = db.session.get(CollectionRollup, (month, staff_id, source))
+        if row is None:
+            db.session.add(CollectionRollup(month=month, staff_id=staff_id, source=source, total=total, count=count))
+        else:
+            row.total += total
+            row.count += count
+
+
+def fold(source, table, *where):
+    """Add `table`'s rows matching `where` onto the rollups for `source`."""
+    bucket = month_bucket(source, table)
+    upsert_add(
+        select(bucket, table.c.staff_id, literal(source), func.sum(table.c.amount), func.count(table.c.id))
+        .where(*where)
+        .group_by(bucket, table.c.staff_id)
+    )
+
+
+def refresh_collections():
+    """Fold new payments and EMI deductions into collection_rollups; returns rows folded."""
+    folded = 0
+    for source, model in COLLECTION_SOURCES.items():
+        window = claim(source, model)
+        if window is None:
+            continue
+        low, high = window
+        fold(source, model.__table__, model.id > low, model.id <= high)
+        folded += high - low
+    return folded
+
+
+def snapshot_loan_book(month=None):
+    """Replace `month`'s loan-book rows with the current state (deleted loans excluded)."""
+    month = month or current_month()
+    loans = history(Loan, archived=True).c  # paid-off loans stay in the book once archived
+    requested = month_of(loans.requested_on) == month
+    db.session.execute(delete(LoanBookSnapshot).where(LoanBookSnapshot.month == month))
+    db.session.execute(insert(LoanBookSnapshot).from_select(
+        ['month', 'status', 'loans', 'disbursed', 'total_payable', 'repaid', 'outstanding',
+         'requested', 'requested_amount', 'taken_on'],
+        select(literal(month), loans.status, func.count(loans.id),
+               func.coalesce(func.sum(loans.amount), 0),
+               func.coalesce(func.sum(loans.total_amount), 0),
+               func.coalesce(func.sum(loans.paid_amount), 0),
+               func.coalesce(func.sum(loans.balance_amount), 0),
+               func.sum(case((requested, 1), else_=0)),
+               func.coalesce(func.sum(case((requested, loans.amount), else_=0)), 0),
+               literal(datetime.utcnow()))
+        .where(loans.deleted == False)
+        .group_by(loans.status)
+    ))
+
+
+def has_snapshot(month):
+    return db.session.scalar(select(LoanBookSnapshot.month).where(LoanBookSnapshot.month == month).limit(1)) is not None
+
+
+def refresh_rollups(snapshot=True):
+    """Incremental refresh of the collection rollups and, unless snapshot=False, the loan book.
+
+    The snapshot regroups every loan; the caller commits.
+    """
+    folded = refresh_collections()
+    if snapshot:
+        snapshot_loan_book()
+    return folded
+
+
+def rebuild_rollups():
+    """Recompute collection rollups from scratch (loan-book history cannot be replayed)."""
+    db.session.execute(delete(CollectionRollup))
+    db.session.execute(delete(RollupWatermark).where(RollupWatermark.name.in_(COLLECTION_SOURCES)))
+    for source, model in COLLECTION_SOURCES.items():
+        fold(source, ARCHIVES[model].__table__)  # archived ids are gone from the hot table
+    return refresh_rollups()
+
+
+class RollupRefresher:
+    """Runs refresh_rollups() at most once per ROLLUP_REFRESH_SECONDS per process.
+
+    Collections are folded in incrementally on every refresh. The loan-book
+    snapshot is a full GROUP BY over every loan, so it is only retaken once
+    per LOAN_BOOK_SNAPSHOT_SECONDS, or straight away in a month without one.
+    """
+
+    def __init__(self):
+        self.interval = 60
+        self.snapshot_interval = 3600
+        self._next = 0.0
+        self._next_snapshot = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config['ROLLUP_REFRESH_SECONDS']
+        self.snapshot_interval = app.config['LOAN_BOOK_SNAPSHOT_SECONDS']
+        app.extensions['rollup_refresher'] = self
+
+    def refresh_if_stale(self):
+        """Refresh if due; on failure (e.g. "database is locked") log it and keep serving the old rollups."""
+        if time.monotonic() < self._next or not self._lock.acquire(blocking=False):
+            return
+        try:
+            snapshot = time.monotonic() >= self._next_snapshot or not has_snapshot(current_month())
+            refresh_rollups(snapshot)
+            db.session.commit()
+            self._next = time.monotonic() + self.interval
+            if snapshot:
+                self._next_snapshot = time.monotonic() + self.snapshot_interval
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Rollup refresh failed; serving the previous rollups')
+        finally:
+            self._lock.release()
+
+
+rollup_refresher = RollupRefresher()
+
+
+# -------------------------------------------
+# Analytics queries (rollup tables only)
+# -------------------------------------------
+def month_range(query, column, month_from=None, month_to=None):
+    if month_from:
+        query = query.where(column >= month_from)
+    if month_to:
+        query = query.where(column <= month_to)
+    return query
+
+
+def source_total(source=None):
+    """SUM of rollup totals, optionally for one source, as Decimal rupees."""
+    total = CollectionRollup.total if source is None else \
+        case((CollectionRollup.source == source, CollectionRollup.total), else_=0)
+    return type_coerce(func.coalesce(func.sum(total), 0), Money)
+
+
+def monthly_collections(month_from=None, month_to=None, staff_id=None):
+    """Per month: payments, EMI deductions, total and payers, with outstanding loans."""
+    query = select(CollectionRollup.month, source_total('payment').label('payments'),
+                   source_total('emi').label('emi'), source_total().label('collected'),
+                   func.count(func.distinct(CollectionRollup.staff_id)).label('payers')) \
+        .group_by(CollectionRollup.month).order_by(CollectionRollup.month)
+    if staff_id:
+        query = query.where(CollectionRollup.staff_id == staff_id)
+    rows = db.session.execute(month_range(query, CollectionRollup.month, month_from, month_to)).all()
+
+    outstanding = dict(db.session.execute(
+        month_range(select(LoanBookSnapshot.month, type_coerce(func.sum(LoanBookSnapshot.outstanding), Money))
+                    .where(LoanBookSnapshot.status.in_(OUTSTANDING_STATUSES))
+                    .group_by(LoanBookSnapshot.month), LoanBookSnapshot.month, month_from, month_to)
+    ).all())
+    return [{'month': r.month, 'payments': r.payments, 'emi': r.emi, 'collected': r.collected,
+             'payers': r.payers, 'outstanding': outstanding.get(r.month)} for r in rows]
+
+
+def staff_collections(month, limit=100):
+    """Per staff for one month, biggest totals first."""
+    collected = source_total()
+    rows = db.session.execute(
+        select(CollectionRollup.staff_id, source_total('payment').label('payments'),
+               source_total('emi').label('emi'), collected.label('collected'))
+        .where(CollectionRollup.month == month)
+        .group_by(CollectionRollup.staff_id)
+        .order_by(collected.desc(), CollectionRollup.staff_id)
+        .limit(limit)
+    ).all()
+    return [{'staff_id': r.staff_id, 'payments': r.payments, 'emi': r.emi, 'collected': r.collected}
+            for r in rows]
+
+
+def loan_book(month_from=None, month_to=None):
+    query = select(LoanBookSnapshot).order_by(LoanBookSnapshot.month, LoanBookSnapshot.status)
+    return [{'month': s.month, 'status': s.status, 'loans': s.loans, 'disbursed': s.disbursed,
+             'total_payable': s.total_payable, 'repaid': s.repaid, 'outstanding': s.outstanding,
+             'requested': s.requested, 'requested_amount': s.requested_amount,
+             'taken_on': s.taken_on.isoformat(timespec='seconds')}
+            for s in db.session.scalars(month_range(query, LoanBookSnapshot.month, month_from, month_to))]
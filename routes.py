@@ -1,31 +1,39 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, abort, session
-from . import db, bcrypt
-from .models import Admin, Staff, Payment, Loan
+from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, abort, session, current_app, jsonify, Response, stream_with_context, make_response
+from . import db
+from .models import Admin, Staff, Payment, Loan, ImportJob, Job, StaffBalance, DeductionRun
+from .jobs import job_queue
+from .exports import EXPORT_FORMATS, missing_dependency, payments_export, loans_export, statement_export
+from .filters import clean_filters, filter_clauses
+from .pagination import paginate
+from .stats import stats_cache
+from .passwords import password_hasher
+from .metrics import metrics
+from .caching import fragment_cache
+from .statements import DEFAULT_SYNC_LIMIT, statement_delta
+from .search import TYPEAHEAD_LIMIT, search_staff
+from .rollups import rollup_refresher, monthly_collections, staff_collections, loan_book
+from .staff_admin import STAFF_ACTIONS, staff_clauses, apply_staff_action, apply_staff_action_to_ids
 from flask_login import login_user, logout_user, login_required, current_user
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import pandas as pd, datetime
+import datetime, os
 
 bp = Blueprint('routes', __name__)
 
-# -------------------------------------------------
-# Ensure Default Admin Exists
-# -------------------------------------------------
-@bp.before_app_request
-def ensure_admin():
-    admin = Admin.query.filter_by(email='admin@example.com').first()
-    if not admin:
-        pw = bcrypt.generate_password_hash('adminpass').decode('utf-8')
-        admin = Admin(email='admin@example.com', password=pw)
-        db.session.add(admin)
-        db.session.commit()
+REJECTION_PREVIEW_ROWS = 500  # rows shown on the upload result page
+
+# Sortable columns for the paginated admin lists
+STAFF_SORTS = {'id': Staff.id, 'name': Staff.name, 'staff_id': Staff.staff_id, 'registered_on': Staff.registered_on}
+PAYMENT_SORTS = {'id': Payment.id, 'created_on': Payment.created_on, 'amount': Payment.amount}
+LOAN_SORTS = {'requested_on': Loan.requested_on, 'amount': Loan.amount, 'id': Loan.id}
 
 # -------------------------------------------------
 # Session Protection
 # -------------------------------------------------
 @bp.before_app_request
 def protect_routes():
+    # Static files never need the logged-in user; skip the identity lookup
+    if request.endpoint == 'static':
+        return None
     if current_user.is_authenticated and not current_user.is_active:
         logout_user()
         session.clear()
@@ -56,6 +64,21 @@ def staff_required(f):
     wrapper.__name__ = f.__name__
     return wrapper
 
+def request_filters(fields):
+    """List filters from the query string; malformed dates are dropped with a warning."""
+    try:
+        return clean_filters(request.args, fields)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'warning')
+        return clean_filters(request.args, [f for f in fields if not f.startswith('date_')])
+
+def logged_out_response(html):
+    """Never store the logout page, and drop this site's cached pages from the browser."""
+    response = make_response(html)
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['Clear-Site-Data'] = '"cache"'
+    return response
+
 # -------------------------------------------------
 # Home Page
 # -------------------------------------------------
@@ -75,7 +98,7 @@ def admin_login():
         email = request.form['email']
         pw = request.form['password']
         admin = Admin.query.filter_by(email=email).first()
-        if admin and bcrypt.check_password_hash(admin.password, pw):
+        if password_hasher.verify(admin, pw):
             login_user(admin)
             flash('Logged in as admin', 'success')
             return redirect(url_for('routes.admin_dashboard'))
@@ -89,7 +112,7 @@ def admin_logout():
     logout_user()
     session.clear()
     flash('Admin logged out', 'info')
-    return render_template('logout.html', user_type="Admin", login_url=url_for('routes.admin_login'))
+    return logged_out_response(render_template('logout.html', user_type="Admin", login_url=url_for('routes.admin_login')))
 
 # -------------------------------------------------
 # Staff Authentication
@@ -104,7 +127,7 @@ def staff_login():
         pw = request.form['password']
 
         staff = Staff.query.filter_by(staff_id=staff_id).first()
-        if staff and bcrypt.check_password_hash(staff.password, pw):
+        if password_hasher.verify(staff, pw):
             if not staff.approved:
                 flash("Your account is not yet approved by the admin.", "warning")
                 return redirect(url_for('routes.staff_login'))
@@ -129,10 +152,11 @@ def staff_register():
             flash("Staff ID already registered. Please log in instead.", "warning")
             return redirect(url_for('routes.staff_login'))
 
-        pw_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        pw_hash = password_hasher.hash(password)
         staff = Staff(staff_id=staff_id, name=name, password=pw_hash, approved=False)
         db.session.add(staff)
         db.session.commit()
+        stats_cache.invalidate()
 
         flash("Registration successful. Please wait for admin approval.", "info")
         return redirect(url_for('routes.staff_login'))
@@ -146,7 +170,7 @@ def staff_logout():
     logout_user()
     session.clear()
     flash('Logged out successfully.', 'info')
-    return render_template('logout.html', user_type="Staff", login_url=url_for('routes.staff_login'))
+    return logged_out_response(render_template('logout.html', user_type="Staff", login_url=url_for('routes.staff_login')))
 
 # -------------------------------------------------
 # Admin Dashboard
@@ -154,15 +178,13 @@ def staff_logout():
 @bp.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    staff_count = Staff.query.count()
-    payments_count = Payment.query.count()
-    loans_count = Loan.query.count()
-    pending_staff = Staff.query.filter_by(approved=False).all()
+    stats = stats_cache.get()
     return render_template('admin/dashboard.html',
-                           staff_count=staff_count,
-                           payments_count=payments_count,
-                           loans_count=loans_count,
-                           pending_staff=pending_staff)
+                           staff_count=stats['staff_count'],
+                           payments_count=stats['payments_count'],
+                           loans_count=stats['loans_count'],
+                           pending_staff=stats['pending_staff'],
+                           stats=stats)
 
 # -------------------------------------------------
 # Manage Staff
@@ -170,8 +192,10 @@ def admin_dashboard():
 @bp.route('/admin/manage-staff')
 @admin_required
 def admin_manage_staff():
-    staff_members = Staff.query.order_by(Staff.id.desc()).all()
-    return render_template('admin/manage_staff.html', staff_members=staff_members)
+    filters = request_filters(('date_from', 'date_to'))
+    query = Staff.query.filter(*staff_clauses(request.args.get('q'), request.args.get('approved'), filters))
+    page = paginate(query, STAFF_SORTS, 'id', Staff.id)
+    return render_template('admin/manage_staff.html', staff_members=page.items, page=page)
 
 # -------------------------------------------------
 # ✅ Admin: Approve / Reject Staff
@@ -182,6 +206,7 @@ def approve_staff(id):
     staff = Staff.query.get_or_404(id)
     staff.approved = True
     db.session.commit()
+    stats_cache.invalidate()
     flash(f"{staff.name} has been approved successfully!", "success")
     return redirect(url_for('routes.admin_manage_staff'))
 
@@ -192,9 +217,106 @@ def reject_staff(id):
     staff = Staff.query.get_or_404(id)
     db.session.delete(staff)
     db.session.commit()
+    stats_cache.invalidate()
     flash(f"{staff.name} has been removed successfully.", "info")
     return redirect(url_for('routes.admin_manage_staff'))
 
+
+@bp.route('/admin/staff/bulk', methods=['POST'])
+@admin_required
+def bulk_staff_action():
+    """Approve/reject staff by id list or by the Manage Staff filters.
+
+    Accepts a form post from the staff list or JSON:
+    {"action": "approve", "ids": [1, 2]} or {"action": "reject", "filter": {"approved": "no"}}.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is None:
+        scope = request.values.get('scope')
+        data = {'action': request.form.get('action'), 'ids': request.form.getlist('ids')}
+        if scope == 'filter':
+            data = {'action': data['action'], 'filter': request.form.to_dict()}
+
+    action = data.get('action') if isinstance(data, dict) else None
+    try:
+        if not isinstance(data, dict):
+            raise ValueError('expected a JSON object')
+        if action not in STAFF_ACTIONS:
+            raise ValueError(f"action must be one of: {', '.join(STAFF_ACTIONS)}")
+        if 'filter' in data:
+            criteria = data['filter'] or {}
+            if not isinstance(criteria, dict):
+                raise ValueError('filter must be an object')
+            filters = clean_filters(criteria, ('date_from', 'date_to'))
+            clauses = staff_clauses(criteria.get('q'), criteria.get('approved'), filters)
+            if action == 'reject' and not clauses:
+                raise ValueError('refusing to remove every staff member; narrow the filter first')
+            affected = apply_staff_action(action, clauses)
+        else:
+            ids = data.get('ids') or []
+            if not isinstance(ids, list):
+                raise ValueError('ids must be a list')
+            affected = apply_staff_action_to_ids(action, ids)
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify(error=str(e)), 400
+        flash(f'Bulk action failed: {e}', 'danger')
+        return redirect(url_for('routes.admin_manage_staff'))
+
+    db.session.commit()
+    stats_cache.invalidate()
+    if request.is_json:
+        return jsonify(action=action, affected=affected)
+    verb = 'approved' if action == 'approve' else 'removed'
+    flash(f'{affected} staff {verb}.', 'success' if affected else 'info')
+    return redirect(request.referrer or url_for('routes.admin_manage_staff'))
+
+
+@bp.route('/admin/staff/search')
+@admin_required
+def staff_search():
+    """Typeahead: top matches for ?q= by name or staff ID words (prefixes)."""
+    return jsonify(search_staff(request.args.get('q', ''), request.args.get('limit', TYPEAHEAD_LIMIT, type=int)))
+
+# -------------------------------------------------
+# Import Staff
+# -------------------------------------------------
+def duplicate_upload(job):
+    """Send a re-submitted file to the import that already has it."""
+    flash(f'This file was already uploaded as import #{job.id} ({job.status}); it was not imported again.', 'warning')
+    return redirect(url_for('routes.import_status', id=job.id))
+
+
+@bp.route('/admin/upload-staff', methods=['GET', 'POST'])
+@admin_required
+def upload_staff():
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file:
+            flash('Please choose a CSV file.', 'warning')
+            return redirect(url_for('routes.upload_staff'))
+
+        from .ingest import create_import, DuplicateUpload  # pandas is loaded on the first upload
+
+        try:
+            job = create_import('staff', file, current_app.config['STAFF_IMPORT_CHUNK_SIZE'])
+        except DuplicateUpload as e:
+            return duplicate_upload(e.job)
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error processing file: {str(e)}', 'danger')
+            return redirect(url_for('routes.admin_manage_staff'))
+        if not job:
+            flash('CSV must have columns: staff_id, name, password', 'danger')
+            return redirect(url_for('routes.upload_staff'))
+
+        job_queue.enqueue('import', import_id=job.id)
+        flash(f'Import #{job.id} queued: {job.total_rows} staff will be created in the background.', 'info')
+        return redirect(url_for('routes.import_status', id=job.id))
+
+    return render_template('admin/upload_staff.html')
+
 # -------------------------------------------------
 # Upload Payments
 # -------------------------------------------------
@@ -207,33 +329,28 @@ def upload_payments():
             flash('Please choose a CSV file.', 'warning')
             return redirect(url_for('routes.upload_payments'))
 
+        from .ingest import create_import, DuplicateUpload
+
         try:
-            df = pd.read_csv(file)
-            required_cols = {'staff_id', 'amount', 'month'}
-            if not required_cols.issubset(df.columns):
-                flash('CSV must have columns: staff_id, amount, month', 'danger')
-                return redirect(url_for('routes.upload_payments'))
-
-            for _, row in df.iterrows():
-                staff = Staff.query.filter_by(staff_id=row['staff_id']).first()
-                if staff:
-                    payment = Payment(
-                        staff_id=staff.staff_id,
-                        amount=float(row['amount']),
-                        month=row['month']
-                    )
-                    db.session.add(payment)
-            db.session.commit()
-            flash('Payments uploaded successfully!', 'success')
+            job = create_import('payments', file, current_app.config['IMPORT_CHUNK_SIZE'])
+        except DuplicateUpload as e:
+            return duplicate_upload(e.job)
         except Exception as e:
+            db.session.rollback()
             flash(f'Error processing file: {str(e)}', 'danger')
+            return redirect(url_for('routes.admin_dashboard'))
+        if not job:
+            flash('CSV must have columns: staff_id, amount, month', 'danger')
+            return redirect(url_for('routes.upload_payments'))
 
-        return redirect(url_for('routes.admin_dashboard'))
+        job_queue.enqueue('import', import_id=job.id)
+        flash(f'Import #{job.id} queued: {job.total_rows} rows will be processed in the background.', 'info')
+        return redirect(url_for('routes.import_status', id=job.id))
 
     return render_template('admin/upload_payments.html')
 
 # -------------------------------------------------
-# Upload Loans (✅ FIX: Handle Loan Repayments Properly)
+# Upload Loans (✅ Set-based repayment reconciliation)
 # -------------------------------------------------
 @bp.route('/admin/upload-loans', methods=['GET', 'POST'])
 @admin_required
@@ -244,71 +361,77 @@ def upload_loans():
             flash('Please choose a CSV file.', 'warning')
             return redirect(url_for('routes.upload_loans'))
 
-        try:
-            df = pd.read_csv(file)
-            required_cols = {'staff_id', 'amount', 'status'}
-            if not required_cols.issubset(df.columns):
-                flash('CSV must have columns: staff_id, amount, status', 'danger')
-                return redirect(url_for('routes.upload_loans'))
-
-            for _, row in df.iterrows():
-                staff_id = str(row['staff_id']).strip()
-                amount = float(row['amount'])
-                status = str(row.get('status', 'pending')).strip().lower()
-
-                staff = Staff.query.filter_by(staff_id=staff_id).first()
-                if not staff:
-                    flash(f"⚠️ Staff ID {staff_id} not found.", "warning")
-                    continue
-
-                if status in ['paid', 'repayment', 'paid_part']:
-                    active_loan = (
-                        Loan.query.filter_by(staff_id=staff_id, deleted=False)
-                        .filter(Loan.status.in_(['approved', 'paid']))
-                        .order_by(Loan.id.desc())
-                        .first()
-                    )
-
-                    if active_loan:
-                        active_loan.paid_amount = (active_loan.paid_amount or 0) + amount
-                        active_loan.balance_amount = max(0, (active_loan.total_amount or active_loan.amount) - active_loan.paid_amount)
-
-                        if active_loan.balance_amount <= 0:
-                            active_loan.status = 'paid'
-                            flash(f"✅ Loan for {staff_id} fully repaid and closed.", "success")
-                        else:
-                            flash(f"💰 {staff_id} repaid ₹{amount}. Remaining: ₹{active_loan.balance_amount:.2f}", "info")
-
-                        db.session.add(active_loan)
-                    else:
-                        flash(f"⚠️ No active loan found for {staff_id}.", "warning")
-                else:
-                    loan = Loan(
-                        staff_id=staff_id,
-                        amount=amount,
-                        status=status if status in ['approved', 'pending', 'rejected'] else 'pending'
-                    )
-                    db.session.add(loan)
-
-            db.session.commit()
-            flash('✅ Loan data processed successfully!', 'success')
+        from .ingest import create_import, DuplicateUpload
 
+        try:
+            job = create_import('loans', file, current_app.config['IMPORT_CHUNK_SIZE'])
+        except DuplicateUpload as e:
+            return duplicate_upload(e.job)
         except Exception as e:
             db.session.rollback()
             flash(f'❌ Error processing file: {str(e)}', 'danger')
+            return redirect(url_for('routes.admin_dashboard'))
+        if not job:
+            flash('CSV must have columns: staff_id, amount, status', 'danger')
+            return redirect(url_for('routes.upload_loans'))
 
-        return redirect(url_for('routes.admin_dashboard'))
+        job_queue.enqueue('import', import_id=job.id)
+        flash(f'Import #{job.id} queued: {job.total_rows} rows will be processed in the background.', 'info')
+        return redirect(url_for('routes.import_status', id=job.id))
 
     return render_template('admin/upload_loans.html')
 
+
+# -------------------------------------------------
+# Import Jobs (progress, resume, detail report)
+# -------------------------------------------------
+@bp.route('/admin/imports/<int:id>')
+@admin_required
+def import_status(id):
+    from .ingest import rejection_preview, report_path
+    job = ImportJob.query.get_or_404(id)
+    return render_template('admin/upload_result.html',
+                           job=job,
+                           rejected=rejection_preview(job, REJECTION_PREVIEW_ROWS),
+                           has_report=os.path.exists(report_path(f'import-{job.id}')),
+                           back_url=url_for(f'routes.upload_{job.kind}'))
+
+
+@bp.route('/admin/imports/<int:id>/resume', methods=['POST'])
+@admin_required
+def resume_import(id):
+    job = ImportJob.query.get_or_404(id)
+    if job.status != 'failed':
+        flash(f'Import #{job.id} is {job.status} and cannot be resumed.', 'warning')
+    else:
+        job.status = 'pending'
+        job_queue.claim(job)
+        db.session.commit()
+        job_queue.enqueue('import', import_id=job.id)
+        flash(f'Import #{job.id} resumed from line {job.rows_done + 2}.', 'info')
+    return redirect(url_for('routes.import_status', id=job.id))
+
+
+@bp.route('/admin/imports/<int:id>/report')
+@admin_required
+def download_import_report(id):
+    from .ingest import report_path
+    job = ImportJob.query.get_or_404(id)
+    path = report_path(f'import-{job.id}')
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=f"{job.kind}_import_{job.id}.csv", mimetype="text/csv")
+
 # -------------------------------------------------
 # Admin Payments
 # -------------------------------------------------
 @bp.route('/admin/payments')
 @admin_required
 def admin_payments():
-    payments = Payment.query.order_by(Payment.id.desc()).all()
-    return render_template('admin/payments.html', payments=payments)
+    filters = request_filters(('staff_id', 'month', 'date_from', 'date_to'))
+    query = Payment.query.filter(*filter_clauses(Payment, Payment.created_on, filters))
+    page = paginate(query, PAYMENT_SORTS, 'id', Payment.id)
+    return render_template('admin/payments.html', payments=page.items, page=page, filters=filters)
 
 # -------------------------------------------------
 # Admin Pending Loans
@@ -316,8 +439,13 @@ def admin_payments():
 @bp.route('/admin/pending-loans')
 @admin_required
 def admin_pending_loans():
-    pending_loans = Loan.query.filter_by(status='pending').order_by(Loan.requested_on.desc()).all()
-    return render_template('admin/pending_loans.html', loans=pending_loans)
+    filters = request_filters(('staff_id', 'status', 'date_from', 'date_to'))
+    filters.setdefault('status', 'pending')
+    if filters['status'] == 'all':
+        del filters['status']
+    query = Loan.query.filter(*filter_clauses(Loan, Loan.requested_on, filters))
+    page = paginate(query, LOAN_SORTS, 'requested_on', Loan.id)
+    return render_template('admin/pending_loans.html', loans=page.items, page=page, filters=filters)
 
 # -------------------------------------------------
 # ✅ Admin: Approve / Reject Loan Requests
@@ -327,7 +455,9 @@ def admin_pending_loans():
 def admin_loan_approve(id):
     loan = Loan.query.get_or_404(id)
     loan.status = 'approved'
+    loan.sync_balance()
     db.session.commit()
+    stats_cache.invalidate()
     flash(f"Loan ID {loan.id} for Staff {loan.staff_id} approved successfully!", "success")
     return redirect(url_for('routes.admin_pending_loans'))
 
@@ -338,58 +468,214 @@ def admin_loan_reject(id):
     loan = Loan.query.get_or_404(id)
     loan.status = 'rejected'
     db.session.commit()
+    stats_cache.invalidate()
     flash(f"Loan ID {loan.id} for Staff {loan.staff_id} rejected.", "info")
     return redirect(url_for('routes.admin_pending_loans'))
 
 # -------------------------------------------------
-# Reports
+# Streaming Exports (CSV / Parquet / XLSX)
+# -------------------------------------------------
+def export_response(name, build, fields, back_url):
+    """Stream `build(filters)` in the requested ?format= as a download."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    try:
+        filters = clean_filters(request.args, fields)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(back_url)
+    package = missing_dependency(fmt)
+    if package:
+        flash(f'{fmt.upper()} export needs the {package} package installed on the server.', 'warning')
+        return redirect(back_url)
+
+    writer, mimetype, _ = EXPORT_FORMATS[fmt]
+    columns, stmt = build(filters)
+    return Response(stream_with_context(writer(columns, stmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+@bp.route('/admin/export/payments')
+@admin_required
+def export_payments():
+    return export_response('payments', payments_export, ('staff_id', 'month', 'date_from', 'date_to', 'archived'),
+                           url_for('routes.admin_payments'))
+
+
+@bp.route('/admin/export/loans')
+@admin_required
+def export_loans():
+    return export_response('loans', loans_export, ('staff_id', 'status', 'date_from', 'date_to', 'archived'),
+                           url_for('routes.admin_pending_loans'))
+
+
+@bp.route('/admin/export/statement/<staff_id>')
+@admin_required
+def export_statement(staff_id):
+    staff = Staff.query.filter_by(staff_id=staff_id).first_or_404()
+    return export_response(f'statement_{staff.staff_id}', lambda f: statement_export(staff.staff_id, f),
+                           ('date_from', 'date_to', 'archived'), url_for('routes.admin_manage_staff'))
+
+
+@bp.route('/staff/statement')
+@staff_required
+def staff_statement():
+    staff_id = current_user.staff_id
+    return export_response(f'statement_{staff_id}', lambda f: statement_export(staff_id, f),
+                           ('date_from', 'date_to', 'archived'), url_for('routes.staff_dashboard'))
+
+# -------------------------------------------------
+# Staff Statement API (JSON, incremental sync)
+# -------------------------------------------------
+@bp.route('/api/staff/statement')
+def api_staff_statement():
+    """Statement delta since ?cursor= (or ?since=ISO date on first sync), for the mobile app.
+
+    ?archived=1 includes archived history (for a full re-sync).
+    """
+    if not current_user.is_authenticated:
+        return jsonify(error='Login required'), 401
+    if not isinstance(current_user, Staff):
+        return jsonify(error='Staff only'), 403
+    try:
+        since = request.args.get('since')
+        since = datetime.datetime.fromisoformat(since) if since else None
+        limit = request.args.get('limit', DEFAULT_SYNC_LIMIT, type=int)
+        archived = request.args.get('archived') == '1'
+        return jsonify(statement_delta(current_user, request.args.get('cursor'), since, limit, archived))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+# -------------------------------------------------
+# Reports (generated by background jobs)
 # -------------------------------------------------
 @bp.route('/admin/report-payments')
 @admin_required
 def report_payments():
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    pdf.setFont("Helvetica-Bold", 14)
-    pdf.drawString(220, 800, "Staff Payments Report")
-
-    payments = Payment.query.order_by(Payment.created_on.desc()).all()
-    y = 760
-    pdf.setFont("Helvetica", 10)
-    for p in payments:
-        pdf.drawString(60, y, f"Staff ID: {p.staff_id} | Amount: ₹{p.amount} | Month: {p.month} | Date: {p.created_on.strftime('%Y-%m-%d')}")
-        y -= 18
-        if y < 80:
-            pdf.showPage()
-            y = 800
-            pdf.setFont("Helvetica", 10)
-
-    pdf.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name="payments_report.pdf", mimetype="application/pdf")
+    try:
+        filters = clean_filters(request.args, ('staff_id', 'month', 'date_from', 'date_to'))
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('routes.admin_payments'))
+    job = job_queue.enqueue('report_payments', filters=filters)
+    flash('Payments report is being generated.', 'info')
+    return redirect(url_for('routes.job_status', id=job.id))
 
 
 @bp.route('/admin/report-loans')
 @admin_required
 def report_loans():
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    pdf.setFont("Helvetica-Bold", 14)
-    pdf.drawString(220, 800, "Staff Loans Report")
-
-    loans = Loan.query.order_by(Loan.requested_on.desc()).all()
-    y = 760
-    pdf.setFont("Helvetica", 10)
-    for l in loans:
-        pdf.drawString(60, y, f"Staff ID: {l.staff_id} | Amount: ₹{l.amount} | Status: {l.status} | Date: {l.requested_on.strftime('%Y-%m-%d')}")
-        y -= 18
-        if y < 80:
-            pdf.showPage()
-            y = 800
-            pdf.setFont("Helvetica", 10)
-
-    pdf.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name="loans_report.pdf", mimetype="application/pdf")
+    try:
+        filters = clean_filters(request.args, ('staff_id', 'status', 'date_from', 'date_to'))
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('routes.admin_pending_loans'))
+    job = job_queue.enqueue('report_loans', filters=filters)
+    flash('Loans report is being generated.', 'info')
+    return redirect(url_for('routes.job_status', id=job.id))
+
+# -------------------------------------------------
+# Month-end Deduction Runs
+# -------------------------------------------------
+@bp.route('/admin/deductions', methods=['GET', 'POST'])
+@admin_required
+def admin_deductions():
+    if request.method == 'POST':
+        from .deductions import parse_month
+        try:
+            month = parse_month(request.form.get('month'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('routes.admin_deductions'))
+        job = job_queue.enqueue('deductions', month=month)
+        flash(f'Deduction run for {month} started.', 'info')
+        return redirect(url_for('routes.job_status', id=job.id))
+
+    runs = DeductionRun.query.order_by(DeductionRun.id.desc()).limit(24).all()
+    return render_template('admin/deductions.html', runs=runs,
+                           month=datetime.date.today().strftime('%Y-%m'))
+
+# -------------------------------------------------
+# Analytics (JSON, served from the monthly rollups)
+# -------------------------------------------------
+def month_args():
+    """?from= / ?to= as YYYY-MM strings; ValueError if malformed."""
+    months = [request.args.get(name) or None for name in ('from', 'to')]
+    for month in months:
+        if month:
+            datetime.datetime.strptime(month, '%Y-%m')
+    return months
+
+
+@bp.route('/admin/analytics/collections')
+@admin_required
+def analytics_collections():
+    """Collected per month (payments and EMI deductions) with loans outstanding."""
+    try:
+        month_from, month_to = month_args()
+    except ValueError:
+        return jsonify(error='from/to must be YYYY-MM'), 400
+    rollup_refresher.refresh_if_stale()
+    return jsonify(monthly_collections(month_from, month_to, request.args.get('staff_id') or None))
+
+
+@bp.route('/admin/analytics/collections/<month>')
+@admin_required
+def analytics_collections_month(month):
+    """Per-staff collections for one month, largest first."""
+    try:
+        datetime.datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return jsonify(error='month must be YYYY-MM'), 400
+    rollup_refresher.refresh_if_stale()
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify(staff_collections(month, limit))
+
+
+@bp.route('/admin/analytics/loan-book')
+@admin_required
+def analytics_loan_book():
+    """Loan book by status, one snapshot per month."""
+    try:
+        month_from, month_to = month_args()
+    except ValueError:
+        return jsonify(error='from/to must be YYYY-MM'), 400
+    rollup_refresher.refresh_if_stale()
+    return jsonify(loan_book(month_from, month_to))
+
+# -------------------------------------------------
+# Background Jobs (status, polling, download)
+# -------------------------------------------------
+@bp.route('/admin/jobs/<int:id>')
+@admin_required
+def job_status(id):
+    job = Job.query.get_or_404(id)
+    return render_template('admin/job_status.html', job=job, progress=job_queue.progress(job))
+
+
+@bp.route('/admin/jobs/<int:id>/status')
+@admin_required
+def job_status_json(id):
+    job = Job.query.get_or_404(id)
+    return jsonify(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job_queue.progress(job),
+        error=job.error,
+        download_url=url_for('routes.job_download', id=job.id) if job.has_result else None,
+    )
+
+
+@bp.route('/admin/jobs/<int:id>/download')
+@admin_required
+def job_download(id):
+    job = Job.query.get_or_404(id)
+    if job.status != 'done' or not job.has_result:
+        abort(404)
+    source = job.result_path or BytesIO(job.result)
+    return send_file(source, as_attachment=True, download_name=job.result_name, mimetype=job.result_mimetype)
 
 # -------------------------------------------------
 # Staff Dashboard (✅ FIXED Paid Column Sync)
@@ -397,8 +683,15 @@ def report_loans():
 @bp.route('/staff/dashboard')
 @staff_required
 def staff_dashboard():
-    payments = Payment.query.filter_by(staff_id=current_user.staff_id).all()
-    total_payments = sum(p.amount for p in payments) if payments else 0
+    # Totals come from the maintained ledger row; this view never writes
+    balance = db.session.get(StaffBalance, current_user.staff_id)
+    # The payments table only changes when the ledger counters do, so the
+    # rendered HTML is reused until then (and the rows are not even loaded)
+    version = (balance.payment_count, str(balance.total_paid), balance.last_payment_on) if balance else None
+    payments_table = fragment_cache.get_or_render(
+        ('staff_payments', current_user.staff_id, version),
+        lambda: render_template('staff/payments_table.html',
+                                payments=Payment.query.filter_by(staff_id=current_user.staff_id).all()))
 
     loans = (
         Loan.query.filter(
@@ -410,26 +703,12 @@ def staff_dashboard():
         .all()
     )
 
-    for loan in loans:
-        if loan.total_amount is None:
-            loan.total_amount = loan.amount
-        if loan.paid_amount is None:
-            loan.paid_amount = 0
-        if loan.balance_amount is None or loan.balance_amount < 0:
-            loan.balance_amount = loan.total_amount - loan.paid_amount
-        if loan.balance_amount <= 0:
-            loan.status = 'paid'
-
-    db.session.commit()
-
-    total_loans = sum(l.balance_amount for l in loans if l.balance_amount > 0)
-
     return render_template(
         'staff/dashboard.html',
-        payments=payments,
+        payments_table=payments_table,
         loans=loans,
-        total_payments=total_payments,
-        total_loans=total_loans
+        total_payments=balance.total_paid if balance else 0,
+        total_loans=balance.outstanding_loans if balance else 0
     )
 
 # -------------------------------------------------
@@ -460,3 +739,19 @@ def staff_request_loan():
         return redirect(url_for('routes.staff_dashboard'))
 
     return render_template('staff/request_loan.html')
+
+# -------------------------------------------------
+# Metrics (Prometheus text format)
+# -------------------------------------------------
+def metrics_response():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/admin/metrics')
+def admin_metrics():
+    """Admins, or a scraper with the METRICS_TOKEN bearer token; 404 when disabled."""
+    if not metrics.enabled:
+        abort(404)
+    if metrics.token_matches(request.headers.get('Authorization', '')):
+        return metrics_response()
+    return admin_required(metrics_response)()
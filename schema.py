@@ -0,0 +1,195 @@
+from . import db, ledger
+from .models import (Staff, Payment, PaymentArchive, Loan, Repayment, RepaymentArchive, StaffBalance, SchemaMigration,
+                     ImportFingerprint, history)
+from .search import SEARCH_TABLE, install_search_index
+from sqlalchemy import Numeric, cast, func, insert, inspect, literal, select, text, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+import hashlib
+import re
+
+# -------------------------------------------
+# Additive schema upgrades
+# -------------------------------------------
+def upgrade_schema():
+    """Bring an existing database up to the models without dropping anything.
+
+    create_all only creates missing tables, so columns and indexes added to
+    existing tables later are applied here. Safe to run on every start.
+    Returns the names of the columns and indexes it added.
+    """
+    fresh = not inspect(db.engine).has_table(Payment.__tablename__)
+    db.create_all()
+    added = []
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table in db.metadata.sorted_tables:
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                # Added nullable and without constraints so every backend accepts it
+                conn.execute(text(f'ALTER TABLE {quote(table.name)} ADD COLUMN '
+                                  f'{quote(column.name)} {column.type.compile(dialect=conn.dialect)}'))
+                added.append(f'{table.name}.{column.name}')
+
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    added.append(index.name)
+    if install_search_index():
+        added.append(SEARCH_TABLE)
+    migrate_staff_keys()
+    added.extend(run_data_migrations(fresh))
+    if db.session.get(SchemaMigration, schema_revision()) is None:
+        db.session.add(SchemaMigration(name=schema_revision()))
+        db.session.commit()
+    return added
+
+
+def schema_revision():
+    """Name recorded once the database matches every table, column, index and migration."""
+    parts = [name for name, _ in DATA_MIGRATIONS] + [SEARCH_TABLE]
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(sorted(c.name for c in table.columns))
+        parts.extend(sorted(i.name for i in table.indexes))
+    return 'schema:' + hashlib.sha1('\n'.join(parts).encode()).hexdigest()[:12]
+
+
+def schema_is_current():
+    """One primary-key lookup instead of inspecting every table at startup."""
+    try:
+        return db.session.get(SchemaMigration, schema_revision()) is not None
+    except (OperationalError, ProgrammingError):  # no schema_migrations table yet
+        db.session.rollback()
+        return False
+
+
+def migrate_staff_keys():
+    """Backfill the integer staff_pk on payments/loans from the string staff_id.
+
+    Step one of moving the hot lookups off the String(20) foreign key: new rows
+    get staff_pk on insert, this fills in older rows. Returns rows updated.
+    """
+    updated = 0
+    for model in (Payment, Loan):
+        table = model.__table__
+        key = select(Staff.id).where(Staff.staff_id == table.c.staff_id).scalar_subquery()
+        result = db.session.execute(update(table).where(table.c.staff_pk.is_(None)).values(staff_pk=key))
+        updated += result.rowcount or 0
+    db.session.commit()
+    return updated
+
+
+# -------------------------------------------
+# One-off data migrations
+# -------------------------------------------
+MONEY_COLUMNS = [
+    (Payment, ['amount']),
+    (Loan, ['amount', 'total_amount', 'paid_amount', 'balance_amount']),
+    (StaffBalance, ['total_paid', 'outstanding_loans']),
+]
+
+
+def money_to_paise():
+    """Rescale rupee floats to integer paise for the Money columns.
+
+    Older databases keep their FLOAT column type; whole numbers are exact
+    there, and the Money type reads either storage. Rounds half up like
+    to_paise: 0.285 is stored as 28.4999... paise, so it is first rounded
+    to six places (28.5) and then to a whole 29.
+    """
+    for model, columns in MONEY_COLUMNS:
+        table = model.__table__
+        db.session.execute(update(table).values({
+            name: func.round(func.round(cast(table.c[name], Numeric(20, 6)) * 100, 6)) for name in columns
+        }))
+
+
+def fingerprint_payments():
+    """Fingerprint payments imported before row dedup existed, so re-uploading an old file is caught."""
+    p = history(Payment, archived=True).c
+    db.session.execute(insert(ImportFingerprint).from_select(
+        ['source', 'staff_id', 'month', 'amount', 'created_on'],
+        select(literal('payment'), p.staff_id, p.month, p.amount, func.min(p.created_on))
+        .group_by(p.staff_id, p.month, p.amount)
+    ))
+
+
+DATA_MIGRATIONS = [
+    ('money_to_paise', money_to_paise),
+    ('fingerprint_payments', fingerprint_payments),
+    ('staff_balances', ledger.rebuild),  # fill the ledger on databases from before it existed
+]
+
+
+def run_data_migrations(fresh=False):
+    """Apply each data migration once; a fresh database just records them."""
+    applied = set(db.session.scalars(select(SchemaMigration.name)))
+    ran = []
+    for name, migrate in DATA_MIGRATIONS:
+        if name in applied:
+            continue
+        if not fresh:
+            migrate()
+            ran.append(name)
+        db.session.add(SchemaMigration(name=name))
+    db.session.commit()
+    return ran
+
+
+# -------------------------------------------
+# Query plan checks (SQLite EXPLAIN QUERY PLAN)
+# -------------------------------------------
+def hot_queries():
+    """The lookups behind the busiest routes, as (name, statement) pairs."""
+    sample = 'S001'
+    return [
+        ('staff dashboard payments',
+         select(Payment).where(Payment.staff_id == sample).order_by(Payment.created_on.desc())),
+        ('staff dashboard loans',
+         select(Loan).where(Loan.staff_id == sample, Loan.deleted == False,
+                            Loan.status.in_(['approved', 'paid'])).order_by(Loan.id.desc())),
+        ('upload active-loan lookup',
+         select(func.max(Loan.id)).where(Loan.staff_id.in_([sample, 'S002']), Loan.deleted == False,
+                                         Loan.status.in_(['approved', 'paid'])).group_by(Loan.staff_id)),
+        ('pending loans list',
+         select(Loan).where(Loan.status == 'pending')
+         .order_by(Loan.requested_on.desc(), Loan.id.desc()).limit(51)),
+        ('ledger payment totals',
+         select(func.sum(Payment.amount), func.max(Payment.created_on)).where(Payment.staff_id == sample)),
+        ('staff login',
+         select(Staff).where(Staff.staff_id == sample)),
+        ('statement sync repayments',
+         select(Repayment.id).where(Repayment.staff_id == sample, Repayment.id > 0).order_by(Repayment.id)),
+        ('ledger archived payment totals',
+         select(func.sum(PaymentArchive.amount), func.max(PaymentArchive.created_on))
+         .where(PaymentArchive.staff_id == sample)),
+        ('archived statement repayments',
+         select(RepaymentArchive.id).where(RepaymentArchive.staff_id == sample)),
+        ('upload fingerprint lookup',
+         select(ImportFingerprint.amount).where(ImportFingerprint.staff_id.in_([sample, 'S002']),
+                                                ImportFingerprint.source.in_(['payment']),
+                                                ImportFingerprint.month.in_(['Jan 2026']))),
+    ]
+
+
+def full_scans():
+    """Run EXPLAIN QUERY PLAN on every hot query and return the full table scans.
+
+    Each result is (query name, plan detail). An empty list means every hot
+    query is served by an index. Only SQLite is checked.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    scans = []
+    for name, stmt in hot_queries():
+        sql = stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')):
+            detail = row[-1]
+            # "SCAN loans [USING INDEX ...]" walks the whole table or index; SEARCH is a seek
+            if re.match(r'SCAN (TABLE )?(payments|loans|staff|repayments|import_fingerprints)(_archive)?\b', detail):
+                scans.append((name, detail))
+    return scans
@@ -0,0 +1,125 @@
+from . import db
+from .models import Staff
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import OperationalError
+import re
+
+# -------------------------------------------
+# Staff search (SQLite FTS5, LIKE elsewhere)
+# -------------------------------------------
+SEARCH_TABLE = 'staff_search'
+TYPEAHEAD_LIMIT = 10
+MAX_TYPEAHEAD_LIMIT = 50
+# Typeahead ranks the matches (bm25) only when there are at most this many:
+# a short prefix can match most of the table, and ranking 100k matches takes
+# ~180ms against ~1ms to count up to this cap. Broader matches are returned in
+# id order, which FTS5 reads straight off its index.
+RANK_LIMIT = 2000
+
+# External-content FTS5 index over staff(staff_id, name), kept in step by
+# triggers, so bulk inserts and deletes that bypass the ORM are covered too.
+# prefix='1 2 3' keeps short typeahead prefixes an index lookup.
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        staff_id, name, content='staff', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON staff BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, staff_id, name) VALUES (new.id, new.staff_id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON staff BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, staff_id, name)
+        VALUES ('delete', old.id, old.staff_id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF staff_id, name ON staff BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, staff_id, name)
+        VALUES ('delete', old.id, old.staff_id, old.name);
+        INSERT INTO {SEARCH_TABLE}(rowid, staff_id, name) VALUES (new.id, new.staff_id, new.name);
+    END""",
+]
+
+
+def fts_available():
+    """True when the staff search index exists (SQLite built with FTS5)."""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                              {'name': SEARCH_TABLE}).first() is not None
+
+
+def install_search_index():
+    """Create the FTS table and triggers if missing; fills it on first creation.
+
+    Returns True if the index was created, False if it existed or FTS5 is
+    not available (search then falls back to LIKE).
+    """
+    if db.engine.dialect.name != 'sqlite' or fts_available():
+        return False
+    try:
+        with db.engine.begin() as conn:
+            for ddl in SEARCH_DDL:
+                conn.execute(text(ddl))
+            conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+    except OperationalError:  # "no such module: fts5"
+        return False
+    return True
+
+
+def rebuild_search_index():
+    """Re-read every staff row into the index (repairs drift)."""
+    if not fts_available():
+        return False
+    db.session.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+    db.session.commit()
+    return True
+
+
+def match_expression(q):
+    """FTS5 query where every word is a prefix: 'ram kum' -> '"ram"* "kum"*'.
+
+    Punctuation is dropped, so user input can never form FTS syntax.
+    """
+    words = re.findall(r'\w+', q or '')
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def staff_match(q):
+    """WHERE clause selecting staff whose name or staff_id words start with the words in `q`."""
+    expression = match_expression(q)
+    if not expression:
+        return None
+    if fts_available():
+        matching = text(f'SELECT rowid AS id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q') \
+            .bindparams(q=expression).columns(id=db.Integer)
+        return Staff.id.in_(select(matching.subquery().c.id))
+    q = q.strip()
+    return or_(Staff.name.ilike(f'%{q}%'), Staff.staff_id.ilike(f'{q}%'))
+
+
+def search_staff(q, limit=TYPEAHEAD_LIMIT):
+    """Best `limit` matches for the typeahead, as dicts.
+
+    When `q` matches at most RANK_LIMIT staff, all of them are ranked and
+    the top `limit` kept; a broader match returns its first `limit` by id.
+    """
+    limit = max(1, min(limit, MAX_TYPEAHEAD_LIMIT))
+    expression = match_expression(q)
+    if not expression:
+        return []
+    if fts_available():
+        matches = db.session.scalar(text(
+            f'SELECT count(*) FROM (SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q LIMIT :cap)'
+        ), {'q': expression, 'cap': RANK_LIMIT + 1})
+        order = 'rank' if matches <= RANK_LIMIT else 'rowid'
+        rows = db.session.execute(text(
+            f'SELECT s.id, s.staff_id, s.name, s.approved '
+            f'FROM (SELECT rowid, {order} AS position FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q '
+            f'ORDER BY {order} LIMIT :limit) m '
+            f'JOIN staff s ON s.id = m.rowid ORDER BY m.position'
+        ), {'q': expression, 'limit': limit}).all()
+    else:
+        rows = db.session.execute(
+            select(Staff.id, Staff.staff_id, Staff.name, Staff.approved)
+            .where(staff_match(q)).order_by(Staff.staff_id).limit(limit)
+        ).all()
+    return [{'id': r.id, 'staff_id': r.staff_id, 'name': r.name, 'approved': bool(r.approved)} for r in rows]
+
@@ -0,0 +1,62 @@
+from . import db
+from .models import Staff, StaffBalance, Payment, PaymentArchive, Loan, LoanArchive
+from .filters import filter_clauses
+from .ledger import LOOKUP_CHUNK_SIZE
+from .search import staff_match
+from sqlalchemy import delete, exists, or_, select, update
+
+# -------------------------------------------
+# Staff list filters and bulk approval
+# -------------------------------------------
+STAFF_ACTIONS = ('approve', 'reject')
+
+
+def staff_clauses(q=None, approved=None, filters=None):
+    """WHERE clauses shared by the Manage Staff list and bulk actions."""
+    clauses = []
+    match = staff_match(q)
+    if match is not None:
+        clauses.append(match)
+    if approved in ('yes', 'no'):
+        clauses.append(Staff.approved == (approved == 'yes'))
+    clauses.extend(filter_clauses(Staff, Staff.registered_on, filters or {}))
+    return clauses
+
+
+def has_records():
+    """Staff with payments or loans, hot or archived; they are never bulk-deleted."""
+    tables = [Payment, PaymentArchive, Loan, LoanArchive]
+    return or_(*(exists().where(model.staff_id == Staff.staff_id) for model in tables))
+
+
+def apply_staff_action(action, clauses):
+    """Approve or delete every staff row matching `clauses`; returns the row count.
+
+    One UPDATE (approve) or two DELETEs (reject: ledger rows, then staff),
+    so the ORM delete hooks are replaced by the explicit balance cleanup.
+    Reject only removes pending (unapproved) registrations with no payments
+    or loans, so a broad filter cannot orphan anyone's money records.
+    """
+    if action not in STAFF_ACTIONS:
+        raise ValueError(f'Unknown action: {action}')
+    if action == 'approve':
+        result = db.session.execute(
+            update(Staff).where(*clauses, Staff.approved == False).values(approved=True)
+            .execution_options(synchronize_session=False))
+    else:
+        clauses = [*clauses, Staff.approved == False, ~has_records()]
+        matching = select(Staff.staff_id).where(*clauses)
+        db.session.execute(delete(StaffBalance).where(StaffBalance.staff_id.in_(matching))
+                           .execution_options(synchronize_session=False))
+        result = db.session.execute(delete(Staff).where(*clauses)
+                                    .execution_options(synchronize_session=False))
+    return result.rowcount
+
+
+def apply_staff_action_to_ids(action, ids):
+    """apply_staff_action for an explicit id list, in bound-parameter-sized chunks."""
+    ids = sorted({int(i) for i in ids})
+    affected = 0
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        affected += apply_staff_action(action, [Staff.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])])
+    return affected
@@ -0,0 +1,110 @@
+from . import db
+from .models import Payment, Loan, Repayment, StaffBalance, history, settled
+from .pagination import encode_cursor, decode_cursor
+from .money import as_money
+from sqlalchemy import func, select
+
+# -------------------------------------------
+# Incremental staff statement (JSON API)
+# -------------------------------------------
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 5000
+
+PAYMENT_FIELDS = ['id', 'amount', 'month', 'created_on']
+REPAYMENT_FIELDS = ['id', 'loan_id', 'month', 'amount', 'created_on']
+LOAN_FIELDS = ['id', 'amount', 'interest_rate', 'tenure_months', 'total_amount', 'paid_amount',
+               'balance_amount', 'status', 'requested_on']
+
+
+def compact(value):
+    """JSON-friendly scalar: exact amounts as strings, ISO timestamps."""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(timespec='seconds')
+    if value is not None and not isinstance(value, (int, float, str, bool)):
+        return str(value)  # Decimal rupees
+    return value
+
+
+def table(fields, rows):
+    return {'fields': fields, 'rows': [[compact(v) for v in row] for row in rows]}
+
+
+def parse_sync_cursor(token):
+    """(last payment id, last repayment id) from a sync cursor; ValueError if garbled."""
+    cursor = decode_cursor(token)
+    if cursor is None or not isinstance(cursor[0], int):
+        raise ValueError('Invalid cursor')
+    return cursor
+
+
+def since_start(table, staff_id, since):
+    """Cursor position for a first sync from `since`: just before the staff's first row at or after it.
+
+    With no such row it is their newest row, so the next sync (sent without
+    `since`) never starts over from id 0 and returns the older history.
+    """
+    mine = table.staff_id == staff_id
+    first = db.session.scalar(select(func.min(table.id)).where(mine, table.created_on >= since))
+    if first is not None:
+        return first - 1
+    return db.session.scalar(select(func.coalesce(func.max(table.id), 0)).where(mine, settled(table.created_on)))
+
+
+def statement_delta(staff, cursor=None, since=None, limit=DEFAULT_SYNC_LIMIT, archived=False):
+    """Rows a client holding `cursor` has not seen yet, plus current loans and totals.
+
+    Payments and repayments are append-only, so they are synced by id. On
+    SQLite ids are assigned in commit order, unlike created_on, which comes
+    from the writer's clock; on server databases they are not, so rows are
+    only sent once settled (see models.settled), a few minutes after they
+    are written. `since` (a datetime) only bounds the first sync, whose
+    cursor starts at the first row at or after it (see since_start). Loans
+    change in place and are few per person, so they are always sent whole.
+    archived=True also reads the archive tables (archiving keeps ids).
+    """
+    limit = max(1, min(limit, MAX_SYNC_LIMIT))
+    p, r, l = (history(model, archived).c for model in (Payment, Repayment, Loan))
+    if cursor:
+        last_payment, last_repayment = parse_sync_cursor(cursor)
+    elif since:
+        last_payment, last_repayment = (since_start(t, staff.staff_id, since) for t in (p, r))
+    else:
+        last_payment, last_repayment = 0, 0
+
+    payments = select(p.id, p.amount, p.month, p.created_on) \
+        .where(p.staff_id == staff.staff_id, p.id > last_payment, settled(p.created_on))
+    repayments = select(r.id, r.loan_id, r.month, r.amount, r.created_on) \
+        .where(r.staff_id == staff.staff_id, r.id > last_repayment, settled(r.created_on))
+    if since and not cursor:
+        payments = payments.where(p.created_on >= since)
+        repayments = repayments.where(r.created_on >= since)
+    payment_rows = db.session.execute(payments.order_by(p.id).limit(limit + 1)).all()
+    repayment_rows = db.session.execute(repayments.order_by(r.id).limit(limit + 1)).all()
+    has_more = len(payment_rows) > limit or len(repayment_rows) > limit
+    payment_rows, repayment_rows = payment_rows[:limit], repayment_rows[:limit]
+
+    loans = db.session.execute(
+        select(l.id, l.amount, l.interest_rate, l.tenure_months, l.total_amount,
+               l.paid_amount, l.balance_amount, l.status, l.requested_on)
+        .where(l.staff_id == staff.staff_id, l.deleted == False)
+        .order_by(l.id)
+    ).all()
+    balance = db.session.get(StaffBalance, staff.staff_id) or StaffBalance(
+        total_paid=as_money(0), payment_count=0, outstanding_loans=as_money(0), active_loans=0)
+
+    next_cursor = encode_cursor(payment_rows[-1].id if payment_rows else last_payment,
+                                repayment_rows[-1].id if repayment_rows else last_repayment)
+    return {
+        'staff_id': staff.staff_id,
+        'balance': {
+            'total_paid': compact(balance.total_paid),
+            'payment_count': balance.payment_count,
+            'outstanding_loans': compact(balance.outstanding_loans),
+            'active_loans': balance.active_loans,
+        },
+        'loans': table(LOAN_FIELDS, loans),
+        'payments': table(PAYMENT_FIELDS, payment_rows),
+        'repayments': table(REPAYMENT_FIELDS, repayment_rows),
+        'cursor': next_cursor,
+        'has_more': has_more,
+    }
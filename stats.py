@@ -0,0 +1,93 @@
+from . import db
+from .models import Staff, Payment, Loan, StaffBalance
+from sqlalchemy import select, func
+import threading
+import time
+
+PENDING_STAFF_LIMIT = 50  # newest unapproved staff listed on the dashboard
+MONTHS_SHOWN = 12
+
+
+# -------------------------------------------
+# Admin dashboard aggregate cache
+# -------------------------------------------
+class AggregateCache:
+    """Dashboard aggregates computed at most once per TTL.
+
+    Write paths that change what the dashboard shows call invalidate().
+    The cache is per process, so other workers catch up when their TTL
+    expires.
+    """
+
+    def __init__(self):
+        self.ttl = 60
+        self._value = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config['ADMIN_STATS_TTL']
+        app.extensions['stats_cache'] = self
+
+    def get(self):
+        value = self._value
+        if value is not None and time.monotonic() < self._expires:
+            return value
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self._value is None or time.monotonic() >= self._expires:
+                self._value = compute_stats()
+                self._expires = time.monotonic() + self.ttl
+            return self._value
+
+    def invalidate(self):
+        self._value = None
+
+
+def compute_stats():
+    counts = db.session.execute(select(
+        select(func.count(Staff.id)).scalar_subquery().label('staff'),
+        select(func.count(Staff.id)).where(Staff.approved == False).scalar_subquery().label('pending_staff'),
+        select(func.count(Payment.id)).scalar_subquery().label('payments'),
+        select(func.count(Loan.id)).scalar_subquery().label('loans'),
+        select(func.coalesce(func.sum(StaffBalance.total_paid), 0.0)).scalar_subquery().label('collected'),
+        select(func.coalesce(func.sum(StaffBalance.outstanding_loans), 0.0)).scalar_subquery().label('outstanding'),
+    )).one()
+
+    by_month = db.session.execute(
+        select(Payment.month, func.sum(Payment.amount).label('total'), func.count(Payment.id).label('count'))
+        .group_by(Payment.month)
+        .order_by(func.max(Payment.created_on).desc())
+        .limit(MONTHS_SHOWN)
+    ).all()
+
+    by_status = db.session.execute(
+        select(Loan.status, func.count(Loan.id).label('count'),
+               func.coalesce(func.sum(Loan.amount), 0.0).label('principal'),
+               func.coalesce(func.sum(Loan.balance_amount), 0.0).label('balance'))
+        .where(Loan.deleted == False)
+        .group_by(Loan.status)
+    ).all()
+
+    pending_staff = db.session.execute(
+        select(Staff.id, Staff.staff_id, Staff.name, Staff.registered_on)
+        .where(Staff.approved == False)
+        .order_by(Staff.id.desc())
+        .limit(PENDING_STAFF_LIMIT)
+    ).all()
+
+    # Plain dicts/lists only: the value is shared between requests
+    return {
+        'staff_count': counts.staff,
+        'pending_staff_count': counts.pending_staff,
+        'payments_count': counts.payments,
+        'loans_count': counts.loans,
+        'total_collected': counts.collected,
+        'outstanding_loan_book': counts.outstanding,
+        'payments_by_month': [dict(r._mapping) for r in by_month],
+        'loans_by_status': [dict(r._mapping) for r in by_status],
+        'pending_staff': [dict(r._mapping) for r in pending_staff],
+    }
+
+
+stats_cache = AggregateCache()
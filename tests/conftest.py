@@ -0,0 +1,73 @@
+"""Shared fixtures: an app on a throwaway SQLite database, seeded with a few pages of rows.
+
+Run from the project root:
+    python -m pytest tests
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db, bcrypt
+from app.ingest import bulk_insert
+from app.models import Staff, Payment, Loan
+
+ROWS = 300  # staff, payments and pending loans each
+
+
+def seed(rows=ROWS):
+    password = bcrypt.generate_password_hash('pw').decode('utf-8')
+    start = datetime(2025, 1, 1)
+    bulk_insert(Staff, [{'staff_id': f'S{i}', 'name': f'Staff {i}', 'password': password, 'approved': True,
+                         'registered_on': start + timedelta(hours=i)} for i in range(1, rows + 1)])
+    bulk_insert(Payment, [{'staff_id': f'S{i}', 'staff_pk': i, 'amount': 100 + i, 'month': 'Jan',
+                           'created_on': start + timedelta(hours=i)} for i in range(1, rows + 1)])
+    bulk_insert(Loan, [{'staff_id': f'S{i}', 'staff_pk': i, 'amount': 1000, 'total_amount': 1000,
+                        'paid_amount': 0, 'balance_amount': 1000, 'status': 'pending',
+                        'requested_on': start + timedelta(hours=i)} for i in range(1, rows + 1)])
+    db.session.commit()
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('db') / 'test.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+    with app.app_context():
+        seed()
+    return app
+
+
+@pytest.fixture
+def fresh_app(tmp_path):
+    """An app on its own empty database with approved staff S1..S3, inside an app context."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "fresh.db"}', 'TESTING': True})
+    with app.app_context():
+        password = bcrypt.generate_password_hash('pw').decode('utf-8')
+        bulk_insert(Staff, [{'staff_id': f'S{i}', 'name': f'Staff {i}', 'password': password, 'approved': True}
+                            for i in range(1, 4)])
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    client.post('/admin/login', data={'email': app.config['DEFAULT_ADMIN_EMAIL'],
+                                      'password': app.config['DEFAULT_ADMIN_PASSWORD']})
+    return client
+
+
+@pytest.fixture
+def statements(app):
+    """Every SQL statement the engine runs while the test is active."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
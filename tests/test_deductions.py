@@ -0,0 +1,65 @@
+"""Month-end deduction runs: one EMI per loan per month, never for the future."""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.deductions import parse_month, run_deductions
+from app.models import Loan, Repayment, StaffBalance
+
+
+def add_loan(staff_id, total, tenure=10, paid=0, requested_on=datetime(2026, 1, 15)):
+    loan = Loan(staff_id=staff_id, amount=total, total_amount=total, tenure_months=tenure, paid_amount=paid,
+                balance_amount=total - paid, status='approved', requested_on=requested_on)
+    db.session.add(loan)
+    db.session.commit()
+    return loan.id
+
+
+def deduct(month):
+    run = run_deductions(month)
+    db.session.commit()
+    return run
+
+
+def test_second_run_for_a_month_deducts_nothing(fresh_app):
+    loan_id = add_loan('S1', 1000)
+    first = deduct('2026-03')
+    second = deduct('2026-03')
+
+    assert (first.deducted, first.total_amount) == (1, Decimal('100.00'))
+    assert (second.deducted, second.skipped, second.total_amount) == (0, 1, Decimal('0.00'))
+    assert Repayment.query.filter_by(loan_id=loan_id).count() == 1
+    loan = db.session.get(Loan, loan_id)
+    assert (loan.paid_amount, loan.balance_amount) == (Decimal('100.00'), Decimal('900.00'))
+    assert db.session.get(StaffBalance, 'S1').outstanding_loans == Decimal('900.00')
+
+
+def test_last_installment_closes_the_loan(fresh_app):
+    loan_id = add_loan('S1', 1000, tenure=4, paid=750)
+    run = deduct('2026-03')
+
+    loan = db.session.get(Loan, loan_id)
+    assert (run.total_amount, run.loans_closed) == (Decimal('250.00'), 1)
+    assert (loan.balance_amount, loan.status) == (Decimal('0.00'), 'paid')
+
+
+def test_loans_requested_after_the_run_month_are_not_deducted(fresh_app):
+    add_loan('S1', 1000, requested_on=datetime(2026, 2, 28, 23, 59))
+    add_loan('S2', 1000, requested_on=datetime(2026, 3, 1))
+    run = deduct('2026-02')
+
+    assert [r.staff_id for r in Repayment.query] == ['S1']
+    assert run.loans_checked == 1
+
+
+@pytest.mark.parametrize('value', ['2099-01', 'March', '', None])
+def test_parse_month_refuses_future_and_malformed_months(value):
+    with pytest.raises(ValueError):
+        parse_month(value)
+
+
+def test_parse_month_accepts_this_month():
+    this_month = datetime.utcnow().strftime('%Y-%m')
+    assert parse_month(this_month + '-17') == this_month
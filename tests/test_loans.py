@@ -0,0 +1,69 @@
+"""Loan uploads: repayments reconcile onto the right loan and close it."""
+from decimal import Decimal
+
+import pandas as pd
+from sqlalchemy import update
+
+from app import db, ingest
+from app.models import Loan
+
+
+def add_loan(staff_id, amount, paid=0, status='approved'):
+    loan = Loan(staff_id=staff_id, amount=amount, total_amount=amount, paid_amount=paid,
+                balance_amount=amount - paid, status=status)
+    db.session.add(loan)
+    db.session.commit()
+    return loan.id
+
+
+def upload(rows):
+    report = ingest.ingest_loans(pd.DataFrame(rows, columns=['staff_id', 'amount', 'status', 'month']))
+    db.session.commit()
+    return report
+
+
+def test_repayment_added_to_a_deduction_committed_mid_upload(fresh_app, monkeypatch):
+    loan_id = add_loan('S1', 1000)
+    read_active_loans = ingest.active_loans
+
+    def deduction_commits_after_the_read(staff_ids):
+        active = read_active_loans(staff_ids)
+        db.session.execute(update(Loan).where(Loan.id == loan_id).values(paid_amount=Loan.paid_amount + 100))
+        return active
+
+    monkeypatch.setattr(ingest, 'active_loans', deduction_commits_after_the_read)
+    upload([('S1', 300, 'repayment', '2026-01')])
+
+    loan = db.session.get(Loan, loan_id)
+    assert loan.paid_amount == Decimal('400.00')
+    assert loan.balance_amount == Decimal('600.00')
+    assert loan.status == 'approved'
+
+
+def test_repayments_reconcile_in_file_order(fresh_app):
+    existing = add_loan('S1', 1000)
+    report = upload([
+        ('S1', 100, 'repayment', '2026-01'),  # before the new loan: the existing one
+        ('S1', 500, 'approved', '2026-01'),
+        ('S1', 200, 'repayment', '2026-02'),  # after it: the loan from the line above
+        ('S2', 50, 'repayment', '2026-01'),   # S2 has no active loan
+    ])
+
+    assert db.session.get(Loan, existing).paid_amount == Decimal('100.00')
+    new = Loan.query.filter(Loan.id != existing).one()
+    assert (new.amount, new.paid_amount, new.balance_amount) == (Decimal('500.00'), Decimal('200.00'),
+                                                                 Decimal('300.00'))
+    assert report.counts['Loans Created'] == 1
+    assert report.counts['Repayments Applied'] == 2
+    assert report.rejected == [{'row': 5, 'staff_id': 'S2', 'reason': 'no active loan'}]
+
+
+def test_repayment_that_covers_the_balance_closes_the_loan(fresh_app):
+    open_loan = add_loan('S1', 1000, paid=700)
+    report = upload([('S1', 200, 'repayment', '2026-01'), ('S1', 150, 'repayment', '2026-02'),
+                     ('S2', 300, 'approved', '2026-01'), ('S2', 300, 'paid', '2026-01')])
+
+    loan = db.session.get(Loan, open_loan)
+    assert (loan.paid_amount, loan.balance_amount, loan.status) == (Decimal('1050.00'), Decimal('0.00'), 'paid')
+    assert Loan.query.filter_by(staff_id='S2').one().status == 'paid'
+    assert report.counts['Loans Closed'] == 2  # counted once per loan, not per later repayment
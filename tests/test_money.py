@@ -0,0 +1,58 @@
+"""Money is exact: integer paise in the database, Decimal rupees in Python."""
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select, text, type_coerce
+
+from app import db
+from app.ingest import ingest_payments
+from app.models import Payment, Loan
+from app.money import Money, as_money, from_paise, to_paise
+from app.schema import money_to_paise
+
+
+@pytest.mark.parametrize('value, paise', [
+    (0.1 + 0.2, 30), (19.99, 1999), ('10.005', 1001), (Decimal('-2.345'), -235), (1234567.89, 123456789),
+])
+def test_to_paise_rounds_half_up(value, paise):
+    assert to_paise(value) == paise
+    assert from_paise(paise) == as_money(value)
+
+
+def test_amounts_round_trip_exactly(fresh_app):
+    db.session.add_all(Payment(staff_id='S1', amount=amount, month='Jan') for amount in (0.1, 0.2, '1234567.89'))
+    db.session.commit()
+
+    assert sorted(db.session.scalars(select(Payment.amount))) == \
+        [Decimal('0.10'), Decimal('0.20'), Decimal('1234567.89')]
+    total = db.session.scalar(select(type_coerce(func.sum(Payment.amount), Money)))
+    assert total == Decimal('1234568.19')
+    assert db.session.execute(text('SELECT amount FROM payments ORDER BY id')).scalars().all() == \
+        [10, 20, 123456789]
+
+
+def test_money_to_paise_converts_rupee_floats(fresh_app):
+    # An upgraded database: REAL rupee values written before Money existed
+    db.session.execute(text("INSERT INTO payments (staff_id, amount, month) VALUES ('S1', 19.99, 'Jan'), "
+                            "('S1', 0.285, 'Feb')"))
+    db.session.execute(text("INSERT INTO loans (staff_id, amount, total_amount, paid_amount, balance_amount, status) "
+                            "VALUES ('S1', 1000, 1050.5, 333.33, 717.17, 'approved')"))
+    money_to_paise()
+    db.session.commit()
+
+    assert db.session.scalars(select(Payment.amount).order_by(Payment.id)).all() == \
+        [Decimal('19.99'), Decimal('0.29')]
+    loan = Loan.query.one()
+    assert (loan.amount, loan.total_amount, loan.paid_amount, loan.balance_amount) == \
+        (Decimal('1000.00'), Decimal('1050.50'), Decimal('333.33'), Decimal('717.17'))
+
+
+def test_unrepresentable_amounts_are_rejected(fresh_app):
+    rows = pd.DataFrame({'staff_id': ['S1'] * 5, 'amount': ['inf', '1e30', 'abc', '-5', '12.50'],
+                         'month': ['Jan', 'Feb', 'Mar', 'Apr', 'May']})
+    report = ingest_payments(rows)
+    db.session.commit()
+
+    assert [r['reason'] for r in report.rejected] == ['invalid amount'] * 3 + ['amount must be positive']
+    assert db.session.scalars(select(Payment.amount)).all() == [Decimal('12.50')]
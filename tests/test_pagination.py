@@ -0,0 +1,40 @@
+"""Keyset pagination: a deep page of each admin list costs the same SQL as the first."""
+import html
+import re
+
+import pytest
+
+LIST_VIEWS = ['/admin/manage-staff', '/admin/payments', '/admin/pending-loans']
+PER_PAGE = 20
+DEEP_PAGE = 10
+MAX_QUERIES = 3  # logged-in user, the page; no per-row lookups
+NEXT_LINK = re.compile(r'href="([^"]*[?&](?:amp;)?after=[^"]*)"')
+
+
+def next_page(response):
+    match = NEXT_LINK.search(response.get_data(as_text=True))
+    assert match, 'no Next link'
+    return html.unescape(match.group(1))
+
+
+def count(client, statements, url):
+    client.get(url)  # warm per-process caches (session user, templates)
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(statements), response
+
+
+@pytest.mark.parametrize('view', LIST_VIEWS)
+def test_deep_page_costs_the_same_queries_as_the_first(admin, statements, view):
+    url = f'{view}?per_page={PER_PAGE}'
+    first, response = count(admin, statements, url)
+    for _ in range(DEEP_PAGE - 1):
+        url = next_page(response)
+        response = admin.get(url)
+    deep, response = count(admin, statements, url)
+
+    assert 'after=' in url
+    assert response.get_data(as_text=True).count('<tr') > 1  # the deep page has rows
+    assert first <= MAX_QUERIES
+    assert deep == first
@@ -0,0 +1,42 @@
+"""PDF reports are written a page at a time, so memory does not grow with the report."""
+import re
+import tracemalloc
+
+from app.reports import ROWS_PER_PAGE, PAYMENT_COLUMNS, TableReport
+
+
+def render(out, rows, on_page=None):
+    report = TableReport(out, 'Staff Payments Report', 'All records', PAYMENT_COLUMNS)
+    for i in range(rows):
+        report.add_row([f'S{i}', 'Jan', f'{i:,.2f}', '2026-01-01'])
+        if on_page and i % ROWS_PER_PAGE == 0:
+            on_page(report.pdf)
+    report.finish(rows)
+
+
+def test_finished_pages_are_written_out(tmp_path):
+    seen = []
+    with open(tmp_path / 'report.pdf', 'wb') as out:
+        render(out, ROWS_PER_PAGE * 5, lambda pdf: seen.append((pdf.pages, out.tell(), len(pdf.ops))))
+    for pages, written, buffered in seen[1:]:
+        assert written > pages * 500  # every finished page is already in the file
+        assert buffered < 100  # only the page being drawn is held
+
+    data = (tmp_path / 'report.pdf').read_bytes()
+    assert data.startswith(b'%PDF-') and data.rstrip().endswith(b'%%EOF')
+    assert re.search(rb'/Type /Pages /Kids \[[^\]]*\] /Count 5 ', data)
+
+
+def peak_memory(path, rows):
+    tracemalloc.start()
+    try:
+        render(path, rows)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_memory_does_not_grow_with_page_count(tmp_path):
+    small = peak_memory(tmp_path / 'small.pdf', ROWS_PER_PAGE * 20)
+    large = peak_memory(tmp_path / 'large.pdf', ROWS_PER_PAGE * 400)
+    assert large < small + 256 * 1024  # 20x the pages, a few KB of xref offsets more
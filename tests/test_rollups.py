@@ -0,0 +1,46 @@
+"""Analytics rollups: incremental on the request path, loan-book snapshots throttled."""
+from decimal import Decimal
+
+from sqlalchemy import func, select
+
+from app import db, rollups
+from app.models import CollectionRollup, Loan, LoanBookSnapshot, Payment
+from app.rollups import rollup_refresher
+
+
+def add(*rows):
+    db.session.add_all(rows)
+    db.session.commit()
+
+
+def booked_loans():
+    return db.session.scalar(select(func.sum(LoanBookSnapshot.loans)))
+
+
+def refresh():
+    rollup_refresher._next = 0.0  # the request interval has passed
+    rollup_refresher.refresh_if_stale()
+
+
+def test_requests_fold_collections_but_throttle_the_loan_book(fresh_app):
+    add(Loan(staff_id='S1', amount=1000, status='approved'), Payment(staff_id='S1', amount=100, month='Jan'))
+    refresh()  # no snapshot this month yet: taken at once
+    assert booked_loans() == 1
+
+    add(Loan(staff_id='S2', amount=500, status='approved'), Payment(staff_id='S2', amount=50, month='Jan'))
+    refresh()
+    assert db.session.scalar(select(func.sum(CollectionRollup.total))) == Decimal('150.00')
+    assert booked_loans() == 1  # within LOAN_BOOK_SNAPSHOT_SECONDS
+
+    rollup_refresher._next_snapshot = 0.0
+    refresh()
+    assert booked_loans() == 2
+
+
+def test_failed_refresh_is_logged_and_the_old_rollups_served(fresh_app, monkeypatch, caplog):
+    def locked(snapshot=True):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(rollups, 'refresh_rollups', locked)
+    refresh()
+    assert 'Rollup refresh failed' in caplog.text
@@ -0,0 +1,31 @@
+"""Schema upgrades and query plans."""
+from decimal import Decimal
+
+from sqlalchemy import delete, text
+
+from app import db
+from app.ingest import bulk_insert
+from app.models import Payment, SchemaMigration, StaffBalance
+from app.schema import full_scans, upgrade_schema
+
+
+def test_hot_queries_use_an_index(app):
+    """Hot queries are served by indexes (see schema.hot_queries)."""
+    with app.app_context():
+        assert full_scans() == []
+
+
+def test_upgrade_fills_the_balance_ledger(fresh_app):
+    bulk_insert(Payment, [{'staff_id': 'S1', 'amount': 100, 'month': 'Jan'},
+                          {'staff_id': 'S1', 'amount': 50.5, 'month': 'Feb'}])
+    # A database from before the ledger: no staff_balances table, migration not recorded
+    db.session.execute(text('DROP TABLE staff_balances'))
+    db.session.execute(delete(SchemaMigration).where(SchemaMigration.name == 'staff_balances'))
+    db.session.commit()
+
+    upgrade_schema()
+
+    balance = db.session.get(StaffBalance, 'S1')
+    assert balance.total_paid == Decimal('150.50')
+    assert balance.payment_count == 2
+    assert db.session.get(StaffBalance, 'S2').payment_count == 0
@@ -0,0 +1,30 @@
+"""Staff typeahead: ranked when the match set is small, index order when it is not."""
+import pytest
+
+from app import db, search
+from app.ingest import bulk_insert
+from app.models import Staff
+
+
+@pytest.fixture
+def staff(fresh_app):
+    if not search.fts_available():
+        pytest.skip('SQLite without FTS5')
+    bulk_insert(Staff, [{'staff_id': f'K{i}', 'name': f'Kumar {"Kumar " * (i % 3)}{i}', 'password': 'x'}
+                        for i in range(1, 31)])
+    db.session.commit()
+
+
+def staff_ids(q, limit=3):
+    return [row['staff_id'] for row in search.search_staff(q, limit)]
+
+
+def test_small_match_sets_are_ranked(staff, monkeypatch):
+    monkeypatch.setattr(search, 'RANK_LIMIT', 100)
+    assert set(staff_ids('kumar')) == {'K2', 'K5', 'K8'}  # bm25: most mentions in the shortest names
+
+
+def test_broad_match_sets_come_back_in_id_order(staff, monkeypatch):
+    monkeypatch.setattr(search, 'RANK_LIMIT', 10)
+    assert staff_ids('kumar') == ['K1', 'K2', 'K3']
+    assert staff_ids('k27') == ['K27']
@@ -0,0 +1,25 @@
+"""Bulk staff actions never delete staff who are approved or have money records."""
+from sqlalchemy import func, select
+
+from app import db
+from app.ingest import bulk_insert
+from app.models import Payment, Staff
+
+
+def test_bulk_reject_keeps_approved_staff_and_their_payments(fresh_app):
+    bulk_insert(Staff, [{'staff_id': sid, 'name': sid, 'password': 'x', 'approved': False} for sid in ('P1', 'P2')])
+    bulk_insert(Payment, [{'staff_id': 'S1', 'amount': 100, 'month': 'Jan'},
+                          {'staff_id': 'P2', 'amount': 100, 'month': 'Jan'}])
+    db.session.commit()
+    admin = fresh_app.test_client()
+    admin.post('/admin/login', data={'email': fresh_app.config['DEFAULT_ADMIN_EMAIL'],
+                                     'password': fresh_app.config['DEFAULT_ADMIN_PASSWORD']})
+
+    everyone = [s.id for s in Staff.query]
+    response = admin.post('/admin/staff/bulk', json={'action': 'reject', 'ids': everyone})
+    assert response.get_json() == {'action': 'reject', 'affected': 1}
+    response = admin.post('/admin/staff/bulk', json={'action': 'reject', 'filter': {'q': 'S1'}})
+    assert response.get_json()['affected'] == 0
+
+    assert sorted(db.session.scalars(select(Staff.staff_id))) == ['P2', 'S1', 'S2', 'S3']
+    assert db.session.scalar(select(func.count(Payment.id))) == 2
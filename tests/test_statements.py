@@ -0,0 +1,39 @@
+"""Incremental statement sync: a cursor never hands back rows the client skipped."""
+from datetime import datetime
+
+from app import db
+from app.ingest import bulk_insert
+from app.models import Payment, Staff
+from app.statements import statement_delta
+
+
+def add_payments(*created):
+    bulk_insert(Payment, [{'staff_id': 'S1', 'amount': 100, 'month': 'Jan', 'created_on': on} for on in created])
+    db.session.commit()
+
+
+def ids(delta):
+    return [row[0] for row in delta['payments']['rows']]
+
+
+def test_empty_first_sync_since_does_not_reset_the_cursor(fresh_app):
+    add_payments(*(datetime(2025, month, 1) for month in range(1, 6)))
+    staff = Staff.query.filter_by(staff_id='S1').one()
+
+    first = statement_delta(staff, since=datetime(2026, 1, 1))
+    assert ids(first) == []
+    assert ids(statement_delta(staff, cursor=first['cursor'])) == []
+
+    add_payments(datetime(2026, 2, 1))
+    assert len(ids(statement_delta(staff, cursor=first['cursor']))) == 1
+
+
+def test_first_sync_since_starts_at_the_first_row_after_it(fresh_app):
+    add_payments(datetime(2025, 12, 1), datetime(2026, 1, 5), datetime(2026, 1, 6))
+    staff = Staff.query.filter_by(staff_id='S1').one()
+
+    first = statement_delta(staff, since=datetime(2026, 1, 1), limit=1)
+    assert first['has_more']
+    rest = statement_delta(staff, cursor=first['cursor'])
+    assert len(ids(first) + ids(rest)) == 2
+    assert not rest['has_more']